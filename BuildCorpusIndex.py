@@ -0,0 +1,121 @@
+"""
+Builds a positional inverted index over the reference corpus, so that the word counts of any topic
+file can be computed by ComputeWordCountIndex.py without rescanning the corpus.
+
+Usage:          BuildCorpusIndex.py <ref_corpus_dir> <index_dir>
+Output:         one sub-directory per corpus partition in <index_dir>, containing:
+                vocab.txt       - the terms of the partition, one per line (line number = term id)
+                offsets.npy     - int64 array; postings of term i are positions[offsets[i]:offsets[i+1]]
+                positions.npy   - uint32/uint64 array of token positions (global within the partition),
+                                  sorted by term and then by position
+                doc_offsets.npy - int64 array; tokens of document i are positions doc_offsets[i] to
+                                  doc_offsets[i+1]-1
+                source.txt      - path, size and modification time of the indexed corpus partition
+                All arrays are stored in numpy format and are memory-mapped when queried.
+"""
+
+import argparse
+import sys
+import os
+import numpy as np
+from multiprocessing import Pool
+import PartitionFile
+import Profiling
+
+#parser arguments
+desc = "Builds a positional inverted index over the reference corpus. Parallel processing is \
+    achieved by indexing the corpus partitions separately."
+parser = argparse.ArgumentParser(description=desc)
+#####################
+#positional argument#
+#####################
+parser.add_argument("ref_corpus_dir", help="directory that contains the reference corpus; the " + \
+    "partitions can be compressed with gzip, bzip2 or zstd")
+parser.add_argument("index_dir", help="directory to store the index")
+
+###################
+#optional argument#
+###################
+parser.add_argument("--profile", default=None, \
+    help="profile the run (the main and worker processes, and the time of each stage) and " + \
+    "write the profiles to files with this prefix (see Profiling.py)")
+
+#constants (the vocabulary, document offsets and source files are those of PartitionFile.py)
+OFFSETS_FILE = "offsets.npy"
+POSITIONS_FILE = "positions.npy"
+
+##################
+#worker functions#
+##################
+#index a corpus partition and save the index in partition_dir
+@Profiling.profiled
+def build_index(corpus_file, partition_dir):
+    #record the state of the partition before reading it, so that a change during indexing is
+    #also detected as a stale index
+    corpus_stat = os.stat(corpus_file)
+
+    vocab_list, tokens, doc_offsets = PartitionFile.tokenize(corpus_file)
+
+    #sort the token positions by term id to get the postings of each term
+    with Profiling.stage("sort postings"):
+        tokens = np.frombuffer(tokens, dtype=np.uint32)
+        if len(tokens) < 2**32:
+            pos_dtype = np.uint32
+        else:
+            pos_dtype = np.uint64
+        positions = np.argsort(tokens, kind="mergesort").astype(pos_dtype)
+        offsets = np.zeros(len(vocab_list)+1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(tokens.astype(np.int64), minlength=len(vocab_list)))
+
+    if not os.path.exists(partition_dir):
+        os.makedirs(partition_dir)
+    PartitionFile.write_vocab(partition_dir, vocab_list, doc_offsets)
+    np.save(os.path.join(partition_dir, OFFSETS_FILE), offsets)
+    np.save(os.path.join(partition_dir, POSITIONS_FILE), positions)
+    PartitionFile.write_source(partition_dir, corpus_file, corpus_stat)
+
+    return corpus_file
+
+####################
+#call back function#
+####################
+def build_index_complete(corpus_file):
+    sys.stderr.write("finished indexing corpus partition " + corpus_file + "\n")
+    sys.stderr.flush()
+
+################
+#main functions#
+################
+#index the partitions of the reference corpus directory, one index partition (sub-directory of
+#index_dir) per corpus partition
+def build_corpus_index(ref_corpus_dir, index_dir):
+    #get the partitions of the reference corpus
+    corpus_partitions = []
+    for f in os.listdir(ref_corpus_dir):
+        if not f.startswith("."):
+            corpus_partitions.append(f)
+
+    if not os.path.exists(index_dir):
+        os.makedirs(index_dir)
+
+    #spawn multiple threads to index the corpus
+    po = Pool()
+    results = []
+    for cp in corpus_partitions:
+        sys.stderr.write("creating a thread for corpus partition " + cp + "\n")
+        sys.stderr.flush()
+        results.append(po.apply_async(build_index, (ref_corpus_dir + "/" + cp, \
+            index_dir + "/" + cp,), callback=build_index_complete))
+    po.close()
+    po.join()
+    #raise any error from the workers
+    for result in results:
+        result.get()
+
+######
+#main#
+######
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+    build_corpus_index(args.ref_corpus_dir, args.index_dir)
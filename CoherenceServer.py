@@ -0,0 +1,196 @@
+"""
+Serves the observed coherence of topics over HTTP (on localhost or a Unix socket), with the word
+counts loaded once, so that topics can be scored without starting a process and parsing the word
+count file for every call.
+
+Usage:          CoherenceServer.py <wordcount_file> [-p port] [-u unix_socket] [-c cache_size]
+Request:        POST /score with a JSON object:
+                    {"topics": [["w1", "w2", ...], ...] or ["w1 w2 ...", ...],
+                     "metric": "pmi", "npmi", "lcp" or "all" (default "all"),
+                     "topns": [10] (default)}
+Response:       {"coherence": {metric: [[score of each top-N] per topic]},
+                 "mean_coherence": {metric: [mean over the top-Ns per topic]},
+                 "latency_ms": time taken to score the request}
+                GET /stats returns the number of requests, their mean latency and the cache size.
+Scores follow the same pmi/npmi/lcp definitions as ComputeObservedCoherence.py.
+"""
+
+import argparse
+import sys
+import os
+import time
+import json
+import signal
+import threading
+import BaseHTTPServer
+import SocketServer
+import numpy as np
+import WordCountFile
+import TopicCoherence
+import Profiling
+
+#parser arguments
+desc = "Serves the observed coherence of topics, with the word counts loaded once."
+parser = argparse.ArgumentParser(description=desc)
+#####################
+#positional argument#
+#####################
+parser.add_argument("wordcount_file", help="file that contains the word counts (text or binary format)")
+
+###################
+#optional argument#
+###################
+parser.add_argument("-p", "--port", type=int, default=8642, \
+    help="port to listen on (localhost only). Default = 8642")
+parser.add_argument("-u", "--unix_socket", default=None, \
+    help="listen on this Unix socket instead of a localhost port")
+parser.add_argument("-c", "--cache_size", type=int, default=1000000, \
+    help="number of recently used word/pair counts kept in the LRU cache. Default = 1000000")
+parser.add_argument("--profile", default=None, \
+    help="profile the server (the main thread and the requests, and the time of each stage) " + \
+    "until it stops, and write the profiles to files with this prefix (see Profiling.py)")
+
+#global variables
+scorer = None #the coherence scorer, shared by all requests
+scorer_lock = threading.Lock() #the scorer (and its cache) is used by one request at a time
+request_stats = {"requests": 0, "total_latency_ms": 0.0}
+
+###########
+#functions#
+###########
+#the topics of a request: a list of topics, each a non-empty list of words or a string of words
+#separated by spaces; raises a ValueError otherwise
+def get_request_topics(request_topics):
+    if not isinstance(request_topics, list):
+        raise ValueError("topics must be a list of topics")
+    topics = []
+    for topic in request_topics:
+        if isinstance(topic, basestring):
+            topic = topic.split()
+        if not isinstance(topic, list) or len(topic) == 0 or \
+            not all([ isinstance(word, basestring) for word in topic ]):
+            raise ValueError("each topic must be a non-empty list of words or string of words")
+        topics.append(topic)
+
+    return topics
+
+#########
+#classes#
+#########
+class CoherenceHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def send_json(self, code, result):
+        body = json.dumps(result)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/stats":
+            self.send_json(404, {"error": "unknown path " + self.path})
+            return
+        stats = dict(request_stats)
+        stats["mean_latency_ms"] = stats["total_latency_ms"] / max(stats["requests"], 1)
+        stats["cache_size"] = len(scorer.count_cache)
+        self.send_json(200, stats)
+
+    @Profiling.profiled
+    def do_POST(self):
+        if self.path != "/score":
+            self.send_json(404, {"error": "unknown path " + self.path})
+            return
+
+        start_time = time.time()
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.getheader("Content-Length", 0))))
+            topics = get_request_topics(request["topics"])
+            metric = request.get("metric", "all")
+            topns = [ int(n) for n in request.get("topns", [10]) ]
+            if metric == "all":
+                metrics = TopicCoherence.METRICS
+            elif metric in TopicCoherence.METRICS:
+                metrics = [metric]
+            else:
+                raise ValueError("unknown metric " + metric)
+            if len(topns) == 0 or min(topns) < 1:
+                raise ValueError("topns must be positive")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+
+        #any failure of the scorer is returned to the client rather than dropping the connection
+        scorer_lock.acquire()
+        try:
+            with Profiling.stage("score topics"):
+                topic_coherence = scorer.score(topics, topns)
+        except Exception as e:
+            sys.stderr.write("ERROR: scoring failed: " + repr(e) + "\n")
+            self.send_json(500, {"error": "scoring failed: " + str(e)})
+            return
+        finally:
+            scorer_lock.release()
+
+        #nan (topics with fewer than two distinct words) is returned as null
+        result = {"coherence": {}, "mean_coherence": {}}
+        for m in metrics:
+            result["coherence"][m] = [ [ None if np.isnan(tc) else float(tc) for tc in row ] \
+                for row in topic_coherence[m] ]
+            result["mean_coherence"][m] = [ None if np.isnan(tc) else float(tc) \
+                for tc in np.mean(topic_coherence[m], axis=1) ]
+        latency_ms = (time.time() - start_time) * 1000
+        result["latency_ms"] = latency_ms
+        request_stats["requests"] += 1
+        request_stats["total_latency_ms"] += latency_ms
+
+        self.send_json(200, result)
+        sys.stderr.write("scored " + str(len(topics)) + " topics in %.2f ms\n" % latency_ms)
+
+    #Unix socket clients have no address
+    def address_string(self):
+        if isinstance(self.client_address, tuple):
+            return BaseHTTPServer.BaseHTTPRequestHandler.address_string(self)
+        return self.server.server_address
+
+    #requests are logged with their latency in do_POST instead
+    def log_request(self, code="-", size="-"):
+        pass
+
+class ThreadedHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class ThreadedUnixHTTPServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+######
+#main#
+######
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+
+    #load the word counts once; a binary word count file is memory-mapped
+    sys.stderr.write("loading word counts from " + args.wordcount_file + "\n")
+    with Profiling.stage("read word counts"):
+        scorer = TopicCoherence.CoherenceScorer(WordCountFile.load(args.wordcount_file), \
+            TopicCoherence.LRUCache(args.cache_size))
+
+    if args.unix_socket:
+        if os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+        server = ThreadedUnixHTTPServer(args.unix_socket, CoherenceHandler)
+        sys.stderr.write("serving on unix socket " + args.unix_socket + "\n")
+    else:
+        server = ThreadedHTTPServer(("127.0.0.1", args.port), CoherenceHandler)
+        sys.stderr.write("serving on http://127.0.0.1:" + str(args.port) + "\n")
+
+    #stop cleanly (and remove the Unix socket) when terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
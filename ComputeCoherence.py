@@ -0,0 +1,83 @@
+"""
+Computes the observed coherence of topics directly from the reference corpus, in one process: the
+word counts of the topic words are computed as ComputeWordCount.py does and passed in memory to the
+scorer of ComputeObservedCoherence.py, so they are not written out and parsed again. The word counts
+can still be saved as a side artifact (-o or -b).
+
+Usage:          ComputeCoherence.py <topic_file> <metric> <ref_corpus_dir> [-t topns] [-w window_size]
+                [-o wordcount_file] [-b binary_wordcount_file] (and the count options of
+                ComputeWordCount.py, e.g. -m, -s, --sample_rate or --count_memory)
+Stdout:         the observed coherence of the topics, as printed by ComputeObservedCoherence.py
+"""
+
+import argparse
+import sys
+import codecs
+import ComputeWordCount
+import ComputeObservedCoherence
+import Profiling
+
+#parser arguments
+desc = "Computes the observed coherence of topics from the reference corpus, counting and " + \
+    "scoring in one process."
+parser = argparse.ArgumentParser(description=desc, parents=[ComputeWordCount.count_parser])
+#####################
+#positional argument#
+#####################
+parser.add_argument("topic_file", help="file that contains the topics")
+parser.add_argument("metric", help="type of evaluation metric; 'all' computes pmi, npmi and lcp " + \
+    "together and prints them side by side", choices=["pmi","npmi","lcp","all"])
+parser.add_argument("ref_corpus_dir", help="directory that contains the reference corpus (or " + \
+    "the tokenized corpus created by TokenizeCorpus.py)")
+
+###################
+#optional argument#
+###################
+parser.add_argument("-t", "--topns", nargs="+", type=int, default=[10], \
+    help="list of top-N topic words to consider for computing coherence (see " + \
+    "ComputeObservedCoherence.py). Default = [10]")
+parser.add_argument("-w", "--window_size", type=int, default=20, \
+    help="size of the sliding window (0 = use document as window). Default = 20")
+parser.add_argument("-o", "--output_file", default=None, \
+    help="also write the word counts to this file (in the text format)")
+parser.add_argument("-b", "--binary_output", default=None, \
+    help="also write the word counts to this file (in the binary format)")
+parser.add_argument("--profile", default=None, \
+    help="profile the run (the main and worker processes, and the time of each stage) and " + \
+    "write the profiles to files with this prefix (see Profiling.py)")
+
+######
+#main#
+######
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+
+    #use utf-8 for stdout
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout)
+
+    try:
+        ComputeWordCount.check_window_sizes([args.window_size])
+    except ValueError as e:
+        sys.stderr.write("ERROR: " + str(e) + " (-w)\n")
+        raise SystemExit
+    try:
+        ComputeWordCount.check_count_options(args)
+    except ValueError as e:
+        sys.stderr.write("ERROR: " + str(e) + "\n")
+        raise SystemExit
+
+    #the word counts are computed for all the words of the topics (as ComputeWordCount.py), and the
+    #coherence for the top-N words
+    topics = [ line.strip().split() for line in codecs.open(args.topic_file, "r", "utf-8") ]
+    topic_lists, topic_tw = ComputeObservedCoherence.read_topics(args.topic_file, args.topns)
+
+    wordcount = ComputeWordCount.compute_word_counts(topics, \
+        ComputeWordCount.get_corpus_partitions(args.ref_corpus_dir), [args.window_size], \
+        args.count_mode, args.processes, args.chunk_size, args.count_store, args.sample_rate, \
+        args.sketch_size, args.seed, args.count_memory, args.spill_dir)[0]
+    if args.output_file or args.binary_output:
+        ComputeWordCount.write_word_count(wordcount, args.output_file, args.binary_output)
+
+    ComputeObservedCoherence.print_observed_coherence(topic_lists, topic_tw, wordcount, \
+        args.metric, args.topns)
@@ -5,11 +5,11 @@ Date:           May 2013
 
 import argparse
 import sys
-import operator
-import math
 import codecs
 import numpy as np
-from collections import defaultdict
+import WordCountFile
+import TopicCoherence
+import Profiling
 
 
 #parser arguments
@@ -19,8 +19,9 @@ parser = argparse.ArgumentParser(description=desc)
 #positional argument#
 #####################
 parser.add_argument("topic_file", help="file that contains the topics")
-parser.add_argument("metric", help="type of evaluation metric", choices=["pmi","npmi","lcp"])
-parser.add_argument("wordcount_file", help="file that contains the word counts")
+parser.add_argument("metric", help="type of evaluation metric; 'all' computes pmi, npmi and lcp " + \
+    "together and prints them side by side", choices=["pmi","npmi","lcp","all"])
+parser.add_argument("wordcount_file", help="file that contains the word counts (text or binary format)")
 
 ###################
 #optional argument#
@@ -29,129 +30,98 @@ parser.add_argument("-t", "--topns", nargs="+", type=int, default=[10], \
     help="list of top-N topic words to consider for computing coherence; e.g. '-t 5 10' means it " + \
     " will compute coherence over top-5 words and top-10 words and then take the mean of both values." + \
     " Default = [10]")
-
-args = parser.parse_args()
-
-#parameters
-colloc_sep = "_" #symbol for concatenating collocations
-
-#input
-topic_file = codecs.open(args.topic_file, "r", "utf-8")
-wc_file = codecs.open(args.wordcount_file, "r", "utf-8")
-
-#constants
-WTOTALKEY = "!!<TOTAL_WINDOWS>!!" #key name for total number of windows (in word count file)
-
-#global variables
-window_total = 0 #total number of windows
-wordcount = {} #a dictionary of word counts, for single and pair words
-wordpos = {} #a dictionary of pos distribution
+parser.add_argument("--profile", default=None, \
+    help="profile the run (and the time of each stage) and write the profiles to files with " + \
+    "this prefix (see Profiling.py)")
 
 ###########
 #functions#
 ###########
-#use utf-8 for stdout
-sys.stdout = codecs.getwriter('utf-8')(sys.stdout)
-
-#compute the association between two words
-def calc_assoc(word1, word2):
-    combined1 = word1 + "|" + word2
-    combined2 = word2 + "|" + word1
-
-    combined_count = 0
-    if combined1 in wordcount:
-        combined_count = wordcount[combined1]
-    elif combined2 in wordcount:
-        combined_count = wordcount[combined2]
-    w1_count = 0
-    if word1 in wordcount:
-        w1_count = wordcount[word1]
-    w2_count = 0
-    if word2 in wordcount:
-        w2_count = wordcount[word2]
-
-    if (args.metric == "pmi") or (args.metric == "npmi"):
-        if w1_count == 0 or w2_count == 0 or combined_count == 0:
-            result = 0.0
-        else:
-            result = math.log((float(combined_count)*float(window_total))/ \
-                float(w1_count*w2_count), 10)
-            if args.metric == "npmi":
-                result = result / (-1.0*math.log(float(combined_count)/(window_total),10))
-
-    elif args.metric == "lcp":
-        if combined_count == 0:
-            if w2_count != 0:
-                result = math.log(float(w2_count)/window_total, 10)
-            else:
-                result = math.log(float(1.0)/window_total, 10)
-        else:
-            result = math.log((float(combined_count))/(float(w1_count)), 10)
-
-    return result
-
-#compute topic coherence given a list of topic words
-def calc_topic_coherence(topic_words):
-    topic_assoc = []
-    for w1_id in range(0, len(topic_words)-1):
-        target_word = topic_words[w1_id]
-        #remove the underscore and sub it with space if it's a collocation/bigram
-        w1 = " ".join(target_word.split(colloc_sep))
-        for w2_id in range(w1_id+1, len(topic_words)):
-            topic_word = topic_words[w2_id]
-            #remove the underscore and sub it with space if it's a collocation/bigram
-            w2 = " ".join(topic_word.split(colloc_sep))
-            if target_word != topic_word:
-                topic_assoc.append(calc_assoc(w1, w2))
-
-    return float(sum(topic_assoc))/len(topic_assoc)
+#read the topic file; returns the topics (lists of the top max(topns) topic words) and the text of
+#each topic ({topicid: topN_topicwords})
+def read_topics(topic_file, topns):
+    topic_tw = {} #{topicid: topN_topicwords}
+    topic_lists = []
+    for topic_id, line in enumerate(codecs.open(topic_file, "r", "utf-8")):
+        topic_list = line.split()[:max(topns)]
+        topic_tw[topic_id] = " ".join(topic_list)
+        topic_lists.append(topic_list)
+
+    return topic_lists, topic_tw
+
+#compute the observed coherence of the topics (see read_topics) with the word counts (a dictionary,
+#or anything that supports 'in' and [], such as WordCountFile.BinaryWordCount) for the metric ('all'
+#= all the metrics) and top-N values, and print it
+def print_observed_coherence(topic_lists, topic_tw, wordcount, metric, topns):
+    #compute the observed coherence of the topics for all the metrics and top-N values, with the
+    #bounds of the coherence if the word counts are approximate
+    with Profiling.stage("score topics"):
+        scorer = TopicCoherence.CoherenceScorer(wordcount)
+        topic_coherence = scorer.score(topic_lists, topns, scorer.approximate)
+    if scorer.approximate:
+        sys.stderr.write("the word counts are approximate (")
+        if scorer.sampled_windows > 0:
+            sys.stderr.write("counted over %d of %d windows; " % (scorer.sampled_windows, \
+                scorer.window_total))
+        if scorer.pair_error > 0:
+            sys.stderr.write("pair counts up to %d too high; " % scorer.pair_error)
+        sys.stderr.write("see ComputeWordCount.py); the coherence is followed by its bounds\n")
+
+    if metric == "all":
+        metrics = TopicCoherence.METRICS
+    else:
+        metrics = [metric]
+
+    #print the topic coherence scores in terms of topic id (the mean over the top-N values, and its
+    #bounds for approximate word counts, followed by the score of each top-N value)
+    mean_coherence = dict([ (key, np.mean(topic_coherence[key], axis=1)) \
+        for key in topic_coherence ])
+    output = []
+    for topic_id in range(len(topic_lists)):
+        for metric in metrics:
+            if len(metrics) > 1:
+                output.append(metric + " ")
+            output.append("[%.2f] " % mean_coherence[metric][topic_id])
+            if scorer.approximate:
+                output.append("<%.2f, %.2f> " % (mean_coherence[metric + "_lower"][topic_id], \
+                    mean_coherence[metric + "_upper"][topic_id]))
+            output.append("( ")
+            for i in topic_coherence[metric][topic_id]:
+                output.append("%.2f; " % i)
+            output.append(") ")
+        output.append(topic_tw[topic_id] + "\n")
+    sys.stdout.write("".join(output))
+
+    #print the overall topic coherence for all topics
+    print "=========================================================================="
+    for metric in metrics:
+        name = ""
+        if len(metrics) > 1:
+            name = " (" + metric + ")"
+        for stat, stat_func in [("Average", np.mean), ("Median", np.median)]:
+            line = (stat + " Topic Coherence" + name + " = %.3f") % stat_func(mean_coherence[metric])
+            if scorer.approximate:
+                line += " <%.3f, %.3f>" % (stat_func(mean_coherence[metric + "_lower"]), \
+                    stat_func(mean_coherence[metric + "_upper"]))
+            print line
 
 ######
 #main#
 ######
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
 
-#process the word count file(s)
-for line in wc_file:
-    line = line.strip()
-    data = line.split("|")
-    if len(data) == 2:
-        wordcount[data[0]] = int(data[1])
-    elif len(data) == 3:
-        if data[0] < data[1]:
-            key = data[0] + "|" + data[1]
-        else:
-            key = data[1] + "|" + data[0]
-        wordcount[key] = int(data[2])
-    else:
-        print "ERROR: wordcount format incorrect. Line =", line
-        raise SystemExit
-
-#get the total number of windows
-if WTOTALKEY in wordcount:
-    window_total = wordcount[WTOTALKEY]
+    #use utf-8 for stdout
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout)
 
-#read the topic file and compute the observed coherence
-topic_coherence = defaultdict(list) # {topicid: [tc]}
-topic_tw = {} #{topicid: topN_topicwords}
-for topic_id, line in enumerate(topic_file):
-    topic_list = line.split()[:max(args.topns)]
-    topic_tw[topic_id] = " ".join(topic_list)
-    for n in args.topns:
-        topic_coherence[topic_id].append(calc_topic_coherence(topic_list[:n]))
+    #read the topic file
+    with Profiling.stage("read topics"):
+        topic_lists, topic_tw = read_topics(args.topic_file, args.topns)
 
-#sort the topic coherence scores in terms of topic id
-tc_items = sorted(topic_coherence.items())
-mean_coherence_list = []
-for item in tc_items:
-    topic_words = topic_tw[item[0]].split()
-    mean_coherence = np.mean(item[1])
-    mean_coherence_list.append(mean_coherence)
-    print ("[%.2f] (" % mean_coherence),
-    for i in item[1]:
-        print ("%.2f;" % i),
-    print ")", topic_tw[item[0]]
+    #process the word count file; a binary word count file is memory-mapped and only the counts of
+    #the topic words are looked up
+    with Profiling.stage("read word counts"):
+        wordcount = WordCountFile.load(args.wordcount_file)
 
-#print the overall topic coherence for all topics
-print "=========================================================================="
-print "Average Topic Coherence = %.3f" % np.mean(mean_coherence_list)
-print "Median Topic Coherence = %.3f" % np.median(mean_coherence_list)
+    print_observed_coherence(topic_lists, topic_tw, wordcount, args.metric, args.topns)
@@ -6,272 +6,1430 @@ Date:           May 2013
 import argparse
 import sys
 import os
-import threading
 import time
 import codecs
-from multiprocessing import Pool
+import array
+import mmap
+import tempfile
+import ctypes
+import hashlib
+import bisect
+import collections
+import itertools
+import json
+import math
+import resource
+import zlib
+import numpy as np
+from multiprocessing import Pool, Lock, RawArray, cpu_count
+import WordCountFile
+import TokenizeCorpus
+import PartitionFile
+import CorpusFile
+import CountMinSketch
+import Profiling
 
 #parser arguments
+###############
+#count options#
+###############
+#shared with ComputeCoherence.py: count_parser is the parent parser of both parsers, and their main
+#functions validate the options with check_count_options
+count_parser = argparse.ArgumentParser(add_help=False)
+count_parser.add_argument("-m", "--count_mode", default="auto", \
+    choices=["auto", "sliding", "vectorized", "recompute"], \
+    help="how the windows are counted; 'sliding' updates the window incrementally as it slides " + \
+    "over the document, 'vectorized' computes the window presence and co-occurrence counts with " + \
+    "numpy array operations and 'recompute' rebuilds every window from scratch. All modes " + \
+    "produce identical counts. 'auto' uses 'vectorized' if there are at most 5000 distinct topic " + \
+    "words, and 'sliding' otherwise. Default = auto")
+count_parser.add_argument("-p", "--processes", type=int, default=None, \
+    help="number of worker processes. Default = number of CPUs")
+count_parser.add_argument("-c", "--chunk_size", type=float, default=64, \
+    help="size (in MB) of the chunks that the corpus partitions are split into; each chunk is " + \
+    "processed by a separate worker, largest first. 0 = do not split the partitions. Default = 64")
+count_parser.add_argument("-s", "--count_store", default=None, \
+    help="directory of a persistent count store; the counts of the words and pairs that are " + \
+    "already in the store (for the same corpus partitions and window size) are reused, only the " + \
+    "missing ones are counted and the store is updated with them")
+count_parser.add_argument("--sample_rate", type=float, default=1.0, \
+    help="approximate the counts by counting a random sample of this share of the documents " + \
+    "(the same documents for the same corpus and seed) and scaling the counts up; the word " + \
+    "count file records the sample size, from which ComputeObservedCoherence.py derives error " + \
+    "bounds. Default = 1.0 (count all the documents)")
+count_parser.add_argument("--sketch_size", type=float, default=0, \
+    help="approximate the pair counts with a Count-Min sketch of this size (in MB, for all the " + \
+    "window sizes) instead of one exact count per pair; the estimates can only be too high, and " + \
+    "the word count file records the bound of the error. Default = 0 (exact pair counts)")
+count_parser.add_argument("--seed", type=int, default=1, \
+    help="random seed of the document sample and of the sketch hash functions. Default = 1")
+count_parser.add_argument("--count_memory", type=float, default=1024, \
+    help="memory budget (in MB) of the count arrays of a process; larger count arrays are kept " + \
+    "in memory-mapped files instead (see --spill_dir), which are written out to disk under " + \
+    "memory pressure. Default = 1024")
+count_parser.add_argument("--spill_dir", default=None, \
+    help="directory of the memory-mapped count arrays that do not fit in the memory budget. " + \
+    "Default = the system temporary directory")
+
 desc = "Computes the word pair co-occurrences for topics. Parallel processing is achieved by \
     splitting the corpus into multiple partitions."
-parser = argparse.ArgumentParser(description=desc)
+parser = argparse.ArgumentParser(description=desc, parents=[count_parser])
 #####################
 #positional argument#
 #####################
-parser.add_argument("topic_file", help="file that contains the topics")
-parser.add_argument("ref_corpus_dir", help="directory that contains the reference corpus")
-args = parser.parse_args()
+parser.add_argument("topic_files", nargs="+", help="file(s) that contain the topics; the " + \
+    "topics of multiple files (e.g. of different models) are counted in a single pass over the " + \
+    "corpus, and their word counts are written to one file per topic file (see -o and -b)")
+parser.add_argument("ref_corpus_dir", help="directory that contains the reference corpus (or " + \
+    "the tokenized corpus created by TokenizeCorpus.py); the partitions can be compressed with " + \
+    "gzip, bzip2 or zstd")
+
+###################
+#optional argument#
+###################
+parser.add_argument("-w", "--window_sizes", default="20", \
+    help="comma-separated list of sizes of the sliding window (0 = use document as window), " + \
+    "e.g. '-w 10,20,50'; all the sizes are counted in a single pass over the corpus, and each " + \
+    "gets its own word count output. Default = 20")
+parser.add_argument("-o", "--output_file", default=None, \
+    help="write the word counts to this file (in the text format) instead of printing them; " + \
+    "with multiple window sizes, '.ws<size>' is appended to the file name for each size; with " + \
+    "multiple topic files, this is a directory, and the word counts of each topic file are " + \
+    "written to the file of the same name in it")
+parser.add_argument("-b", "--binary_output", default=None, \
+    help="write the word counts to this file in the binary (memory-mappable) format instead of " + \
+    "printing them in the text format; with multiple window sizes, '.ws<size>' is appended to " + \
+    "the file name for each size; with multiple topic files, this is a directory (as for -o)")
+parser.add_argument("--stats_file", default=None, \
+    help="write the throughput statistics of the run (totals, rates and the statistics of each " + \
+    "chunk of the corpus) to this file in JSON format")
+parser.add_argument("--shard", default=None, \
+    help="count only shard <index>/<num_shards> (e.g. 0/8, starting from 0) of the corpus " + \
+    "partitions (balanced by size) and write a partial count file (-o) instead of the word " + \
+    "counts; the partial count files of all the shards are combined with MergeWordCount.py")
+parser.add_argument("--profile", default=None, \
+    help="profile the run (the main and worker processes, and the time of each stage) and " + \
+    "write the profiles to files with this prefix (see Profiling.py)")
 
 #parameters
-window_size = 20 #size of the sliding window; 0 = use document as window
 colloc_sep = "_" #symbol for concatenating collocations
 debug = False
+vectorized_max_words = 5000 #largest number of topic words for which 'auto' uses the vectorized mode
+vectorized_block_size = 2**22 #maximum size of the intermediate window x word arrays (vectorized)
+token_block_size = 2**20 #number of tokens of a tokenized partition that are mapped to ids at a time
+batch_size = 2**24 #(decompressed) bytes of a compressed partition sent to a worker at a time
+max_pending_batches = 2 #number of batches (per worker process) that are read ahead of the workers
+progress_interval = 10 #minimum number of seconds between the progress reports
+sketch_depth = 4 #number of rows of the Count-Min sketch; the error bound holds with probability
+                 #1 - e^-sketch_depth
 
 #constants
 TOTALWKEY = "!!<TOTAL_WINDOWS>!!" #key name for total number of windows (in wordcount)
-
-#input
-topic_file = codecs.open(args.topic_file, "r", "utf-8")
+SAMPLEDWKEY = "!!<SAMPLED_WINDOWS>!!" #key name for number of windows of the document sample
+PAIRERRORKEY = "!!<PAIR_COUNT_ERROR>!!" #key name for error bound of the sketched pair counts
+MASK64 = 2**64 - 1
 
 #global variables
-#a dictionary that stores related topic words, e.g. { "space": set(["space", "earth", ...]), ... }
-topic_word_rel = {}
-unigram_list = [] #a list of unigrams (from topic words and candidates)
-unigram_rev = {} #a reverse index of unigrams
-word_count = {} #word counts (both single and pair)
-corpus_partitions = [] #a list of the partitions of the corpus
+#read-only topic structures of a worker process, set once by init_worker so that they are not sent
+#again with every chunk
+worker_data = {}
+#throughput statistics of the last count (see count_topic_words): the statistics of each chunk, the
+#progress and, once the count is done, the summary
+count_stats = {}
 
-#locks
-wc_lock = threading.Lock()
 
-####################
-#call back function#
-####################
-def calcwcngram_complete(worker_wordcount):
-    wc_lock.acquire()
-    global num_comp
-    global ord_count
+##################
+#worker functions#
+##################
+#initialise a worker process with the topic structures (and those derived from them for the count
+#mode) that are shared by all the chunks it processes, and with the shared-memory count arrays
+#(indexed by window size and word/pair id) that all workers add their counts to. The related pairs
+#are given in CSR form (see get_topic_relation), and the position of a pair in rel_indices is its
+#pair id. sample is the (threshold, seed) of the document sample and sketch the (depth, width,
+#seed) of the Count-Min sketch of the pair counts, or None when all the documents or pairs are
+#counted exactly; spill_dir is the directory of the memory-mapped count arrays, or None if they
+#are kept in memory (see new_count_buffer)
+def init_worker(count_mode, window_sizes, unigram_rev, topic_word_list, rel_indptr, rel_indices, \
+    shared_counts, sample=None, sketch=None, spill_dir=None):
+    worker_data["window_sizes"] = window_sizes
+    worker_data["unigram_rev"] = unigram_rev
+    worker_data["shared_counts"] = shared_counts
+    worker_data["sample"] = sample
+    worker_data["sketch"] = sketch
+    worker_data["spill_dir"] = spill_dir
+    worker_data["num_words"] = len(topic_word_list)
+    worker_data["num_pairs"] = len(rel_indices)
 
-    #update the wordcount from the worker
-    for k, v in worker_wordcount.items():
-        curr_v = 0
-        if k in word_count:
-            curr_v = word_count[k]
-        curr_v += v
-        word_count[k] = curr_v
+    #the topic words of a document are found with an automaton over the unigram ids; unigram topics
+    #in the vectorized mode are looked up with an array instead
+    worker_data["has_colloc"] = any([ " " in item for item in topic_word_list ])
+    if count_mode != "vectorized" or worker_data["has_colloc"]:
+        worker_data["ngram_automaton"] = build_ngram_automaton(topic_word_list, unigram_rev)
+    if count_mode == "vectorized":
+        worker_data["unigram_word_ids"] = get_unigram_word_ids(unigram_rev, topic_word_list)
+        worker_data["rel_indptr"] = rel_indptr
+        worker_data["rel_indices"] = rel_indices
+    else:
+        #the pairs are looked up one at a time (see get_pair_id), which is faster in arrays of
+        #machine integers than in numpy arrays
+        worker_data["rel_indptr"] = array.array("l", rel_indptr.astype(np.dtype("l")).tostring())
+        worker_data["rel_indices"] = array.array("l", rel_indices.astype(np.dtype("l")).tostring())
 
-    wc_lock.release()
+#allocate size zeroed 64-bit counts (a ctypes array): in memory (shared with the worker processes if
+#shared is set), or, if spill_dir is given, in a memory-mapped temporary file of spill_dir, which is
+#deleted as soon as it is mapped; the operating system writes its pages out to disk under memory
+#pressure, so the counts are not limited by the memory
+def new_count_buffer(size, spill_dir=None, shared=False):
+    if spill_dir is not None and size > 0:
+        f = tempfile.TemporaryFile(dir=spill_dir)
+        f.truncate(size*8)
+        count_map = mmap.mmap(f.fileno(), size*8)
+        f.close()
+        return (ctypes.c_int64*size).from_buffer(count_map)
+    if shared:
+        return RawArray(ctypes.c_int64, size)
+    return (ctypes.c_int64*size)()
 
+#numpy view (num_rows x row size) of a count buffer
+def as_count_matrix(count_buffer, num_rows):
+    return np.frombuffer(count_buffer, dtype=np.int64).reshape(num_rows, \
+        len(count_buffer) // num_rows)
+
+#ctypes views of the rows of a count buffer, in which single counts are updated faster than in a
+#numpy array
+def get_count_rows(count_buffer, num_rows):
+    row_size = len(count_buffer) // num_rows
+    return [ (ctypes.c_int64*row_size).from_buffer(count_buffer, i*row_size*8) \
+        for i in range(num_rows) ]
+
+#the count buffers of a worker for a chunk: (window size id x word id) and (window size id x pair
+#id, or x sketch counter)
+def new_worker_counts():
+    num_sizes = len(worker_data["window_sizes"])
+    num_pair_counts = worker_data["num_pairs"]
+    if worker_data["sketch"] is not None:
+        num_pair_counts = worker_data["sketch"][0]*worker_data["sketch"][1]
+    return new_count_buffer(num_sizes*worker_data["num_words"], worker_data["spill_dir"]), \
+        new_count_buffer(num_sizes*num_pair_counts, worker_data["spill_dir"])
+
+#add the counts of a worker to the shared counts; the counts are given as (window size id x word
+#id) and (window size id x pair id, or sketch counter) arrays, and the number of windows as a list
+#(one per window size). Returns the number of pair updates (the sum of the pair counts)
+def add_shared_counts(word_counts, pair_counts, num_windows):
+    shared_lock, shared_word_counts, shared_pair_counts, shared_windows = \
+        worker_data["shared_counts"]
+    #only the non-zero counts are added
+    word_ids = np.nonzero(word_counts.ravel())[0]
+    pair_ids = np.nonzero(pair_counts.ravel())[0]
+    shared_lock.acquire()
+    np.frombuffer(shared_word_counts, dtype=np.int64)[word_ids] += word_counts.ravel()[word_ids]
+    np.frombuffer(shared_pair_counts, dtype=np.int64)[pair_ids] += pair_counts.ravel()[pair_ids]
+    np.frombuffer(shared_windows, dtype=np.int64)[:] += num_windows
+    shared_lock.release()
+
+    #every pair update is counted in each row of a sketch
+    if worker_data["sketch"] is not None:
+        return int(np.sum(pair_counts)) // worker_data["sketch"][0]
+    return int(np.sum(pair_counts))
+
+#add counts to the pair counts of a window size (an array indexed by pair id, or a sketch); the
+#pair ids are distinct
+def add_pair_counts(pair_counts, pair_ids, counts):
+    sketch = worker_data["sketch"]
+    if sketch is not None:
+        CountMinSketch.add(pair_counts, pair_ids, counts, *sketch)
+    else:
+        pair_counts[pair_ids] += counts
+
+#add the count buffers of a worker (see new_worker_counts) to the shared counts. With a sketch, the
+#sliding and recompute modes count the pairs in one {pair_id: count} dictionary per window size
+#(pair_count_dicts), which are added to the sketch first
+def add_worker_counts(word_buffer, pair_buffer, num_windows, pair_count_dicts=None):
+    num_sizes = len(worker_data["window_sizes"])
+    pair_counts = as_count_matrix(pair_buffer, num_sizes)
+    with Profiling.stage("merge worker counts"):
+        if pair_count_dicts is not None:
+            for i, counts in enumerate(pair_count_dicts):
+                add_pair_counts(pair_counts[i], np.array(counts.keys(), dtype=np.int64), \
+                    np.array(counts.values(), dtype=np.int64))
+        return add_shared_counts(as_count_matrix(word_buffer, num_sizes), pair_counts, num_windows)
+
+#the counters of a worker for a chunk in the sliding or recompute mode: the count buffers and, per
+#window size, the word and pair counters that are updated one count at a time (rows of the count
+#buffers, or {pair_id: count} dictionaries for a sketch)
+def new_worker_counters():
+    num_sizes = len(worker_data["window_sizes"])
+    word_buffer, pair_buffer = new_worker_counts()
+    if worker_data["sketch"] is not None:
+        pair_counters = [ collections.defaultdict(int) for i in range(num_sizes) ]
+    else:
+        pair_counters = get_count_rows(pair_buffer, num_sizes)
+    return word_buffer, pair_buffer, get_count_rows(word_buffer, num_sizes), pair_counters
+
+#start the statistics of a chunk
+def new_chunk_stats(worker_num, corpus_chunk):
+    return {"chunk_id": worker_num, "partition": corpus_chunk[0], "start": corpus_chunk[1], \
+        "end": corpus_chunk[2], "pid": os.getpid(), "lines": 0, "tokens": 0, \
+        "tokenize_time": 0.0, "start_time": time.time()}
+
+#pass through the documents of a chunk, recording their number and tokens, and the time spent in
+#reading and tokenizing them (rather than counting)
+def track_docs(docs, chunk_stats):
+    docs = iter(docs)
+    while True:
+        read_start = time.time()
+        try:
+            words = next(docs)
+        except StopIteration:
+            chunk_stats["tokenize_time"] += time.time() - read_start
+            return
+        chunk_stats["tokenize_time"] += time.time() - read_start
+        chunk_stats["lines"] += 1
+        chunk_stats["tokens"] += len(words)
+        yield words
+
+#complete the statistics of a chunk with the number of windows counted (over all the window sizes),
+#the number of pair updates, the time taken and the peak memory (RSS) of the worker so far
+def finish_chunk_stats(chunk_stats, total_windows, pair_updates):
+    chunk_stats["windows"] = sum(total_windows)
+    chunk_stats["pair_updates"] = pair_updates
+    chunk_stats["time"] = time.time() - chunk_stats.pop("start_time")
+    chunk_stats["count_time"] = chunk_stats["time"] - chunk_stats["tokenize_time"]
+    Profiling.add_stage_time("read and tokenize", chunk_stats["tokenize_time"])
+    Profiling.add_stage_time("count windows", chunk_stats["count_time"])
+    chunk_stats["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    return chunk_stats
+
+#the key of a corpus partition in the document sample, from its name and the seed
+def get_sample_key(corpus_file, seed):
+    return ((zlib.crc32(os.path.basename(corpus_file)) & 0xffffffff) << 32) + seed
+
+#whether the document at a position of a corpus partition (the byte offset of its line, or its
+#document number in a tokenized partition) is in the document sample, i.e. whether its hash is below
+#the threshold; the decision only depends on the partition name, the position and the seed, so the
+#sample does not change with the chunk size or the number of processes
+def in_sample(sample_key, position, threshold):
+    x = (sample_key + position*0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30))*0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27))*0x94D049BB133111EB) & MASK64
+    return (x ^ (x >> 31)) < threshold
+
+#read the lines (documents) of a chunk of a corpus partition; the chunk boundaries are aligned to
+#line boundaries, and the lines are split the same way as codecs.open would. A chunk of a compressed
+#partition is a batch of lines that is decompressed by the main process and given in the chunk.
+#If keep is given, only the lines for which keep(byte offset of the line) is true are read
+def read_corpus_chunk(corpus_chunk, keep=None):
+    if len(corpus_chunk) == 4:
+        for item in CorpusFile.split_lines(corpus_chunk[3], corpus_chunk[1], keep):
+            yield item
+        return
+
+    corpus_file, start, end = corpus_chunk
+    f = open(corpus_file, "rb")
+    f.seek(start)
+    position = f.tell()
+    while position < end:
+        line = f.readline()
+        if not line:
+            break
+        if keep is not None and not keep(position):
+            position = f.tell()
+            continue
+        position = f.tell()
+        for item in line.decode("utf-8").splitlines(True):
+            yield item
+    f.close()
 
-##################
-#worker functions#
-##################
 def convert_to_index(wordlist, unigram_rev):
-    ids = []
+    return [ unigram_rev.get(word, 0) for word in wordlist.split() ]
 
-    for word in wordlist.split():
-        if word in unigram_rev:
-            ids.append(unigram_rev[word])
-        else:
-            ids.append(0) 
+#read the documents of a corpus chunk as lists of unigram ids (0 = not a topic unigram). A chunk of
+#a tokenized partition (see TokenizeCorpus.py) is a range of token offsets aligned to document
+#boundaries; its memory-mapped term ids are mapped to unigram ids with an array lookup, without
+#decoding or splitting any text. If as_array is set, the documents of a tokenized partition are
+#given as numpy arrays instead of lists. With a document sample, only the documents in the sample
+#are read
+def read_corpus_docs(corpus_chunk, unigram_rev, as_array=False):
+    corpus_file, start, end = corpus_chunk[:3]
+    keep = None
+    if worker_data.get("sample") is not None:
+        threshold, seed = worker_data["sample"]
+        sample_key = get_sample_key(corpus_file, seed)
+        keep = lambda position: in_sample(sample_key, position, threshold)
+    if not TokenizeCorpus.is_tokenized(corpus_file):
+        for line in read_corpus_chunk(corpus_chunk, keep):
+            yield convert_to_index(line, unigram_rev)
+        return
+
+    #the unigram id of each term id of the partition, loaded once per worker
+    vocab_maps = worker_data.setdefault("vocab_maps", {})
+    if corpus_file not in vocab_maps:
+        vocab_maps[corpus_file] = TokenizeCorpus.load_vocab_map(corpus_file, unigram_rev)
+    vocab_map = vocab_maps[corpus_file]
+    tokens, doc_offsets = TokenizeCorpus.load_tokens(corpus_file)
+
+    #the documents that start in the chunk; the last chunk also has the empty documents at the end
+    first_doc = int(np.searchsorted(doc_offsets[:-1], start))
+    if end >= doc_offsets[-1]:
+        last_doc = len(doc_offsets) - 1
+    else:
+        last_doc = int(np.searchsorted(doc_offsets[:-1], end))
 
-    return ids
+    #map the tokens in blocks of documents of about token_block_size tokens
+    doc_id = first_doc
+    while doc_id < last_doc:
+        block_end = int(np.searchsorted(doc_offsets[:last_doc+1], doc_offsets[doc_id] + \
+            token_block_size, side="right")) - 1
+        block_end = max(block_end, doc_id+1)
+        block_offsets = np.asarray(doc_offsets[doc_id:block_end+1]) - doc_offsets[doc_id]
+        words = vocab_map[tokens[doc_offsets[doc_id]:doc_offsets[block_end]]]
+        if not as_array:
+            words = words.tolist()
+        block_offsets = block_offsets.tolist()
+        for i in range(len(block_offsets)-1):
+            if keep is not None and not keep(doc_id + i):
+                continue
+            yield words[block_offsets[i]:block_offsets[i+1]]
+        doc_id = block_end
 
-#update the word count of a given word
-def update_word_count(word, worker_wordcount):
-    count = 0
-    if word in worker_wordcount:
-        count = worker_wordcount[word]
-    count += 1
-    worker_wordcount[word] = count
+#number of windows of a document
+def get_num_windows(doc_len, window_size):
+    if window_size != 0:
+        return doc_len + window_size - 1
+    else:
+        return 1
+
+#update the word count of a given word (or pair) id
+def update_word_count(word, worker_wordcount, increment=1):
+    worker_wordcount[word] += increment
 
     if debug:
         print "\tupdating word count for =", word
 
-#update the word count given a pair of words
-def update_pair_word_count(w1, w2, topic_word_rel, worker_wordcount):
-    if (w1 in topic_word_rel and w2 in topic_word_rel[w1]) or \
-        (w2 in topic_word_rel and w1 in topic_word_rel[w2]):
-        if w1 > w2:
-            combined = w2 + "|" + w1
-        else:
-            combined = w1 + "|" + w2
-        update_word_count(combined, worker_wordcount)
+#the pair id of a pair of topic word ids (w1_id < w2_id), or -1 if the words are not related; the
+#related words of a word are sorted, so the pair is found by binary search
+def get_pair_id(w1_id, w2_id, rel_indptr, rel_indices):
+    end = rel_indptr[w1_id+1]
+    pos = bisect.bisect_left(rel_indices, w2_id, rel_indptr[w1_id], end)
+    if pos < end and rel_indices[pos] == w2_id:
+        return pos
+    return -1
 
-#given a sentence, find all ngrams (unigram or above)
-def get_ngrams(words, topic_word_rel):
-    if debug:
-        for word in words:
-            if word > 0:
-                print word, "=", unigram_list[word-1]
-
-    all_ngrams = []
-    ngram = []
-    for i in range(0, len(words)):
-        if (words[i] == 0):
-            if len(ngram) > 0:
-                all_ngrams.append(ngram)
-                ngram = []
-        else:
-            ngram.append(unigram_list[words[i]-1])
-    #append the last ngram
-    if len(ngram) > 0:
-        all_ngrams.append(ngram)
-        ngram = []
-
-    #permutation within ngrams
-    ngrams_perm = []
-    for ngram in all_ngrams:
-        for i in range(1, len(ngram)+1):
-            for j in range(0, len(ngram)-i+1):
-                comb = [ item for item in ngram[j:j+i] ]
-                ngrams_perm.append(' '.join(comb))
-
-    #remove duplicates
-    ngrams_perm = list(set(ngrams_perm))
-
-    #only include ngrams that are found in topic words
-    ngrams_final = []
-    for ngram_perm in ngrams_perm:
-        if ngram_perm in topic_word_rel:
-            ngrams_final.append(ngram_perm)
-         
-    return ngrams_final
-
-#calculate word counts, given a list of words
-def calc_word_count(words, topic_word_rel, unigram_list, worker_wordcount):
-
-    ngrams = get_ngrams(words, topic_word_rel)
+#update the word count given a pair of words (topic word ids); only related pairs are counted
+def update_pair_word_count(w1_id, w2_id, rel_indptr, rel_indices, worker_pair_counts, increment=1):
+    if w1_id > w2_id:
+        w1_id, w2_id = w2_id, w1_id
+    pair_id = get_pair_id(w1_id, w2_id, rel_indptr, rel_indices)
+    if pair_id >= 0:
+        update_word_count(pair_id, worker_pair_counts, increment)
+
+#build an Aho-Corasick automaton over the topic words (as sequences of unigram ids), so that the
+#topic words (unigrams and collocations) of a document are all found in one pass over it. State 0
+#is the root; goto[s] maps a unigram id to the next state, fail[s] is the state of the longest
+#proper suffix of s that is also a prefix of a topic word, and output[s] lists the (length, topic
+#word id) of the topic words that end at s
+def build_ngram_automaton(topic_word_list, unigram_rev):
+    goto = [{}]
+    output = [[]]
+    for word_id, word in enumerate(topic_word_list):
+        state = 0
+        for unigram in word.split():
+            unigram_id = unigram_rev[unigram]
+            if unigram_id not in goto[state]:
+                goto[state][unigram_id] = len(goto)
+                goto.append({})
+                output.append([])
+            state = goto[state][unigram_id]
+        output[state].append((len(word.split()), word_id))
 
+    #compute the failure links breadth-first, so that the links (and outputs) of the shorter
+    #suffixes are complete when they are used
+    fail = [0] * len(goto)
+    queue = collections.deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for unigram_id, next_state in goto[state].items():
+            queue.append(next_state)
+            fail_state = fail[state]
+            while fail_state != 0 and unigram_id not in goto[fail_state]:
+                fail_state = fail[fail_state]
+            fail[next_state] = goto[fail_state].get(unigram_id, 0)
+            output[next_state] = output[next_state] + output[fail[next_state]]
+
+    return goto, fail, output
+
+#find all the topic words of a document (a list of unigram ids; 0 = not a topic unigram); returns
+#a list of (start position, end position, topic word id), sorted by end position
+def find_ngrams(words, ngram_automaton):
+    goto, fail, output = ngram_automaton
+    matches = []
+    state = 0
+    for pos, unigram_id in enumerate(words):
+        while state != 0 and unigram_id not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(unigram_id, 0)
+        for (length, word_id) in output[state]:
+            matches.append((pos-length+1, pos, word_id))
+
+    return matches
+
+#calculate word counts, given the (distinct) topic word ids of a window
+def calc_word_count(ngram_ids, rel_indptr, rel_indices, worker_word_counts, worker_pair_counts):
     if debug:
-        print "\nngrams =", ngrams, "\n"
+        print "\nngrams =", ngram_ids, "\n"
 
-    for ngram in ngrams:
-        if (ngram in topic_word_rel):
-            update_word_count(ngram, worker_wordcount)
+    for ngram_id in ngram_ids:
+        update_word_count(ngram_id, worker_word_counts)
 
-    for w1_id in range(0, len(ngrams)-1):
-        for w2_id in range(w1_id+1, len(ngrams)):
+    for i in range(0, len(ngram_ids)-1):
+        for j in range(i+1, len(ngram_ids)):
             if debug:
-                print "\nChecking pair (", ngrams[w1_id], ",", ngrams[w2_id], ")"
-            update_pair_word_count(ngrams[w1_id], ngrams[w2_id], topic_word_rel, worker_wordcount)
+                print "\nChecking pair (", ngram_ids[i], ",", ngram_ids[j], ")"
+            update_pair_word_count(ngram_ids[i], ngram_ids[j], rel_indptr, rel_indices, \
+                worker_pair_counts)
+
+#calculate the word counts of a document by sliding the window over it incrementally: at each
+#step the topic words completed by the entering token are added and those started by the leaving
+#token are dropped. Instead of counting every window, we keep track of the window id since which
+#each topic word has been present and add the length of the presence span (and its overlap with
+#the other present topic words) when it drops out of the window. matches are the topic words of
+#the document, as returned by find_ngrams
+def calc_word_count_sliding(matches, doc_len, window_size, rel_indptr, rel_indices, \
+    worker_word_counts, worker_pair_counts):
+    num_windows = get_num_windows(doc_len, window_size)
+
+    ngram_freq = {} #number of occurrences of each topic word in the current window
+    ngram_since = {} #window id since which each topic word is present
+    ngram_starts = {} #topic words in the current window, indexed by their start position
+
+    #add a topic word occurrence to the window (window id = tail_id)
+    def enter(start, ngram, tail_id):
+        if ngram in ngram_freq:
+            ngram_freq[ngram] += 1
+        else:
+            ngram_freq[ngram] = 1
+            ngram_since[ngram] = tail_id
+        if start in ngram_starts:
+            ngram_starts[start].append(ngram)
+        else:
+            ngram_starts[start] = [ngram]
+
+    #remove a topic word that is no longer present since window tail_id
+    def leave(ngram, tail_id):
+        since = ngram_since.pop(ngram)
+        del ngram_freq[ngram]
+        update_word_count(ngram, worker_word_counts, tail_id - since)
+        for other, other_since in ngram_since.items():
+            overlap = tail_id - max(since, other_since)
+            if overlap > 0:
+                update_pair_word_count(ngram, other, rel_indptr, rel_indices, worker_pair_counts, \
+                    overlap)
+
+    if window_size == 0:
+        for (start, end, ngram) in matches:
+            enter(start, ngram, 1)
+    else:
+        next_match = 0
+        for tail_id in range(1, num_windows+1):
+            head_id = tail_id - window_size
+
+            #the topic words completed by the token that enters the window; a topic word longer
+            #than the window is never in it
+            pos = tail_id - 1
+            while next_match < len(matches) and matches[next_match][1] == pos:
+                start, end, ngram = matches[next_match]
+                if end - start < window_size:
+                    enter(start, ngram, tail_id)
+                next_match += 1
+
+            #the token that leaves the window
+            if head_id > 0 and (head_id-1) in ngram_starts:
+                for ngram in ngram_starts.pop(head_id-1):
+                    ngram_freq[ngram] -= 1
+                    if ngram_freq[ngram] == 0:
+                        leave(ngram, tail_id)
+
+    #flush the topic words that are still present at the end of the document
+    for ngram in ngram_since.keys():
+        leave(ngram, num_windows+1)
+
+    return num_windows
+
+#worker function for the sliding count mode
+@Profiling.profiled
+def calcwcngram_sliding(worker_num, corpus_chunk):
+    window_sizes = worker_data["window_sizes"]
+    unigram_rev = worker_data["unigram_rev"]
+    rel_indptr = worker_data["rel_indptr"]
+    rel_indices = worker_data["rel_indices"]
+    ngram_automaton = worker_data["ngram_automaton"]
+    #word and pair counters (by id) per window size
+    word_buffer, pair_buffer, worker_word_counts, worker_pair_counts = new_worker_counters()
+    total_windows = [0] * len(window_sizes)
+    chunk_stats = new_chunk_stats(worker_num, corpus_chunk)
+
+    for words in track_docs(read_corpus_docs(corpus_chunk, unigram_rev), chunk_stats):
+        #find the topic words of the document (a list of word indexes); the matches are shared by
+        #all the window sizes
+        matches = find_ngrams(words, ngram_automaton)
+        for i, window_size in enumerate(window_sizes):
+            total_windows[i] += calc_word_count_sliding(matches, len(words), window_size, \
+                rel_indptr, rel_indices, worker_word_counts[i], worker_pair_counts[i])
+
+    pair_updates = add_worker_counts(word_buffer, pair_buffer, total_windows, \
+        worker_pair_counts if worker_data["sketch"] is not None else None)
+    return finish_chunk_stats(chunk_stats, total_windows, pair_updates)
+
+#the topic word id of each unigram id (-1 if the unigram is not itself a topic word), used by the
+#vectorized mode
+def get_unigram_word_ids(unigram_rev, topic_word_list):
+    unigram_word_ids = -np.ones(len(unigram_rev)+1, dtype=np.int64)
+    for word_id, word in enumerate(topic_word_list):
+        if word in unigram_rev:
+            unigram_word_ids[unigram_rev[word]] = word_id
+
+    return unigram_word_ids
+
+#related pairs of the topic words of a document (doc_ids, sorted): walk the related words of each
+#document word in the CSR relation and keep those that are also in the document. Returns the pair
+#ids and, for each pair, the columns (positions in doc_ids) of its two words. doc_columns is a
+#scratch array (one entry per topic word, all -1) used to look up the topic words of the document
+def get_doc_pairs(doc_ids, rel_indptr, rel_indices, doc_columns):
+    row_starts = rel_indptr[doc_ids]
+    row_lens = rel_indptr[doc_ids+1] - row_starts
+    pair_ids = np.repeat(row_starts - np.cumsum(row_lens) + row_lens, row_lens) + \
+        np.arange(int(np.sum(row_lens)))
+    doc_columns[doc_ids] = np.arange(len(doc_ids))
+    rows = np.repeat(np.arange(len(doc_ids)), row_lens)
+    cols = doc_columns[rel_indices[pair_ids]]
+    doc_columns[doc_ids] = -1
+    related = cols >= 0
+
+    return pair_ids[related], rows[related], cols[related]
+
+#calculate the word counts of a document for a window size with array operations; word_counts
+#(indexed by topic word id) and pair_counts (indexed by pair id, or a sketch) accumulate the counts
+#over documents. The topic word occurrences of the document are given by the arrays match_ends (end
+#position), match_lens (number of unigrams) and match_columns (position of the topic word in
+#doc_ids, the sorted topic word ids of the document); pair_ids, rows and cols are the related pairs
+#of the document (see get_doc_pairs). These do not depend on the window size, so they are computed
+#once and shared by all the window sizes
+def calc_word_count_vectorized(match_ends, match_lens, match_columns, doc_ids, pair_ids, rows, \
+    cols, doc_len, window_size, word_counts, pair_counts):
+    num_windows = get_num_windows(doc_len, window_size)
+
+    if window_size == 0:
+        #the document is the only window, so every topic word in it is present once
+        word_counts[doc_ids] += 1
+        add_pair_counts(pair_counts, pair_ids, 1)
+        return num_windows
+
+    #a topic word longer than the window is never in it
+    in_window = match_lens <= window_size
+    match_ends, match_lens, match_columns = \
+        match_ends[in_window], match_lens[in_window], match_columns[in_window]
+    if len(match_ends) == 0:
+        return num_windows
+
+    #a topic word of length l that ends at position p is present in the windows with tail id p+1
+    #to p-l+1+window_size. The presence only changes where a span starts or ends, so the windows
+    #are grouped into segments between these boundaries; we mark the start (+1) and the end (-1) of
+    #each presence span and integrate over the segments
+    starts = match_ends
+    ends = match_ends - match_lens + 1 + window_size
+    bounds = np.unique(np.concatenate((starts, ends)))
+    weights = np.diff(bounds).astype(np.float64) #number of windows in each segment
+    event_rows = np.concatenate((np.searchsorted(bounds, starts), np.searchsorted(bounds, ends)))
+    event_cols = np.concatenate((match_columns, match_columns))
+    event_deltas = np.concatenate((np.ones(len(starts), dtype=np.int32), \
+        -np.ones(len(starts), dtype=np.int32)))
+    order = np.argsort(event_rows, kind="mergesort")
+    event_rows, event_cols, event_deltas = event_rows[order], event_cols[order], event_deltas[order]
+
+    #the segment x word presence matrix is built in blocks of segments (carrying the running span
+    #count over), and the pairs in blocks, so that no intermediate array has more than
+    #vectorized_block_size elements
+    seg_block = max(1, vectorized_block_size // len(doc_ids))
+    pair_block = max(1, vectorized_block_size // seg_block)
+    span_count = np.zeros(len(doc_ids), dtype=np.int32)
+    for seg_start in range(0, len(weights), seg_block):
+        seg_end = min(seg_start + seg_block, len(weights))
+        spans = np.zeros((seg_end - seg_start, len(doc_ids)), dtype=np.int32)
+        first, last = np.searchsorted(event_rows, [seg_start, seg_end])
+        np.add.at(spans, (event_rows[first:last] - seg_start, event_cols[first:last]), \
+            event_deltas[first:last])
+        spans[0] += span_count
+        spans = np.cumsum(spans, axis=0, dtype=np.int32)
+        span_count = spans[-1].copy()
+        presence = spans > 0
+        del spans
+        block_weights = weights[seg_start:seg_end]
+
+        word_counts[doc_ids] += np.dot(block_weights, presence).astype(np.int64)
+        for i in range(0, len(pair_ids), pair_block):
+            block = slice(i, i+pair_block)
+            add_pair_counts(pair_counts, pair_ids[block], np.dot(block_weights, \
+                presence[:, rows[block]] & presence[:, cols[block]]).astype(np.int64))
+
+    return num_windows
+
+#worker function for the vectorized count mode
+@Profiling.profiled
+def calcwcngram_vectorized(worker_num, corpus_chunk):
+    window_sizes = worker_data["window_sizes"]
+    unigram_rev = worker_data["unigram_rev"]
+    unigram_word_ids = worker_data["unigram_word_ids"]
+    rel_indptr = worker_data["rel_indptr"]
+    rel_indices = worker_data["rel_indices"]
+    has_colloc = worker_data["has_colloc"]
+    total_windows = [0] * len(window_sizes)
+    #counts indexed by (window size id, topic word id) and (window size id, pair id)
+    word_buffer, pair_buffer = new_worker_counts()
+    word_counts = as_count_matrix(word_buffer, len(window_sizes))
+    pair_counts = as_count_matrix(pair_buffer, len(window_sizes))
+    doc_columns = -np.ones(word_counts.shape[1], dtype=np.int64)
+    chunk_stats = new_chunk_stats(worker_num, corpus_chunk)
+
+    for words in track_docs(read_corpus_docs(corpus_chunk, unigram_rev, not has_colloc), \
+        chunk_stats):
+        if has_colloc:
+            matches = np.array(find_ngrams(words, worker_data["ngram_automaton"]), \
+                dtype=np.int64).reshape(-1, 3)
+            match_ends = matches[:, 1]
+            match_lens = matches[:, 1] - matches[:, 0] + 1
+            match_ids = matches[:, 2]
+        else:
+            #unigram topics: the topic words are looked up directly
+            match_ids = unigram_word_ids[np.asarray(words, dtype=np.int64)]
+            match_ends = np.nonzero(match_ids >= 0)[0]
+            match_lens = np.ones(len(match_ends), dtype=np.int64)
+            match_ids = match_ids[match_ends]
+
+        if len(match_ids) == 0:
+            for i, window_size in enumerate(window_sizes):
+                total_windows[i] += get_num_windows(len(words), window_size)
+            continue
+
+        #the topic words and related pairs of the document, shared by all the window sizes
+        doc_ids, match_columns = np.unique(match_ids, return_inverse=True)
+        pair_ids, rows, cols = get_doc_pairs(doc_ids, rel_indptr, rel_indices, doc_columns)
+        for i, window_size in enumerate(window_sizes):
+            total_windows[i] += calc_word_count_vectorized(match_ends, match_lens, match_columns, \
+                doc_ids, pair_ids, rows, cols, len(words), window_size, word_counts[i], \
+                pair_counts[i])
+
+    pair_updates = add_worker_counts(word_buffer, pair_buffer, total_windows)
+    return finish_chunk_stats(chunk_stats, total_windows, pair_updates)
+
+#calculate the word counts of a document by rebuilding every window from scratch; matches are the
+#topic words of the document, as returned by find_ngrams
+def calc_word_count_recompute(matches, doc_len, window_size, rel_indptr, rel_indices, \
+    worker_word_counts, worker_pair_counts):
+    match_ends = [ end for (start, end, ngram) in matches ]
+    num_windows = get_num_windows(doc_len, window_size)
+
+    for tail_id in range(1, num_windows+1):
+        if window_size != 0:
+            head_id = tail_id - window_size
+            if head_id < 0:
+                head_id = 0
+            window_end = tail_id
+        else:
+            head_id = 0
+            window_end = doc_len
+
+        #the topic words that lie entirely in the window
+        first = bisect.bisect_left(match_ends, head_id)
+        last = bisect.bisect_left(match_ends, window_end)
+        ngram_ids = list(set([ ngram for (start, end, ngram) in matches[first:last] \
+            if start >= head_id ]))
+
+        if debug:
+            print "========================="
+            print "window =", head_id, "-", window_end
+
+        calc_word_count(ngram_ids, rel_indptr, rel_indices, worker_word_counts, worker_pair_counts)
+
+    return num_windows
 
 #primary worker function called by main
-def calcwcngram(worker_num, window_size, corpus_file, topic_word_rel, unigram_list, unigram_rev):
+@Profiling.profiled
+def calcwcngram(worker_num, corpus_chunk):
+    window_sizes = worker_data["window_sizes"]
+    unigram_rev = worker_data["unigram_rev"]
+    rel_indptr = worker_data["rel_indptr"]
+    rel_indices = worker_data["rel_indices"]
+    ngram_automaton = worker_data["ngram_automaton"]
+
     #now process the corpus file and sample the word counts
     line_num = 0
-    worker_wordcount = {}
-    total_windows = 0
+    #word and pair counters (by id) per window size
+    word_buffer, pair_buffer, worker_word_counts, worker_pair_counts = new_worker_counters()
+    total_windows = [0] * len(window_sizes)
+    chunk_stats = new_chunk_stats(worker_num, corpus_chunk)
 
-    #sys.stderr.write("Worker " + str(worker_num) + " starts: " + str(time.time()) + "\n")
-    for line in codecs.open(corpus_file, "r", "utf-8"):
-        #convert the line into a list of word indexes
-        words = convert_to_index(line, unigram_rev)
+    for words in track_docs(read_corpus_docs(corpus_chunk, unigram_rev), chunk_stats):
+        #find the topic words of the document (a list of word indexes), once per document
+        matches = find_ngrams(words, ngram_automaton)
 
         if debug:
             print "===================================================================="
-            print "line =", line
+            print "line_num =", line_num
             print "words =", " ".join([ str(item) for item in words])
 
-        i=0
-        doc_len = len(words)
-        #number of windows
-        if window_size != 0:
-            num_windows = doc_len + window_size - 1
+        for i, window_size in enumerate(window_sizes):
+            total_windows[i] += calc_word_count_recompute(matches, len(words), window_size, \
+                rel_indptr, rel_indices, worker_word_counts[i], worker_pair_counts[i])
+
+        line_num += 1
+
+    pair_updates = add_worker_counts(word_buffer, pair_buffer, total_windows, \
+        worker_pair_counts if worker_data["sketch"] is not None else None)
+    return finish_chunk_stats(chunk_stats, total_windows, pair_updates)
+
+####################
+#call back function#
+####################
+#record the statistics of a counted chunk and report the progress (at most every progress_interval
+#seconds)
+def count_chunk_complete(chunk_stats):
+    chunk_stats["bytes_read"] = count_stats["chunk_bytes"][chunk_stats["chunk_id"]]
+    count_stats["chunks"].append(chunk_stats)
+    count_stats["bytes_done"] += chunk_stats["bytes_read"]
+    for key in ["lines", "tokens", "windows", "pair_updates"]:
+        count_stats[key] += chunk_stats[key]
+
+    if time.time() - count_stats["last_report"] >= progress_interval:
+        count_stats["last_report"] = time.time()
+        report_progress()
+
+################
+#main functions#
+################
+#format a number of seconds as h:mm:ss
+def format_time(seconds):
+    seconds = int(seconds)
+    return "%d:%02d:%02d" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+#report the progress of the count (measured in bytes of the corpus files), the throughput so far and
+#the estimated time to completion
+def report_progress():
+    elapsed = max(time.time() - count_stats["start_time"], 1e-6)
+    done = float(count_stats["bytes_done"]) / max(count_stats["total_bytes"], 1)
+    eta = "unknown"
+    if done > 0:
+        eta = format_time(elapsed * (1 - done) / done)
+    sys.stderr.write("progress: %.1f%% of %.1f MB, %d of %d chunks, %.0f lines/s, %.0f tokens/s, " \
+        "%.2f MB/s, elapsed %s, ETA %s\n" % (100*done, count_stats["total_bytes"] / 2.0**20, \
+        len(count_stats["chunks"]), len(count_stats["chunk_bytes"]), \
+        count_stats["lines"] / elapsed, count_stats["tokens"] / elapsed, \
+        count_stats["bytes_done"] / elapsed / 2.0**20, format_time(elapsed), eta))
+    sys.stderr.flush()
+
+#summarise the statistics of the count: the totals, the rates (per second of the elapsed time; those
+#of each chunk are per second of its worker time) and the share of the worker time spent in reading
+#and tokenizing the corpus; the summary is printed and kept in count_stats["summary"]
+def summarise_count_stats(count_mode, window_sizes, processes):
+    elapsed = max(time.time() - count_stats["start_time"], 1e-6)
+    chunks = sorted(count_stats["chunks"], key=lambda x: x["chunk_id"])
+    rate_keys = ["lines", "tokens", "windows", "pair_updates", "bytes_read"]
+    totals = {}
+    for key in rate_keys + ["tokenize_time", "count_time"]:
+        totals[key] = sum([ chunk[key] for chunk in chunks ])
+    totals["peak_rss"] = max([ chunk["peak_rss"] for chunk in chunks ] + [0])
+    for chunk in chunks:
+        for key in rate_keys:
+            chunk[key + "_per_sec"] = chunk[key] / max(chunk["time"], 1e-6)
+    worker_time = max(totals["tokenize_time"] + totals["count_time"], 1e-6)
+
+    count_stats["summary"] = {"count_mode": count_mode, "window_sizes": window_sizes, \
+        "processes": processes or cpu_count(), "elapsed": elapsed, "totals": totals, \
+        "rates": dict([ (key + "_per_sec", totals[key] / elapsed) for key in rate_keys ]), \
+        "tokenize_fraction": totals["tokenize_time"] / worker_time, "chunks": chunks}
+
+    sys.stderr.write("counted %d lines (%.1f MB) in %s: %.0f lines/s, %.0f tokens/s, %.0f " \
+        "windows/s, %.0f pair updates/s, %.2f MB/s\n" % (totals["lines"], \
+        totals["bytes_read"] / 2.0**20, format_time(elapsed), totals["lines"] / elapsed, \
+        totals["tokens"] / elapsed, totals["windows"] / elapsed, totals["pair_updates"] / elapsed, \
+        totals["bytes_read"] / elapsed / 2.0**20))
+    sys.stderr.write("worker time: %.0f%% reading and tokenization, %.0f%% counting; peak worker " \
+        "RSS %.1f MB\n" % (100 * totals["tokenize_time"] / worker_time, \
+        100 * totals["count_time"] / worker_time, totals["peak_rss"] / 2.0**20))
+    sys.stderr.flush()
+
+#number of bytes of the corpus files in a chunk (the term ids of a tokenized partition, or the
+#compressed size of a compressed partition)
+def get_chunk_bytes(corpus_chunk):
+    if TokenizeCorpus.is_tokenized(corpus_chunk[0]):
+        return (corpus_chunk[2] - corpus_chunk[1]) * np.dtype(TokenizeCorpus.TOKEN_DTYPE).itemsize
+    return corpus_chunk[2] - corpus_chunk[1]
+
+#check that the window sizes are distinct and not negative (the word counts of each are written to
+#a file of its own); raises a ValueError otherwise
+def check_window_sizes(window_sizes):
+    if len(window_sizes) == 0:
+        raise ValueError("no window size is given")
+    if min(window_sizes) < 0:
+        raise ValueError("the window sizes must be 0 or more")
+    if len(set(window_sizes)) < len(window_sizes):
+        raise ValueError("the window sizes must be distinct")
+
+#parse a comma-separated list of window sizes (see check_window_sizes); raises a ValueError if it
+#is not valid
+def get_window_sizes(window_sizes):
+    try:
+        window_sizes = [ int(window_size) for window_size in window_sizes.split(",") ]
+    except ValueError:
+        raise ValueError("the window sizes must be a comma-separated list of integers")
+    check_window_sizes(window_sizes)
+    return window_sizes
+
+#check the count options of the command line (see count_parser); raises a ValueError if they are
+#not valid
+def check_count_options(args):
+    if args.count_store and (args.sample_rate < 1 or args.sketch_size > 0):
+        raise ValueError("approximate counts (--sample_rate, --sketch_size) cannot be kept in a " \
+            "count store (-s)")
+    if args.sample_rate <= 0 or args.sample_rate > 1:
+        raise ValueError("the sample rate must be in (0, 1]")
+
+#get the partitions of the reference corpus directory
+def get_corpus_partitions(ref_corpus_dir):
+    corpus_partitions = []
+    for f in os.listdir(ref_corpus_dir):
+        if not f.startswith("."):
+            corpus_partitions.append(ref_corpus_dir + "/" + f)
+
+    return corpus_partitions
+
+#split a corpus partition into chunks of about chunk_size bytes, aligned to line boundaries
+def split_partition(corpus_file, chunk_size):
+    file_size = os.path.getsize(corpus_file)
+    if chunk_size <= 0 or file_size <= chunk_size:
+        return [(corpus_file, 0, file_size)]
+
+    boundaries = [0]
+    f = open(corpus_file, "rb")
+    for offset in range(chunk_size, file_size, chunk_size):
+        if offset <= boundaries[-1]:
+            continue
+        #move the boundary to the start of the next line
+        f.seek(offset-1)
+        f.readline()
+        if f.tell() >= file_size:
+            break
+        boundaries.append(f.tell())
+    f.close()
+    boundaries.append(file_size)
+
+    return [ (corpus_file, boundaries[i], boundaries[i+1]) for i in range(len(boundaries)-1) ]
+
+#split a tokenized corpus partition into chunks of about chunk_size bytes of tokens; the chunks are
+#ranges of token offsets, aligned to document boundaries
+def split_tokenized_partition(partition_dir, chunk_size):
+    tokens, doc_offsets = TokenizeCorpus.load_tokens(partition_dir)
+    num_tokens = len(tokens)
+    chunk_tokens = chunk_size // tokens.itemsize
+    if chunk_size <= 0 or num_tokens <= chunk_tokens:
+        return [(partition_dir, 0, num_tokens)]
+
+    boundaries = [0]
+    for offset in range(chunk_tokens, num_tokens, chunk_tokens):
+        #move the boundary to the start of the next document
+        boundary = int(doc_offsets[np.searchsorted(doc_offsets, offset)])
+        if boundary > boundaries[-1] and boundary < num_tokens:
+            boundaries.append(boundary)
+    boundaries.append(num_tokens)
+
+    return [ (partition_dir, boundaries[i], boundaries[i+1]) for i in range(len(boundaries)-1) ]
+
+#check whether a corpus partition is compressed (with gzip, bzip2 or zstd)
+def is_compressed(corpus_partition):
+    return not os.path.isdir(corpus_partition) and \
+        CorpusFile.get_compression(corpus_partition) is not None
+
+#split the corpus partitions into chunks (of about chunk_size MB; 0 = do not split) and sort them by
+#size, so that the largest chunks are scheduled first and the smaller ones fill up the idle workers
+#at the end. A compressed partition cannot be split by seeking, so it is a single chunk; it is read
+#in batches when it is counted (see count_topic_words)
+def get_corpus_chunks(corpus_partitions, chunk_size):
+    corpus_chunks = []
+    for cp in corpus_partitions:
+        if is_compressed(cp):
+            corpus_chunks.append((cp, 0, os.path.getsize(cp)))
+        elif TokenizeCorpus.is_tokenized(cp):
+            TokenizeCorpus.check_source(cp)
+            corpus_chunks.extend(split_tokenized_partition(cp, int(chunk_size*1024*1024)))
         else:
-            num_windows = 1
-        #update the global total number of windows
-        total_windows += num_windows
+            corpus_chunks.extend(split_partition(cp, int(chunk_size*1024*1024)))
+    corpus_chunks.sort(key=lambda x: x[2]-x[1], reverse=True)
 
-        for tail_id in range(1, num_windows+1):
-            if window_size != 0:
-                head_id = tail_id - window_size
-                if head_id < 0:
-                    head_id = 0
-                words_in_window = words[head_id:tail_id]
-            else:
-                words_in_window = words
+    return corpus_chunks
 
-            if debug:
-                print "========================="
-                print "line_num =", line_num
-                print "words_in_window =", " ".join([ str(item) for item in words_in_window ])
+#get the relation of the topic words of topics (lists of topic words, with collocations concatenated
+#by colloc_sep), i.e. the pairs of different words that occur in a topic together, as integers:
+#returns (topic_word_list, rel_indptr, rel_indices), where topic_word_list is the sorted list of the
+#related topic words (with the collocations separated by spaces; the position of a word is its id)
+#and the related words of word i (with a larger id) are rel_indices[rel_indptr[i]:rel_indptr[i+1]]
+#(CSR form), sorted. The position of a pair in rel_indices is its pair id
+def get_topic_relation(topics):
+    #the distinct words of each topic; a topic with a single word has no pairs
+    topic_word_sets = []
+    for topic_words in topics:
+        #if it's collocation clean it so it's separated by spaces
+        word_set = set([ " ".join(word.split(colloc_sep)) for word in topic_words ])
+        if len(word_set) > 1:
+            topic_word_sets.append(word_set)
+    topic_word_list = sorted(set([]).union(*topic_word_sets))
+    word_index = dict([ (word, word_id) for word_id, word in enumerate(topic_word_list) ])
 
-            calc_word_count(words_in_window, topic_word_rel, unigram_list, \
-                worker_wordcount)
+    #the keys (w1_id*num_words + w2_id, w1_id < w2_id) of the pairs of each topic
+    pair_keys = []
+    triu = {} #upper triangle indices of the pairs of a topic, per number of words
+    for word_set in topic_word_sets:
+        word_ids = np.array(sorted([ word_index[word] for word in word_set ]), dtype=np.int64)
+        if len(word_ids) not in triu:
+            triu[len(word_ids)] = np.triu_indices(len(word_ids), 1)
+        rows, cols = triu[len(word_ids)]
+        pair_keys.append(word_ids[rows]*len(topic_word_list) + word_ids[cols])
 
-            i += 1
+    return build_topic_relation(topic_word_list, np.concatenate(pair_keys + [np.zeros(0, \
+        dtype=np.int64)]))
 
-        line_num += 1
+#build the relation (see get_topic_relation) of a sorted topic word list from the keys of the related
+#pairs (w1_id*num_words + w2_id, w1_id < w2_id), which may repeat
+def build_topic_relation(topic_word_list, pair_keys):
+    num_words = len(topic_word_list)
+    pair_keys = np.unique(np.asarray(pair_keys, dtype=np.int64))
+    rel_rows = pair_keys // max(num_words, 1)
+    rel_indices = pair_keys % max(num_words, 1)
+    rel_indptr = np.zeros(num_words+1, dtype=np.int64)
+    rel_indptr[1:] = np.cumsum(np.bincount(rel_rows, minlength=num_words))
 
-    #update the total windows seen for the worker
-    worker_wordcount["!!<TOTAL_WINDOWS>!!"] = total_windows
+    return topic_word_list, rel_indptr, rel_indices
 
-    return worker_wordcount
+#the related topic word pairs (w1, w2), w1 < w2, of a topic relation, in pair id order (sorted)
+def get_topic_pairs(topic_relation):
+    topic_word_list, rel_indptr, rel_indices = topic_relation
+    rel_rows = np.repeat(np.arange(len(topic_word_list)), np.diff(rel_indptr))
+    for w1_id, w2_id in zip(rel_rows.tolist(), rel_indices.tolist()):
+        yield topic_word_list[w1_id], topic_word_list[w2_id]
+
+#fingerprint of the corpus partitions (name, size and modification time) and the window size; the
+#counts in the count store are only valid for the same fingerprint. A tokenized partition has the
+#fingerprint of the corpus partition it was converted from, so both share the same counts
+def get_corpus_fingerprint(corpus_partitions, window_size):
+    fingerprint = hashlib.sha1("window_size=" + str(window_size) + "\n")
+    for cp in sorted(corpus_partitions):
+        if TokenizeCorpus.is_tokenized(cp):
+            corpus_file, size, mtime = PartitionFile.get_source(cp)
+        else:
+            corpus_stat = os.stat(cp)
+            corpus_file, size, mtime = cp, corpus_stat.st_size, repr(corpus_stat.st_mtime)
+        fingerprint.update(os.path.basename(corpus_file) + "\t" + str(size) + "\t" + mtime + "\n")
+    return fingerprint.hexdigest()
+
+#fingerprint of a topic relation (the topic words and related pairs); the partial counts of shards
+#can only be merged if they were counted for the same fingerprint
+def get_relation_fingerprint(topic_relation):
+    topic_word_list, rel_indptr, rel_indices = topic_relation
+    fingerprint = hashlib.sha1("\n".join(topic_word_list).encode("utf-8") + "\n")
+    fingerprint.update(rel_indptr.astype("<i8").tostring())
+    fingerprint.update(rel_indices.astype("<i8").tostring())
+    return fingerprint.hexdigest()
+
+#the name of a corpus partition (that of the corpus partition a tokenized partition was converted
+#from) and its size
+def get_partition_info(corpus_partition):
+    if TokenizeCorpus.is_tokenized(corpus_partition):
+        corpus_file, size, mtime = PartitionFile.get_source(corpus_partition)
+        return os.path.basename(corpus_file), size
+    return os.path.basename(corpus_partition), os.path.getsize(corpus_partition)
+
+#the corpus partitions of shard <shard> of num_shards: the partitions are assigned largest first to
+#the shard with the fewest bytes so far, so every host that has the same corpus computes the same
+#shards, of about the same size
+def get_shard_partitions(corpus_partitions, shard, num_shards):
+    partition_info = [ get_partition_info(cp) + (cp,) for cp in corpus_partitions ]
+    shard_bytes = [0]*num_shards
+    shard_partitions = []
+    for name, size, cp in sorted(partition_info, key=lambda x: (-x[1], x[0])):
+        i = shard_bytes.index(min(shard_bytes))
+        shard_bytes[i] += size
+        if i == shard:
+            shard_partitions.append(cp)
+
+    return shard_partitions
+
+#count the words and the related pairs of a topic relation (see get_topic_relation) over the corpus
+#chunks, for all the window sizes in a single pass; returns, for each window size, a dictionary of
+#the counts of all the words and pairs (including those that are zero) and the total number of
+#windows. With a sample_rate below 1, only a sample of the documents is counted and the counts are
+#scaled up; with a sketch_size (MB), the pair counts are estimated from a Count-Min sketch. The
+#sample size and the error bound of the pair counts are then also given in the dictionary
+#(SAMPLEDWKEY, PAIRERRORKEY). The count arrays of a process that exceed count_memory (MB) are kept in
+#memory-mapped files of spill_dir (the system temporary directory by default)
+def count_topic_words(topic_relation, corpus_chunks, window_sizes, count_mode, processes, \
+    sample_rate=1.0, sketch_size=0, seed=1, count_memory=1024, spill_dir=None):
+    #the words and pairs are counted by id (their position in topic_word_list and rel_indices),
+    #and only converted to string keys once they are counted
+    topic_word_list, rel_indptr, rel_indices = topic_relation
+
+    #sort the unigrams (of the topic words) and create a list and a reverse index
+    unigram_set = set([])
+    for word in topic_word_list:
+        unigram_set.update(word.split())
+    unigram_list = sorted(list(unigram_set))
+    unigram_rev = {}
+    unigram_id = 1
+    for unigram in unigram_list:
+        unigram_rev[unigram] = unigram_id
+        unigram_id += 1
+
+    #choose the count mode
+    if count_mode == "auto":
+        if len(topic_word_list) > vectorized_max_words:
+            count_mode = "sliding"
+        else:
+            count_mode = "vectorized"
+
+    #spawn multiple threads to process the corpus
+    if count_mode == "sliding":
+        worker_func = calcwcngram_sliding
+    elif count_mode == "vectorized":
+        worker_func = calcwcngram_vectorized
+    else:
+        worker_func = calcwcngram
+    #the documents of the sample are those whose hash (see in_sample) is below the threshold, and
+    #the sketch of each window size has sketch_depth rows of the width that fits in sketch_size
+    sample = None
+    if sample_rate < 1:
+        sample = (int(sample_rate * 2**64), seed)
+    sketch = None
+    num_pair_counts = len(rel_indices)
+    if sketch_size > 0:
+        sketch = (sketch_depth, CountMinSketch.get_width(int(sketch_size*1024*1024), sketch_depth, \
+            len(window_sizes)), seed)
+        num_pair_counts = sketch[0]*sketch[1]
+        sys.stderr.write("counting %d pairs in Count-Min sketches of %d x %d counters\n" % \
+            (len(rel_indices), sketch[0], sketch[1]))
+
+    #the count arrays are memory-mapped from files if they do not fit in the memory budget
+    num_sizes = len(window_sizes)
+    count_bytes = num_sizes*(len(topic_word_list) + num_pair_counts)*8
+    if count_bytes > count_memory*1024*1024:
+        spill_dir = spill_dir or tempfile.gettempdir()
+        sys.stderr.write("the count arrays (%.1f MB) exceed the memory budget of %g MB; they are " \
+            "memory-mapped from files in %s\n" % (count_bytes / 2.0**20, count_memory, spill_dir))
+    else:
+        spill_dir = None
+
+    #the workers add their counts to shared-memory arrays indexed by window size id and word/pair
+    #id (or sketch counter), so the main process does not receive or merge any per-chunk results
+    shared_counts = (Lock(), new_count_buffer(num_sizes*len(topic_word_list), spill_dir, True), \
+        new_count_buffer(num_sizes*num_pair_counts, spill_dir, True), \
+        RawArray(ctypes.c_int64, num_sizes))
+    #the workers return the statistics of each chunk, which are collected in count_stats; the
+    #progress is measured in bytes of the corpus files
+    count_stats.clear()
+    count_stats.update({"chunks": [], "chunk_bytes": {}, "bytes_done": 0, "lines": 0, "tokens": 0, \
+        "windows": 0, "pair_updates": 0, "start_time": time.time(), "last_report": time.time(), \
+        "total_bytes": sum([ get_chunk_bytes(cc) for cc in corpus_chunks ])})
+
+    po = Pool(processes, init_worker, (count_mode, window_sizes, unigram_rev, \
+        topic_word_list, rel_indptr, rel_indices, shared_counts, sample, sketch, spill_dir,))
+    results = []
+    compressed_chunks = []
+    for cc in corpus_chunks:
+        if is_compressed(cc[0]):
+            compressed_chunks.append(cc)
+            continue
+        unit = "tokens" if TokenizeCorpus.is_tokenized(cc[0]) else "bytes"
+        sys.stderr.write("creating a thread for corpus partition " + cc[0] + " (" + unit + " " + \
+            str(cc[1]) + "-" + str(cc[2]) + ")\n")
+        sys.stderr.flush()
+        count_stats["chunk_bytes"][len(results)] = get_chunk_bytes(cc)
+        results.append(po.apply_async(worker_func, (len(results), cc,), \
+            callback=count_chunk_complete))
+
+    #the compressed partitions are decompressed here and sent to the workers in batches of lines as
+    #they are read, so that the decompression overlaps with the counting; the number of batches that
+    #are waiting for a worker is bounded, so that the decompressed text does not pile up in memory
+    pending_batches = collections.deque()
+    for cc in compressed_chunks:
+        batch_start = 0 #number of bytes of the compressed partition read before the batch
+        for start, end, batch, bytes_read in CorpusFile.read_batches(cc[0], batch_size):
+            while len(pending_batches) >= max_pending_batches*(processes or cpu_count()):
+                pending_batches.popleft().wait()
+            sys.stderr.write("creating a thread for corpus partition " + cc[0] + \
+                " (decompressed bytes " + str(start) + "-" + str(end) + ")\n")
+            sys.stderr.flush()
+            count_stats["chunk_bytes"][len(results)] = bytes_read - batch_start
+            batch_start = bytes_read
+            results.append(po.apply_async(worker_func, (len(results), (cc[0], start, end, batch),), \
+                callback=count_chunk_complete))
+            pending_batches.append(results[-1])
+    po.close()
+    po.join()
+    #raise any error from the workers
+    for result in results:
+        result.get()
+    summarise_count_stats(count_mode, window_sizes, processes)
+
+    #convert the count arrays into the word counts; the counts of a sample are scaled by the inverse
+    #of the sample rate
+    shared_word_counts = as_count_matrix(shared_counts[1], num_sizes)
+    shared_pair_counts = as_count_matrix(shared_counts[2], num_sizes)
+    size_counts = []
+    for i in range(num_sizes):
+        counts = {}
+        for word, count in zip(topic_word_list, shared_word_counts[i]):
+            counts[word] = int(round(count / sample_rate))
+        if sketch is not None:
+            pair_counts = CountMinSketch.estimate(shared_pair_counts[i], \
+                np.arange(len(rel_indices)), *sketch)
+            counts[PAIRERRORKEY] = int(math.ceil(CountMinSketch.error_bound(shared_pair_counts[i], \
+                *sketch[:2]) / sample_rate))
+        else:
+            pair_counts = shared_pair_counts[i]
+        for (w1, w2), count in itertools.izip(get_topic_pairs(topic_relation), pair_counts):
+            counts[w1 + "|" + w2] = int(round(count / sample_rate))
+        total_windows = int(shared_counts[3][i])
+        if sample is not None:
+            counts[SAMPLEDWKEY] = total_windows
+            total_windows = int(round(total_windows / sample_rate))
+        size_counts.append((counts, total_windows))
+
+    if sample is not None:
+        sys.stderr.write("counted a sample of %d of %d windows (sample rate %g)\n" % \
+            (size_counts[0][0][SAMPLEDWKEY], size_counts[0][1], sample_rate))
+    if sketch is not None:
+        sys.stderr.write("the sketched pair counts are at most %d too high, with probability " \
+            "%.3f\n" % (size_counts[0][0][PAIRERRORKEY], CountMinSketch.confidence(sketch[0])))
+
+    return size_counts
+
+#get the counts of the words and related pairs of the topic word relation, from the count store
+#where possible; only the words and pairs that are not in the store (of any of the window sizes)
+#are counted (in a scan of the corpus restricted to them), and they are added to the store
+def count_with_store(topic_relation, corpus_partitions, corpus_chunks, window_sizes, count_mode, \
+    processes, count_store, count_memory=1024, spill_dir=None):
+    stores = []
+    for window_size in window_sizes:
+        store_file = os.path.join(count_store, get_corpus_fingerprint(corpus_partitions, \
+            window_size) + ".bin")
+        store = {}
+        if os.path.exists(store_file):
+            store = WordCountFile.BinaryWordCount(store_file, {})
+        stores.append((store_file, store))
+
+    #the reduced topic relation of the missing words and pairs
+    topic_word_list = topic_relation[0]
+    missing_words = set([ word for word in topic_word_list \
+        if any([ word not in store for (store_file, store) in stores ]) ])
+    missing_pairs = []
+    for (w1, w2) in get_topic_pairs(topic_relation):
+        if any([ (w1 + "|" + w2) not in store for (store_file, store) in stores ]):
+            missing_pairs.append((w1, w2))
+            missing_words.update([w1, w2])
+    missing_word_list = sorted(missing_words)
+    missing_index = dict([ (word, word_id) for word_id, word in enumerate(missing_word_list) ])
+    missing_relation = build_topic_relation(missing_word_list, [ missing_index[w1]* \
+        len(missing_word_list) + missing_index[w2] for (w1, w2) in missing_pairs ])
+    sys.stderr.write(str(len(missing_word_list)) + " of " + str(len(topic_word_list)) + \
+        " topic words need to be counted (count store " + count_store + ")\n")
+
+    if len(missing_word_list) == 0 and all([ TOTALWKEY in store for (store_file, store) in stores ]):
+        return [ (store, store[TOTALWKEY]) for (store_file, store) in stores ]
+
+    size_counts = count_topic_words(missing_relation, corpus_chunks, window_sizes, count_mode, \
+        processes, count_memory=count_memory, spill_dir=spill_dir)
+
+    #update the stores; they are written to a temporary file first so that a concurrent reader never
+    #sees a partial store
+    if not os.path.exists(count_store):
+        os.makedirs(count_store)
+    updated_stores = []
+    for (store_file, store), (counts, total_windows) in zip(stores, size_counts):
+        updated_store = dict(store.items())
+        updated_store.update(counts)
+        updated_store[TOTALWKEY] = total_windows
+        temp_file = store_file + "." + str(os.getpid())
+        WordCountFile.write_binary(updated_store, temp_file)
+        os.rename(temp_file, store_file)
+        updated_stores.append((updated_store, total_windows))
+
+    return updated_stores
+
+#collect the (non-zero) counts of the topic words and related pairs, and the total number of
+#windows, into a word count dictionary (with the same entries as the word count file)
+def get_word_count(topic_relation, counts, total_windows):
+    word_count = {}
+    for word in topic_relation[0]:
+        if counts[word] > 0:
+            word_count[word] = counts[word]
+    for (w1, w2) in get_topic_pairs(topic_relation):
+        if counts[w1 + "|" + w2] > 0:
+            word_count[w1 + "|" + w2] = counts[w1 + "|" + w2]
+    word_count[TOTALWKEY] = total_windows
+    #the sample size and error bound of approximate counts
+    for key in [SAMPLEDWKEY, PAIRERRORKEY]:
+        if key in counts:
+            word_count[key] = counts[key]
+
+    return word_count
+
+#compute the word counts of several sets of topics (e.g. the topic files of different models) in a
+#single pass over the corpus partitions (a list of files): the union of their topic words and word
+#pairs is counted once, and the counts of each set are then taken from it. Returns, for each set of
+#topics, a list of word count dictionaries (with the same entries as the word count file, limited
+#to the words and pairs of the set), one per window size. The options are those of the command line
+#(see the parser arguments); the approximate counts (sample_rate, sketch_size) cannot be kept in a
+#count store
+def compute_topic_set_word_counts(topic_sets, corpus_partitions, window_sizes=[20], \
+    count_mode="auto", processes=None, chunk_size=64, count_store=None, sample_rate=1.0, \
+    sketch_size=0, seed=1, count_memory=1024, spill_dir=None):
+    if sample_rate <= 0 or sample_rate > 1:
+        raise ValueError("the sample rate must be in (0, 1]")
+    if count_store and (sample_rate < 1 or sketch_size > 0):
+        raise ValueError("approximate counts cannot be kept in a count store")
+    check_window_sizes(window_sizes)
+
+    with Profiling.stage("topic relation"):
+        topic_relation = get_topic_relation([ topic for topics in topic_sets for topic in topics ])
+        corpus_chunks = get_corpus_chunks(corpus_partitions, chunk_size)
+    with Profiling.stage("count corpus"):
+        if count_store:
+            size_counts = count_with_store(topic_relation, corpus_partitions, corpus_chunks, \
+                window_sizes, count_mode, processes, count_store, count_memory, spill_dir)
+        else:
+            size_counts = count_topic_words(topic_relation, corpus_chunks, window_sizes, \
+                count_mode, processes, sample_rate, sketch_size, seed, count_memory, spill_dir)
+
+    with Profiling.stage("collect word counts"):
+        if len(topic_sets) == 1:
+            return [ [ get_word_count(topic_relation, counts, total_windows) \
+                for (counts, total_windows) in size_counts ] ]
+        set_relations = [ get_topic_relation(topics) for topics in topic_sets ]
+        return [ [ get_word_count(set_relation, counts, total_windows) \
+            for (counts, total_windows) in size_counts ] for set_relation in set_relations ]
+
+#compute the word counts of topics (lists of topic words, with collocations concatenated by
+#colloc_sep) over the corpus partitions; returns a list of word count dictionaries, one per window
+#size (see compute_topic_set_word_counts)
+def compute_word_counts(topics, corpus_partitions, window_sizes=[20], count_mode="auto", \
+    processes=None, chunk_size=64, count_store=None, sample_rate=1.0, sketch_size=0, seed=1, \
+    count_memory=1024, spill_dir=None):
+    return compute_topic_set_word_counts([topics], corpus_partitions, window_sizes, count_mode, \
+        processes, chunk_size, count_store, sample_rate, sketch_size, seed, count_memory, \
+        spill_dir)[0]
+
+#write the word counts to the output file (text format) and/or the binary output file, or print them
+#to stdout if neither is given
+def write_word_count(word_count, output_file=None, binary_output=None):
+    with Profiling.stage("write word counts"):
+        if binary_output:
+            WordCountFile.write_binary(word_count, binary_output)
+        if output_file:
+            WordCountFile.write_text(word_count, output_file)
+        if not binary_output and not output_file:
+            for tuple in sorted(word_count.items()):
+                print tuple[0] + "|" + str(tuple[1])
 
-################
-#main functions#
-################
-#update the topic word - candidate words relation dictionary
-def update_topic_word_rel(w1, w2):
-    related_word_set = set([])
-    if w1 in topic_word_rel:
-        related_word_set = topic_word_rel[w1]
-    if w2 != w1:
-        related_word_set.add(w2)
-
-    topic_word_rel[w1] = related_word_set
-    
 ######
 #main#
 ######
-#use utf-8 for stdout
-sys.stdout = codecs.getwriter('utf-8')(sys.stdout)
-
-#get the partitions of the reference corpus
-for f in os.listdir(args.ref_corpus_dir):
-    if not f.startswith("."):
-        corpus_partitions.append(args.ref_corpus_dir + "/" + f)
-
-#process the topic file and get the topic word relation
-unigram_set = set([]) #a set of all unigrams from the topic words
-for line in topic_file:
-    line = line.strip()
-
-    topic_words = line.split()
-
-    #update the unigram list and topic word relation
-    for word1 in topic_words:
-        #update the unigram first
-        for word in word1.split(colloc_sep):
-            unigram_set.add(word)
-
-        #update the topic word relation
-        for word2 in topic_words:
-            if word1 != word2:
-                #if it's collocation clean it so it's separated by spaces
-                cleaned_word1 = " ".join(word1.split(colloc_sep))
-                cleaned_word2 = " ".join(word2.split(colloc_sep))
-                update_topic_word_rel(cleaned_word1, cleaned_word2)
-
-#sort the unigrams and create a list and a reverse index
-unigram_list = sorted(list(unigram_set))
-unigram_rev = {}
-unigram_id = 1
-for unigram in unigram_list:
-    unigram_rev[unigram] = unigram_id
-    unigram_id += 1
-
-#spawn multiple threads to process the corpus
-po = Pool()
-for i, cp in enumerate(corpus_partitions):
-    sys.stderr.write("creating a thread for corpus partition " + cp + "\n")
-    sys.stderr.flush()
-    po.apply_async(calcwcngram, (i, window_size, cp, topic_word_rel, unigram_list, unigram_rev,), \
-        callback=calcwcngram_complete)
-po.close()
-po.join()
-
-#all done, print the word counts
-for tuple in sorted(word_count.items()):
-    print tuple[0] + "|" + str(tuple[1])
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+
+    #use utf-8 for stdout
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout)
+
+    #the word counts of multiple window sizes can only be written to files
+    try:
+        window_sizes = get_window_sizes(args.window_sizes)
+    except ValueError as e:
+        sys.stderr.write("ERROR: " + str(e) + " (-w)\n")
+        raise SystemExit
+    if len(window_sizes) > 1 and not args.output_file and not args.binary_output:
+        sys.stderr.write("ERROR: multiple window sizes need an output file (-o or -b)\n")
+        raise SystemExit
+    #the word counts of multiple topic files are written to files of the same names in the output
+    #directories
+    topic_names = [ os.path.basename(topic_file) for topic_file in args.topic_files ]
+    if len(args.topic_files) > 1:
+        if not args.output_file and not args.binary_output:
+            sys.stderr.write("ERROR: multiple topic files need an output directory (-o or -b)\n")
+            raise SystemExit
+        if len(set(topic_names)) < len(topic_names):
+            sys.stderr.write("ERROR: the topic files must have different file names, as their " \
+                "word counts are written to files of the same names\n")
+            raise SystemExit
+        for output_dir in [args.output_file, args.binary_output]:
+            if output_dir and not os.path.isdir(output_dir):
+                os.makedirs(output_dir)
+    try:
+        check_count_options(args)
+    except ValueError as e:
+        sys.stderr.write("ERROR: " + str(e) + "\n")
+        raise SystemExit
+
+    #a shard is counted over its share of the corpus partitions, and its exact counts are written
+    #to a partial count file
+    corpus_partitions = get_corpus_partitions(args.ref_corpus_dir)
+    if args.shard:
+        shard = args.shard.split("/")
+        if len(shard) != 2 or not shard[0].isdigit() or not shard[1].isdigit() or \
+            int(shard[0]) >= int(shard[1]):
+            sys.stderr.write("ERROR: the shard must be given as <index>/<num_shards>, with " \
+                "0 <= index < num_shards\n")
+            raise SystemExit
+        if not args.output_file or args.binary_output:
+            sys.stderr.write("ERROR: the partial counts of a shard are written to a text file " \
+                "(-o)\n")
+            raise SystemExit
+        if args.sample_rate < 1 or args.sketch_size > 0:
+            sys.stderr.write("ERROR: approximate counts (--sample_rate, --sketch_size) cannot be " \
+                "counted in shards\n")
+            raise SystemExit
+        shard, num_shards = int(shard[0]), int(shard[1])
+        corpus_partitions = get_shard_partitions(corpus_partitions, shard, num_shards)
+        sys.stderr.write("shard %d/%d: %d of the corpus partitions\n" % (shard, num_shards, \
+            len(corpus_partitions)))
+
+    #process the topic files
+    topic_sets = [ [ line.strip().split() for line in codecs.open(topic_file, "r", "utf-8") ] \
+        for topic_file in args.topic_files ]
+
+    topic_set_word_counts = compute_topic_set_word_counts(topic_sets, corpus_partitions, \
+        window_sizes, args.count_mode, args.processes, args.chunk_size, args.count_store, \
+        args.sample_rate, args.sketch_size, args.seed, args.count_memory, args.spill_dir)
+
+    #write the throughput statistics (none if all the counts came from the count store)
+    if args.stats_file:
+        stats_file = open(args.stats_file, "w")
+        json.dump(count_stats.get("summary", {"chunks": []}), stats_file, indent=1, sort_keys=True)
+        stats_file.close()
+
+    #all done, print (or write) the word counts; with multiple window sizes, each is written to its
+    #own files (with a '.ws<size>' suffix), and with multiple topic files, the files are in the
+    #output directories
+    for topic_name, topics, word_counts in zip(topic_names, topic_sets, topic_set_word_counts):
+        output_file, binary_output = args.output_file, args.binary_output
+        if len(args.topic_files) > 1:
+            output_file = output_file and os.path.join(output_file, topic_name)
+            binary_output = binary_output and os.path.join(binary_output, topic_name)
+        for window_size, word_count in zip(window_sizes, word_counts):
+            suffix = ""
+            if len(window_sizes) > 1:
+                suffix = ".ws" + str(window_size)
+            if args.shard:
+                header = {"relation": get_relation_fingerprint(get_topic_relation(topics)), \
+                    "window_size": window_size, "shard": shard, "num_shards": num_shards, \
+                    "partitions": sorted([ get_partition_info(cp)[0] for cp in corpus_partitions ])}
+                WordCountFile.write_partial(word_count, header, output_file + suffix)
+                continue
+            write_word_count(word_count, output_file and output_file + suffix, \
+                binary_output and binary_output + suffix)
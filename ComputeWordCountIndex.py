@@ -0,0 +1,248 @@
+"""
+Computes the word pair co-occurrences for topics using the positional inverted index built by
+BuildCorpusIndex.py, instead of scanning the reference corpus. The output is identical to that of
+ComputeWordCount.py.
+
+Usage:          ComputeWordCountIndex.py <topic_file> <index_dir> [-w window_size]
+Stdout:         word count file
+"""
+
+import argparse
+import sys
+import os
+import codecs
+import numpy as np
+from multiprocessing import Pool
+import Profiling
+#the files of an index partition, as written by BuildCorpusIndex.py
+from BuildCorpusIndex import OFFSETS_FILE, POSITIONS_FILE
+from PartitionFile import VOCAB_FILE, DOC_OFFSETS_FILE
+import PartitionFile
+
+#parser arguments
+desc = "Computes the word pair co-occurrences for topics by querying the positional inverted index \
+    of the reference corpus (built by BuildCorpusIndex.py)."
+parser = argparse.ArgumentParser(description=desc)
+#####################
+#positional argument#
+#####################
+parser.add_argument("topic_file", help="file that contains the topics")
+parser.add_argument("index_dir", help="directory that contains the index of the reference corpus")
+
+###################
+#optional argument#
+###################
+parser.add_argument("-w", "--window_size", type=int, default=20, \
+    help="size of the sliding window; 0 = use document as window. Default = 20")
+parser.add_argument("--profile", default=None, \
+    help="profile the run (the main and worker processes, and the time of each stage) and " + \
+    "write the profiles to files with this prefix (see Profiling.py)")
+
+#parameters
+colloc_sep = "_" #symbol for concatenating collocations
+
+#constants
+TOTALWKEY = "!!<TOTAL_WINDOWS>!!" #key name for total number of windows (in wordcount)
+
+##################
+#worker functions#
+##################
+#get the postings (sorted token positions) of a topic word; collocations are matched as phrases
+def get_postings(word, vocab, offsets, positions, doc_offsets):
+    terms = word.split()
+    for term in terms:
+        if term not in vocab:
+            return np.zeros(0, dtype=np.int64)
+
+    term_id = vocab[terms[0]]
+    starts = positions[offsets[term_id]:offsets[term_id+1]].astype(np.int64)
+    for i, term in enumerate(terms[1:], 1):
+        term_id = vocab[term]
+        term_postings = positions[offsets[term_id]:offsets[term_id+1]].astype(np.int64)
+        starts = starts[np.in1d(starts + i, term_postings, assume_unique=True)]
+
+    #a phrase must not cross a document boundary
+    if len(terms) > 1:
+        start_docs = np.searchsorted(doc_offsets, starts, side="right")
+        end_docs = np.searchsorted(doc_offsets, starts + len(terms) - 1, side="right")
+        starts = starts[start_docs == end_docs]
+
+    return starts
+
+#convert the postings of a topic word into the set of windows where it is present, represented by
+#sorted and disjoint intervals [start, end) of (partition-wide) window ids
+def get_window_intervals(word, postings, doc_offsets, window_offsets, window_size):
+    ngram_len = len(word.split())
+    if len(postings) == 0 or (window_size != 0 and ngram_len > window_size):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    docs = np.searchsorted(doc_offsets, postings, side="right") - 1
+    if window_size == 0:
+        #the document is the window
+        starts = docs
+        ends = docs + 1
+    else:
+        #an occurrence at position p (within the document) is present in the windows with tail id
+        #p+ngram_len to p+window_size
+        local_pos = postings - doc_offsets[docs]
+        starts = window_offsets[docs] + local_pos + ngram_len
+        ends = window_offsets[docs] + local_pos + window_size + 1
+
+    #merge the overlapping intervals
+    breaks = starts[1:] > ends[:-1]
+    starts = starts[np.concatenate(([True], breaks))]
+    ends = ends[np.concatenate((breaks, [True]))]
+
+    return starts, ends
+
+#number of windows covered by both sets of intervals
+def intersect_intervals(intervals1, intervals2):
+    events = np.concatenate((intervals1[0], intervals2[0], intervals1[1], intervals2[1]))
+    if len(events) == 0:
+        return 0
+    deltas = np.concatenate((np.ones(len(intervals1[0]) + len(intervals2[0]), dtype=np.int64), \
+        -np.ones(len(intervals1[1]) + len(intervals2[1]), dtype=np.int64)))
+    order = np.argsort(events, kind="mergesort")
+    events = events[order]
+    coverage = np.cumsum(deltas[order])
+    return int(np.sum(np.diff(events)[coverage[:-1] == 2]))
+
+#primary worker function called by main; computes the word counts of an index partition
+@Profiling.profiled
+def query_index(partition_dir, window_size, topic_word_rel):
+    worker_wordcount = {}
+
+    #load the vocabulary (only the terms that are needed) and memory-map the postings
+    needed_terms = set([])
+    for word in topic_word_rel:
+        needed_terms.update(word.split())
+    vocab = {}
+    for term_id, line in enumerate(codecs.open(os.path.join(partition_dir, VOCAB_FILE), "r", \
+        "utf-8")):
+        term = line.rstrip("\n")
+        if term in needed_terms:
+            vocab[term] = term_id
+    offsets = np.load(os.path.join(partition_dir, OFFSETS_FILE), mmap_mode="r")
+    positions = np.load(os.path.join(partition_dir, POSITIONS_FILE), mmap_mode="r")
+    doc_offsets = np.load(os.path.join(partition_dir, DOC_OFFSETS_FILE))
+
+    #number of windows of each document, and the window id offset of each document
+    doc_lens = np.diff(doc_offsets)
+    if window_size != 0:
+        num_windows = doc_lens + window_size - 1
+    else:
+        num_windows = np.ones(len(doc_lens), dtype=np.int64)
+    window_offsets = np.concatenate(([0], np.cumsum(num_windows)[:-1]))
+
+    #window intervals of each topic word
+    intervals = {}
+    with Profiling.stage("window intervals"):
+        for word in topic_word_rel:
+            postings = get_postings(word, vocab, offsets, positions, doc_offsets)
+            intervals[word] = get_window_intervals(word, postings, doc_offsets, window_offsets, \
+                window_size)
+            count = int(np.sum(intervals[word][1] - intervals[word][0]))
+            if count > 0:
+                worker_wordcount[word] = count
+
+    #co-occurrence counts of the related topic words
+    with Profiling.stage("intersect intervals"):
+        for w1, related_words in topic_word_rel.items():
+            for w2 in related_words:
+                if w1 < w2 and w1 in worker_wordcount and w2 in worker_wordcount:
+                    count = intersect_intervals(intervals[w1], intervals[w2])
+                    if count > 0:
+                        worker_wordcount[w1 + "|" + w2] = count
+
+    #update the total windows seen for the worker
+    worker_wordcount[TOTALWKEY] = int(np.sum(num_windows))
+
+    return worker_wordcount
+
+################
+#main functions#
+################
+#warn if the corpus partition of an index partition has changed since it was indexed
+def check_index_source(partition_dir):
+    PartitionFile.check_source(partition_dir, "index", "rebuild the index with BuildCorpusIndex.py")
+
+#get the partitions of the index directory
+def get_index_partitions(index_dir):
+    index_partitions = []
+    for f in os.listdir(index_dir):
+        if not f.startswith("."):
+            index_partitions.append(index_dir + "/" + f)
+
+    return index_partitions
+
+#update the topic word - candidate words relation dictionary
+def update_topic_word_rel(topic_word_rel, w1, w2):
+    related_word_set = set([])
+    if w1 in topic_word_rel:
+        related_word_set = topic_word_rel[w1]
+    if w2 != w1:
+        related_word_set.add(w2)
+
+    topic_word_rel[w1] = related_word_set
+
+#get the topic word relation of topics (lists of topic words, with collocations concatenated by
+#colloc_sep), e.g. { "space": set(["earth", ...]), ... }
+def get_topic_word_rel(topics):
+    topic_word_rel = {}
+    for topic_words in topics:
+        for word1 in topic_words:
+            for word2 in topic_words:
+                if word1 != word2:
+                    #if it's collocation clean it so it's separated by spaces
+                    cleaned_word1 = " ".join(word1.split(colloc_sep))
+                    cleaned_word2 = " ".join(word2.split(colloc_sep))
+                    update_topic_word_rel(topic_word_rel, cleaned_word1, cleaned_word2)
+
+    return topic_word_rel
+
+#compute the word counts of topics (lists of topic words, with collocations concatenated by
+#colloc_sep) from the index partitions; returns a word count dictionary with the same entries as
+#the word count file
+def compute_word_count_index(topics, index_partitions, window_size=20):
+    topic_word_rel = get_topic_word_rel(topics)
+
+    #spawn multiple threads to query the index partitions
+    po = Pool()
+    results = []
+    for ip in index_partitions:
+        check_index_source(ip)
+        sys.stderr.write("creating a thread for index partition " + ip + "\n")
+        sys.stderr.flush()
+        results.append(po.apply_async(query_index, (ip, window_size, topic_word_rel,)))
+    po.close()
+    po.join()
+
+    #sum the word counts of the partitions
+    word_count = {} #word counts (both single and pair)
+    with Profiling.stage("merge partition counts"):
+        for result in results:
+            for k, v in result.get().items():
+                word_count[k] = word_count.get(k, 0) + v
+
+    return word_count
+
+######
+#main#
+######
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+
+    #use utf-8 for stdout
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout)
+
+    #process the topic file
+    topic_file = codecs.open(args.topic_file, "r", "utf-8")
+    topics = [ line.strip().split() for line in topic_file ]
+
+    word_count = compute_word_count_index(topics, get_index_partitions(args.index_dir), \
+        args.window_size)
+
+    #all done, print the word counts
+    for tuple in sorted(word_count.items()):
+        print tuple[0] + "|" + str(tuple[1])
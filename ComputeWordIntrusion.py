@@ -6,6 +6,7 @@ Date:           May 2013
 import argparse
 import sys
 import codecs
+import Profiling
 from collections import defaultdict
 
 #parser arguments
@@ -20,62 +21,86 @@ parser.add_argument("topic_file", help="file that contains the topics")
 parser.add_argument("test_data", help="test data input for SVM")
 parser.add_argument("predictions_output", help="predictions output from SVM")
 
-args = parser.parse_args()
+###################
+#optional argument#
+###################
+parser.add_argument("--profile", default=None, \
+    help="profile the run (and the time of each stage) and write the profiles to files with " + \
+    "this prefix (see Profiling.py)")
+
 
 #parameters
 debug = True
 
-#input
-topic_file = codecs.open(args.topic_file, "r", "utf-8")
-test_file = codecs.open(args.test_data, "r", "utf-8")
-predictions_file = codecs.open(args.predictions_output, "r", "utf-8")
-
-#global variables
-prediction_scores = []
-qid_line_id = defaultdict(list) #which lines for which qid
-line_id_word = defaultdict(str) #map from line id to words in test.dat
-qid_tw = defaultdict(list) #topic words for each qid
-
 ###########
 #functions#
 ###########
+#compute the model precision of each topic (binary in this case, 1 or 0), given the lines of the
+#SVM test data and the SVM prediction scores (one per line of the test data); returns a list of
+#(qid, hit, system chosen intruder word, true intruder word), sorted by qid
+def compute_model_precision(test_lines, prediction_scores):
+    qid_line_id = defaultdict(list) #which lines for which qid
+    line_id_word = defaultdict(str) #map from line id to words in test.dat
+
+    #process the test data
+    for (line_id, line) in enumerate(test_lines):
+        qid = int(line.strip().split()[1].split(":")[1])
+        qid_line_id[qid].append(line_id)
+        line_id_word[line_id] = line.strip().split()[-1][1:] #remove hash in front
+
+    model_precision = []
+    for (qid, line_ids) in sorted(qid_line_id.items()):
+        actual_ww_score = prediction_scores[line_ids[0]]
+        hit = 1.0
+        ww_id = line_ids[0]
+        for line_id in line_ids[1:]:
+            if prediction_scores[line_id] > actual_ww_score:
+                actual_ww_score = prediction_scores[line_id]
+                hit = 0.0
+                ww_id = line_id
+        model_precision.append((qid, hit, line_id_word[ww_id], line_id_word[line_ids[0]]))
+
+    return model_precision
 
+#print the model precision of each topic (see compute_model_precision); qid_tw is the list of topic
+#words of each qid
+def print_model_precision(model_precision, qid_tw):
+    for (qid, hit, system_word, true_word) in model_precision:
+        if debug:
+            print ("[%.1f]" % hit), " ".join(qid_tw[qid])
+            print "\tSystem Chosen Intruder Word =", system_word
+            print "\tTrue Intruder Word =", true_word
+            print
+        else:
+            print hit
 
 ######
 #main#
 ######
-#use utf-8 for stdout
-sys.stdout = codecs.getwriter('utf-8')(sys.stdout)
-
-#process prediction file
-for line in predictions_file:
-    prediction_scores.append(float(line.strip()))
-
-#process the test file
-for (line_id, line) in enumerate(test_file):
-    qid = int(line.strip().split()[1].split(":")[1])
-    qid_line_id[qid].append(line_id)
-    line_id_word[line_id] = line.strip().split()[-1][1:] #remove hash in front
-
-#process the topic file
-for (line_id, line) in enumerate(topic_file):
-    qid_tw[line_id + 1] = line.strip().split()
-
-#compute the model precision for each topic (binary in this case, 1 or 0)
-for (qid, line_ids) in sorted(qid_line_id.items()):
-    actual_ww_score = prediction_scores[line_ids[0]]
-    hit = 1.0
-    ww_id = line_ids[0]
-    for line_id in line_ids[1:]:
-        if prediction_scores[line_id] > actual_ww_score:
-            actual_ww_score = prediction_scores[line_id]
-            hit = 0.0
-            ww_id = line_id
-    
-    if debug:
-        print ("[%.1f]" % hit), " ".join(qid_tw[qid])
-        print "\tSystem Chosen Intruder Word =", line_id_word[ww_id]
-        print "\tTrue Intruder Word =", line_id_word[line_ids[0]]
-        print
-    else:
-        print hit
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+
+    #input
+    topic_file = codecs.open(args.topic_file, "r", "utf-8")
+    test_file = codecs.open(args.test_data, "r", "utf-8")
+    predictions_file = codecs.open(args.predictions_output, "r", "utf-8")
+
+    #global variables
+    prediction_scores = []
+    qid_tw = defaultdict(list) #topic words for each qid
+
+    #use utf-8 for stdout
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout)
+
+    #process prediction file
+    for line in predictions_file:
+        prediction_scores.append(float(line.strip()))
+
+    #process the topic file
+    for (line_id, line) in enumerate(topic_file):
+        qid_tw[line_id + 1] = line.strip().split()
+
+    #compute the model precision for each topic (binary in this case, 1 or 0)
+    with Profiling.stage("model precision"):
+        print_model_precision(compute_model_precision(test_file, prediction_scores), qid_tw)
@@ -0,0 +1,58 @@
+"""
+Converts a word count file between the text format ("word|count" and "word1|word2|count" lines)
+and the binary, memory-mappable format (see WordCountFile.py).
+
+Usage:          ConvertWordCount.py <input_file> <output_file> [-t binary|text]
+"""
+
+import argparse
+import WordCountFile
+import Profiling
+
+#parser arguments
+desc = "Converts a word count file between the text and the binary format."
+parser = argparse.ArgumentParser(description=desc)
+#####################
+#positional argument#
+#####################
+parser.add_argument("input_file", help="word count file to convert")
+parser.add_argument("output_file", help="converted word count file")
+
+###################
+#optional argument#
+###################
+parser.add_argument("-t", "--to", default=None, choices=["binary", "text"], \
+    help="format of the output file. Default = the format that the input file is not in")
+parser.add_argument("--profile", default=None, \
+    help="profile the run (and the time of each stage) and write the profiles to files with " + \
+    "this prefix (see Profiling.py)")
+
+###########
+#functions#
+###########
+#convert a word count file to the given format ("binary" or "text"; None = the format that the
+#input file is not in)
+def convert_word_count(input_file, output_file, to_format=None):
+    input_binary = WordCountFile.is_binary(input_file)
+    if to_format is None:
+        to_format = "text" if input_binary else "binary"
+
+    with Profiling.stage("read word counts"):
+        if input_binary:
+            wordcount = dict(WordCountFile.BinaryWordCount(input_file).items())
+        else:
+            wordcount = WordCountFile.read_text(input_file)
+
+    with Profiling.stage("write word counts"):
+        if to_format == "binary":
+            WordCountFile.write_binary(wordcount, output_file)
+        else:
+            WordCountFile.write_text(wordcount, output_file)
+
+######
+#main#
+######
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+    convert_word_count(args.input_file, args.output_file, args.to)
@@ -0,0 +1,125 @@
+"""
+Reads the partitions of the reference corpus, which can be plain text files or compressed with
+gzip, bzip2 or zstd (the compression is detected from the first bytes of the file). Compressed
+partitions are decompressed as they are read, so they do not need to be decompressed to disk first.
+Files with several concatenated compressed streams (e.g. from pigz or pbzip2) are supported.
+
+Reading zstd-compressed partitions needs the zstandard module (e.g. `pip install zstandard`).
+"""
+
+import bz2
+import zlib
+import cStringIO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+#parameters
+read_size = 2**20 #number of (compressed) bytes read at a time
+
+#constants
+MAGICS = [ ("gzip", "\x1f\x8b"), ("bzip2", "BZh"), ("zstd", "\x28\xb5\x2f\xfd") ]
+
+###########
+#functions#
+###########
+#the compression of a corpus partition ("gzip", "bzip2" or "zstd"), or None if it is not compressed
+def get_compression(corpus_file):
+    f = open(corpus_file, "rb")
+    magic = f.read(4)
+    f.close()
+
+    for compression, compression_magic in MAGICS:
+        if magic.startswith(compression_magic):
+            return compression
+    return None
+
+#create a decompressor for a stream of the given compression (gzip or bzip2)
+def new_decompressor(compression):
+    if compression == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    else:
+        return bz2.BZ2Decompressor()
+
+#read the (decompressed) contents of a corpus partition as a sequence of blocks of bytes; yields
+#(block, number of bytes of the file read so far)
+def read_blocks(corpus_file):
+    compression = get_compression(corpus_file)
+    raw_file = open(corpus_file, "rb")
+    f = raw_file
+
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError("the zstandard module is needed to read the zstd-compressed " + \
+                "corpus partition " + corpus_file)
+        f = zstandard.ZstdDecompressor().stream_reader(raw_file, read_across_frames=True)
+        compression = None
+
+    if compression is None:
+        data = f.read(read_size)
+        while data:
+            yield data, raw_file.tell()
+            data = f.read(read_size)
+        raw_file.close()
+        return
+
+    decompressor = new_decompressor(compression)
+    data = f.read(read_size)
+    while data:
+        #a new stream starts with the data that follows the end of the previous one
+        try:
+            block = decompressor.decompress(data)
+        except EOFError:
+            decompressor = new_decompressor(compression)
+            continue
+        if block:
+            yield block, f.tell()
+        data = decompressor.unused_data
+        if data:
+            decompressor = new_decompressor(compression)
+        else:
+            data = f.read(read_size)
+    f.close()
+
+#read a corpus partition in batches of whole lines of about batch_size (decompressed) bytes; yields
+#(start byte, end byte, batch, number of bytes of the file read so far), where the start and end
+#bytes are offsets in the decompressed contents
+def read_batches(corpus_file, batch_size):
+    start = 0
+    data = ""
+    bytes_read = 0
+    for block, bytes_read in read_blocks(corpus_file):
+        data += block
+        while len(data) >= batch_size:
+            #the batch ends at the last line break before batch_size (or the first one after it,
+            #for a longer line); the rest goes to the next batch
+            line_end = data.rfind("\n", 0, batch_size) + 1
+            if line_end == 0:
+                line_end = data.find("\n", batch_size) + 1
+                if line_end == 0:
+                    break
+            yield start, start + line_end, data[:line_end], bytes_read
+            start += line_end
+            data = data[line_end:]
+
+    if data:
+        yield start, start + len(data), data, bytes_read
+
+#split a batch (utf-8 bytes) into lines (documents) the same way as codecs.open would; if keep is
+#given, only the lines for which keep(offset of the line) is true are split, where the offsets start
+#from start (the offset of the batch)
+def split_lines(batch, start=0, keep=None):
+    position = start
+    for line in cStringIO.StringIO(batch):
+        if keep is None or keep(position):
+            for item in line.decode("utf-8").splitlines(True):
+                yield item
+        position += len(line)
+
+#read the lines of a corpus partition, split the same way as codecs.open would
+def read_lines(corpus_file, batch_size=2**24):
+    for start, end, batch, bytes_read in read_batches(corpus_file, batch_size):
+        for line in split_lines(batch):
+            yield line
@@ -0,0 +1,71 @@
+"""
+Count-Min sketch of integer counts keyed by integer ids (e.g. the pair ids of ComputeWordCount.py),
+kept in a flat numpy array so that it can live in shared memory and sketches can be added together.
+
+A sketch of depth d and width w is d rows of w counters; an id is counted in one counter of each
+row (chosen by a different hash function per row) and its count is estimated by the smallest of its
+d counters. The estimate is never below the true count, and exceeds it by at most e/w times the
+total count of all the ids with probability 1 - e^-d.
+"""
+
+import math
+import numpy as np
+
+#global variables
+hash_params = {} #the hash parameters of each (depth, seed), drawn once
+
+###########
+#functions#
+###########
+#the largest width (a power of two) of num_sketches sketches of the given depth that fit in
+#budget_bytes (with 64-bit counters)
+def get_width(budget_bytes, depth, num_sketches=1):
+    width = 1
+    while width*2*depth*num_sketches*8 <= budget_bytes:
+        width *= 2
+    return width
+
+#the parameters of the (multiply-shift) hash function of each row, drawn from the seed
+def get_hash_params(depth, seed):
+    if (depth, seed) not in hash_params:
+        rng = np.random.RandomState(seed)
+        multipliers = rng.randint(0, 2**62, depth).astype(np.uint64)*np.uint64(2) + np.uint64(1)
+        offsets = rng.randint(0, 2**62, depth).astype(np.uint64)
+        hash_params[(depth, seed)] = (multipliers, offsets)
+    return hash_params[(depth, seed)]
+
+#the counters (positions in the flat depth x width array) of ids, as a depth x ids array
+def get_cells(ids, depth, width, seed):
+    multipliers, offsets = get_hash_params(depth, seed)
+    shift = np.uint64(64 - int(math.log(width, 2))) if width > 1 else None
+    ids = np.asarray(ids, dtype=np.uint64)
+    cells = np.zeros((depth, len(ids)), dtype=np.int64)
+    with np.errstate(over="ignore"):
+        for row in range(depth):
+            if shift is not None:
+                cells[row] = (ids*multipliers[row] + offsets[row]) >> shift
+            cells[row] += row*width
+    return cells
+
+#add the counts of ids (an array, or one count for all the ids) to a sketch; ids may repeat
+def add(sketch, ids, counts, depth, width, seed):
+    if len(ids) == 0:
+        return
+    cells = get_cells(ids, depth, width, seed).ravel()
+    counts = np.zeros(len(ids)) + counts
+    unique_cells, inverse = np.unique(cells, return_inverse=True)
+    sketch[unique_cells] += np.round(np.bincount(inverse, weights=np.tile(counts, \
+        depth))).astype(np.int64)
+
+#estimate the counts of ids from a sketch
+def estimate(sketch, ids, depth, width, seed):
+    return np.min(sketch[get_cells(ids, depth, width, seed)], axis=0)
+
+#the bound of the overestimate of the counts of a sketch (e/w times the total count), which holds
+#with probability confidence(depth)
+def error_bound(sketch, depth, width):
+    return int(math.ceil(math.e / width * np.sum(sketch[:width])))
+
+#the probability that an estimate is within the error bound
+def confidence(depth):
+    return 1 - math.exp(-depth)
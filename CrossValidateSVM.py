@@ -0,0 +1,182 @@
+"""
+Cross validates svm_rank on an SVM input file (generated by GenSVMInput.py): the folds are ranges of
+qids of the single input file (split as SplitSVM.py), and the train and test files of a fold are
+only written (to a temporary directory) while the fold is run, so the input is not copied for
+every fold in advance. The folds are run concurrently and their predictions are gathered in the
+order of the input file, so the input file is the test data of the predictions for
+ComputeWordIntrusion.py.
+
+Usage:          CrossValidateSVM.py <svm_input> <predictions_output> [-c cost] [-f num_folds]
+                [-p processes] [--svm_dir svm_dir] [--temp_dir temp_dir]
+Output:         the prediction of each line of the SVM input, one per line
+"""
+
+import argparse
+import sys
+import os
+import shutil
+import subprocess
+import tempfile
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+import SplitSVM
+import Profiling
+
+#parser arguments
+desc = "Cross validates svm_rank on an SVM input file, running the folds concurrently."
+parser = argparse.ArgumentParser(description=desc)
+#####################
+#positional argument#
+#####################
+parser.add_argument("svm_input", help="SVM input file (generated by GenSVMInput.py)")
+parser.add_argument("predictions_output", help="file to write the predictions to")
+
+###################
+#optional argument#
+###################
+parser.add_argument("-c", "--cost", type=float, default=0.01, \
+    help="trade-off between the margin and the training error (-c of svm_rank_learn). " + \
+    "Default = 0.01")
+parser.add_argument("-f", "--num_folds", type=int, default=SplitSVM.NUM_PART, \
+    help="number of folds of the cross validation. Default = " + str(SplitSVM.NUM_PART))
+parser.add_argument("-p", "--processes", type=int, default=None, \
+    help="number of folds that are run at the same time. Default = number of CPUs")
+parser.add_argument("--svm_dir", default="svm_rank", \
+    help="directory of svm_rank_learn and svm_rank_classify. Default = svm_rank")
+parser.add_argument("--temp_dir", default=None, \
+    help="directory for the train, test and model files of the folds that are running. " + \
+    "Default = the system temporary directory")
+parser.add_argument("--profile", default=None, \
+    help="profile the run (the main process and worker threads, and the time of each stage) " + \
+    "and write the profiles to files with this prefix (see Profiling.py)")
+
+#parameters
+block_size = 2**20 #number of bytes copied at a time
+
+###########
+#functions#
+###########
+#the byte offsets of the qids (groups of consecutive lines of the same qid) of an SVM input file,
+#followed by the size of the file
+def get_qid_offsets(svm_input):
+    qid_offsets = []
+    curr_qid = None
+    offset = 0
+    for line in open(svm_input, "rb"):
+        data = line.split()
+        try:
+            qid = int(data[1].split(":")[1])
+        except:
+            print "Bad format for line =", line.strip()
+            raise SystemExit
+        if qid != curr_qid:
+            qid_offsets.append(offset)
+            curr_qid = qid
+        offset += len(line)
+    qid_offsets.append(offset)
+
+    return qid_offsets
+
+#the folds of the cross validation, as the (start, end) byte ranges of the test lines of each fold
+#in the SVM input file; the train lines of a fold are the rest of the file
+def get_folds(svm_input, num_folds=SplitSVM.NUM_PART):
+    qid_offsets = get_qid_offsets(svm_input)
+    return [ (qid_offsets[test_start], qid_offsets[test_end]) for (test_start, test_end) in \
+        SplitSVM.get_test_ranges(len(qid_offsets)-1, num_folds) ]
+
+#copy the bytes start:end of the file f to the file output
+def copy_range(f, output, start, end):
+    f.seek(start)
+    while start < end:
+        data = f.read(min(block_size, end - start))
+        output.write(data)
+        start += len(data)
+
+#write the train and test files of a fold (see get_folds) to a directory; returns their paths
+def write_fold(svm_input, fold, fold_dir):
+    test_start, test_end = fold
+    train_file = os.path.join(fold_dir, "train.dat")
+    test_file = os.path.join(fold_dir, "test.dat")
+    f = open(svm_input, "rb")
+    output = open(train_file, "wb")
+    copy_range(f, output, 0, test_start)
+    copy_range(f, output, test_end, os.path.getsize(svm_input))
+    output.close()
+    output = open(test_file, "wb")
+    copy_range(f, output, test_start, test_end)
+    output.close()
+    f.close()
+
+    return train_file, test_file
+
+#run a command of svm_rank, with its output discarded; raises a RuntimeError if it fails (the folds
+#run in threads, which cannot exit the script themselves)
+def run_svm(command):
+    devnull = open(os.devnull, "w")
+    try:
+        status = subprocess.call(command, stdout=devnull)
+    except OSError:
+        status = None
+    devnull.close()
+    if status != 0:
+        raise RuntimeError(" ".join(command) + " failed")
+
+#train svm_rank on the train lines of a fold and classify its test lines, in a temporary directory
+#that is removed afterwards; returns the predictions (one line per test line)
+@Profiling.profiled
+def run_fold(svm_input, fold, cost, svm_dir, temp_dir=None):
+    if fold[0] == fold[1]:
+        return []
+
+    fold_dir = tempfile.mkdtemp(prefix="fold.", dir=temp_dir)
+    try:
+        with Profiling.stage("write fold"):
+            train_file, test_file = write_fold(svm_input, fold, fold_dir)
+        model_file = os.path.join(fold_dir, "model.dat")
+        predictions_file = os.path.join(fold_dir, "predictions")
+        with Profiling.stage("svm_rank_learn"):
+            run_svm([os.path.join(svm_dir, "svm_rank_learn"), "-c", str(cost), train_file, \
+                model_file])
+        with Profiling.stage("svm_rank_classify"):
+            run_svm([os.path.join(svm_dir, "svm_rank_classify"), test_file, model_file, \
+                predictions_file])
+        predictions = open(predictions_file).readlines()
+    finally:
+        shutil.rmtree(fold_dir)
+
+    return predictions
+
+################
+#main functions#
+################
+#cross validate svm_rank on the SVM input file, with processes folds running at the same time (each
+#fold runs svm_rank as a separate process, so the folds are started from threads); returns the
+#predictions of the lines of the SVM input, in order
+def cross_validate_svm(svm_input, cost=0.01, num_folds=SplitSVM.NUM_PART, processes=None, \
+    svm_dir="svm_rank", temp_dir=None):
+    with Profiling.stage("find folds"):
+        folds = get_folds(svm_input, num_folds)
+    pool = ThreadPool(processes or cpu_count())
+    fold_predictions = pool.map(lambda fold: run_fold(svm_input, fold, cost, svm_dir, temp_dir), \
+        folds)
+    pool.close()
+    pool.join()
+
+    return [ prediction for predictions in fold_predictions for prediction in predictions ]
+
+######
+#main#
+######
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+
+    try:
+        predictions = cross_validate_svm(args.svm_input, args.cost, args.num_folds, \
+            args.processes, args.svm_dir, args.temp_dir)
+    except RuntimeError as e:
+        sys.stderr.write("ERROR: " + str(e) + "\n")
+        raise SystemExit
+    output = open(args.predictions_output, "w")
+    output.write("".join(predictions))
+    output.close()
@@ -17,7 +17,9 @@ import operator
 import pickle
 import subprocess
 import math
-from collections import defaultdict
+import numpy as np
+import WordCountFile
+import Profiling
 
 #parser arguments
 desc = "Generates the feature files for SVM rank."
@@ -28,25 +30,18 @@ parser = argparse.ArgumentParser(description=desc)
 parser.add_argument("topic_file", help="file that contains the topics")
 parser.add_argument("intruder_file", help="file that contains the intruder words for the topics")
 parser.add_argument("pmi_type", help="pmi or normalised pmi", choices=["pmi","npmi"])
-parser.add_argument("wordcount_file", help="file that contains the word counts")
-args = parser.parse_args()
+parser.add_argument("wordcount_file", help="file that contains the word counts (text or binary format)")
+
+###################
+#optional argument#
+###################
+parser.add_argument("--profile", default=None, \
+    help="profile the run (and the time of each stage) and write the profiles to files with " + \
+    "this prefix (see Profiling.py)")
 
 #parameters
 debug = False
-
-#input
-topic_file = open(args.topic_file)
-intruder_file = open(args.intruder_file)
-wc_file = open(args.wordcount_file)
-
-#global variables
-topics = [] #a list of topics, with each topic being a list of words
-intruders = [] #a list of human best words for each topic
-wordcount = {} #a dictionary of word counts
-window_total = 0
-normalised_pmi = False
-if args.pmi_type == "npmi":
-    normalised_pmi = True
+batch_size = 1000 #number of topics whose features are computed at a time
 
 #constants
 WTOTALKEY = "!!<TOTAL_WINDOWS>!!" #key name for total number of windows (in wordcount)
@@ -55,44 +50,34 @@ WTOTALKEY = "!!<TOTAL_WINDOWS>!!" #key name for total number of windows (in word
 #functions#
 ###########
 
-#conditional probability
+#conditional probability (of arrays of counts)
 #p(x|y) = p(x, y)/p(y)
 def calc_condprob(f_xy, f_y):
-    f_xy = float(f_xy)
-    f_y = float(f_y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(f_y == 0, 0.0, f_xy/f_y)
 
-    if f_y == 0:
-        return 0.0
-
-    return f_xy/f_y
-
-#calculate the pointwise mutual information score
+#calculate the pointwise mutual information score (of arrays of counts)
 #log( P(xy) / (P(x*)*P(*y)) )
 #if normalise, divide result by (-log P(xy))
-def calc_pmi(f_x, f_y, f_xy):
-    f_x = float(f_x)
-    f_y = float(f_y)
-    f_xy = float(f_xy)
-
-    if (f_x == 0) or (f_y == 0) or (f_xy == 0):
-        return 0.0
+#(the logarithms are computed as math.log(x, 2) does, i.e. log(x)/log(2), for identical scores)
+def calc_pmi(f_x, f_y, f_xy, window_total, normalised_pmi):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = np.log((f_xy*window_total)/(f_x*f_y)) / math.log(2)
+        if normalised_pmi:
+            result = result / (-1.0*(np.log(f_xy/window_total) / math.log(2)))
 
-    result = (math.log((f_xy*window_total)/(f_x*f_y), 2))
-    if normalised_pmi:
-        result = result / (-1.0*math.log(f_xy/window_total, 2))
+    return np.where((f_x == 0) | (f_y == 0) | (f_xy == 0), 0.0, result)
 
-    return result
 
-
-def get_wc(word):
+def get_wc(word, wordcount):
     if word in wordcount:
         return wordcount[word]
     else:
         return 0
 
-def get_wc2(w1, w2):
+def get_wc2(w1, w2, wordcount):
     if w1 == w2:
-        return get_wc(w1)
+        return get_wc(w1, wordcount)
 
     combined = ""
     if w1 > w2:
@@ -110,142 +95,176 @@ def get_word_pos(bestword, target_word):
     else:
         return 1
 
+#min-max normalise the feature values of each topic (topics x words x words), given the minimum and
+#maximum of each topic; the values of a topic whose minimum and maximum are equal are kept
 def normalize(val, min, max):
-    #result = (((1-alpha)*(float(val) - float(min)) + alpha) / (float(max) - float(min)))
-    #result = (float(val) - float(min) + alpha) / (float(max) - float(min) + alpha)
-    if max == min:
-        return val
-
-    result = (float(val) - float(min)) / (float(max) - float(min))
-    if debug:
-        print "\n\t\tnormalizing: val =", val, " min =", min, " max =", max
-        print "\t\t\tresult =", result
-
-    return result
-
-######
-#main#
-######
-
-#process topic_file
-for line in topic_file.readlines():
-    topics.append(line.strip().split())
-
-#process intruder_file
-for line in intruder_file.readlines():
-    intruders.append(int(line.strip())-1)
-
-#process the word count file(s)
-for line in wc_file:
-    line = line.strip()
-    data = line.split("|")
-    if len(data) == 2:
-        wordcount[data[0]] = int(data[1])
-    elif len(data) == 3:
-        if data[0] < data[1]:
-            key = data[0] + "|" + data[1]
-        else:
-            key = data[1] + "|" + data[0]
-        wordcount[key] = int(data[2])
-    else:
-        print "ERROR: wordcount format incorrect. Line =", line
-        raise SystemExit
-
-#get the total number of windows
-if WTOTALKEY in wordcount:
-    window_total = wordcount[WTOTALKEY]
-
-for i, topic_list in enumerate(topics):
-    intruder_id = intruders[i]
-    intruder_word = topic_list[intruder_id]
-
-    #calculate the feature values
-    cp1 = defaultdict(lambda:defaultdict(float))
-    cp2 = defaultdict(lambda:defaultdict(float))
-    pmi = defaultdict(lambda:defaultdict(float))
-    #store the values (for finding min and max later)
-    pmi_values = []
-    cp1_values = []
-    cp2_values = []
-   
-    #calculate the cond probabilities
-    for j, w1 in enumerate(topic_list):
+    min = min[:, None, None]
+    max = max[:, None, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(max == min, val, (val - min) / (max - min))
+
+#the word counts (topics x words) and the word pair counts (topics x words x words, symmetric) of a
+#batch of topics with the same number of words; each pair count is looked up once
+def get_count_matrices(topics, wordcount):
+    num_words = len(topics[0])
+    rows, cols = np.triu_indices(num_words, 1)
+    rows, cols = rows.tolist(), cols.tolist()
+    word_counts = np.zeros((len(topics), num_words))
+    pair_counts = np.zeros((len(topics), num_words, num_words))
+    for i, topic_list in enumerate(topics):
+        word_counts[i] = [ get_wc(word, wordcount) for word in topic_list ]
+        pair_counts[i, rows, cols] = [ get_wc2(topic_list[j], topic_list[k], wordcount) \
+            for (j, k) in zip(rows, cols) ]
+
+    return word_counts, pair_counts + pair_counts.transpose(0, 2, 1)
+
+#generate the SVM input lines of a batch of topics with the same number of words (see
+#gen_svm_input), with the given qids; the features of all the pairs of words of the topics are
+#computed as arrays (the feature of words j and k of topic i is [i, j, k]). Returns the lines of
+#each topic
+def gen_batch_svm_input(topics, intruders, qids, wordcount, window_total, normalised_pmi):
+    word_counts, pair_counts = get_count_matrices(topics, wordcount)
+    f_w1 = word_counts[:, :, None]
+    f_w2 = word_counts[:, None, :]
+
+    #calculate the feature values of each ordered pair of words (w1, w2)
+    cp1 = calc_condprob(pair_counts, f_w2)
+    cp2 = calc_condprob(pair_counts, f_w1)
+    pmi = calc_pmi(f_w1, f_w2, pair_counts, window_total, normalised_pmi)
+
+    #min-max normalise the feature values of each topic, over the pairs of different positions
+    off_diagonal = ~np.eye(len(topics[0]), dtype=bool)
+    features = []
+    for values in [pmi, cp1, cp2]:
+        pair_values = values[:, off_diagonal]
+        features.append(normalize(values, pair_values.min(axis=1), pair_values.max(axis=1)))
         if debug:
-            print "\nword1 =", w1
-
-        for k, w2 in enumerate(topic_list):
-            if j!= k:
-                cp1[w1][w2] = calc_condprob(get_wc2(w1, w2), get_wc(w2))
-                cp2[w1][w2] = calc_condprob(get_wc2(w1, w2), get_wc(w1))
-                pmi[w1][w2] = calc_pmi(get_wc(w1), get_wc(w2), get_wc2(w1, w2))
-                cp1_values.append(cp1[w1][w2])
-                cp2_values.append(cp2[w1][w2])
-                pmi_values.append(pmi[w1][w2])
-           
-                if debug:
-                    print "\tword2 =", w2
-                    print "\t\ttype1 =", cp1[w1][w2], "\ttype2 =", cp2[w1][w2]
-
-    #print the topic features
-    wordlist = [intruder_word]
-    for topic_word in topic_list:
-        if topic_word not in wordlist:
-            wordlist.append(topic_word)
-
-    #get the min and max values of the features
-    pmi_min = min(pmi_values)
-    pmi_max = max(pmi_values)
-    cp1_min = min(cp1_values)
-    cp1_max = max(cp1_values)
-    cp2_min = min(cp2_values)
-    cp2_max = max(cp2_values)
-
-    if debug:
-        print "pmi_max =", pmi_max, "\tpmi_min =", pmi_min
-        print "condprob_type1_max =", cp1_max , "\tmin =", cp1_min
-        print "condprob_type2_max =", cp2_max, "\tmin =", cp2_min
-
-    #print the features
-    for target_word in wordlist:
-        print get_word_pos(intruder_word, target_word),
-        print "qid:" + str(i+1),
-        feature_id = 1
-
-        #pmi, condprob features with other words
+            print "max =", pair_values.max(axis=1).tolist(), "\tmin =", \
+                pair_values.min(axis=1).tolist()
+    pmi, cp1, cp2 = features
+
+    #the words of the lines of each topic (the intruder word first, then the other distinct words),
+    #and the (topic, target word, other word) positions of the features of all the lines
+    wordlists = []
+    feature_topics = []
+    feature_targets = []
+    feature_others = []
+    for i, topic_list in enumerate(topics):
+        wordlist = [topic_list[intruders[i]]]
         for topic_word in topic_list:
-
-            if target_word == topic_word:
-                continue
-        
+            if topic_word not in wordlist:
+                wordlist.append(topic_word)
+        wordlists.append(wordlist)
+        for target_word in wordlist:
+            target = topic_list.index(target_word)
+            others = [ k for k, topic_word in enumerate(topic_list) if topic_word != target_word ]
+            feature_topics.extend([i]*len(others))
+            feature_targets.extend([target]*len(others))
+            feature_others.extend(others)
+
+    #the pmi and condprob features with each of the other words, formatted all at once
+    values = np.column_stack([pmi[feature_topics, feature_others, feature_targets], \
+        cp1[feature_topics, feature_targets, feature_others], \
+        cp2[feature_topics, feature_targets, feature_others]]).ravel().tolist()
+    values = [ str(val) for val in values ]
+    feature_ids = [ str(feature_id+1) + ":" for feature_id in range(3*len(topics[0])) ]
+
+    topic_lines = []
+    start = 0
+    for i, topic_list in enumerate(topics):
+        intruder_word = topic_list[intruders[i]]
+        qid = "qid:" + str(qids[i])
+        svm_input = []
+
+        #the features of each word, one line per word (the fields are separated by spaces)
+        for target_word in wordlists[i]:
+            others = [ k for k, topic_word in enumerate(topic_list) if topic_word != target_word ]
+            end = start + 3*len(others)
+            fields = [ feature_id + val for feature_id, val in zip(feature_ids, values[start:end]) ]
+            start = end
             if debug:
-                print "\n\nPair = (", target_word, topic_word, ")"
+                names = [ name for k in others for name in ["#pmi(" + target_word + "," + \
+                    topic_list[k] + ")", "#P(" + target_word + "|" + topic_list[k] + ")", \
+                    "#P(" + topic_list[k] + "|" + target_word + ")"] ]
+                fields = [ field for pair in zip(names, fields) for field in pair ]
+
+            line = [ str(get_word_pos(intruder_word, target_word)), qid ] + fields
+            #comment for the target word
+            line.append("#" + target_word)
+            svm_input.append(" ".join(line))
+        topic_lines.append(svm_input)
+
+    return topic_lines
+
+#generate the SVM input of topics (lists of words) and their intruder words (index of the intruder
+#word in each topic), given the word counts (a dictionary, or anything that supports 'in' and [],
+#such as WordCountFile.BinaryWordCount); returns the lines of the SVM input file (orig.dat). The
+#topics are processed in batches (of batch_size topics, and of the same number of words)
+def gen_svm_input(topics, intruders, wordcount, normalised_pmi=False):
+    #get the total number of windows
+    window_total = 0
+    if WTOTALKEY in wordcount:
+        window_total = wordcount[WTOTALKEY]
+
+    svm_input = []
+    for batch_start in range(0, len(topics), batch_size):
+        batch_topics = topics[batch_start:batch_start+batch_size]
+        batch_intruders = intruders[batch_start:batch_start+batch_size]
+        #the topics of the batch are grouped by their number of words
+        topic_lines = [None]*len(batch_topics)
+        for topic_len in set([ len(topic_list) for topic_list in batch_topics ]):
+            ids = [ i for i, topic_list in enumerate(batch_topics) if len(topic_list) == topic_len ]
+            with Profiling.stage("compute features"):
+                batch_lines = gen_batch_svm_input([ batch_topics[i] for i in ids ], \
+                    [ batch_intruders[i] for i in ids ], [ batch_start+i+1 for i in ids ], \
+                    wordcount, window_total, normalised_pmi)
+            for i, lines in zip(ids, batch_lines):
+                topic_lines[i] = lines
+        svm_input.extend([ line for lines in topic_lines for line in lines ])
+
+    return svm_input
+
+#load a word count file; a binary word count file is memory-mapped and looked up directly, and a
+#text word count file is read into a dictionary (with byte string keys, as the topic words)
+def load_word_count(wordcount_file):
+    if WordCountFile.is_binary(wordcount_file):
+        return WordCountFile.BinaryWordCount(wordcount_file, {})
+
+    return WordCountFile.read_text(wordcount_file, unicode_keys=False)
 
-            #pmi feature
-            val = 0.0
-            if target_word != topic_word:
-                val = normalize(pmi[topic_word][target_word], pmi_min, pmi_max)
-            if debug:
-                print "#pmi(" + target_word + "," + topic_word + ")",
-            print str(feature_id) + ":" + str(val),
-            feature_id += 1
-
-            #cp1 feature
-            val = 0.0
-            if target_word != topic_word:
-                val = normalize(cp1[target_word][topic_word], cp1_min, cp1_max)
-            if debug:
-                print "#P(" + target_word + "|" + topic_word + ")",
-            print str(feature_id) + ":" + str(val),
-            feature_id += 1
-
-            #cp2 feature
-            val = 0.0
-            if target_word != topic_word:
-                val = normalize(cp2[target_word][topic_word], cp2_min, cp2_max)
-            if debug:
-                    print "#P(" + topic_word + "|" + target_word + ")",
-            print str(feature_id) + ":" + str(val),
-            feature_id += 1
-
-        #comment for the target word
-        print "#" + target_word
+######
+#main#
+######
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+
+    #input
+    topic_file = open(args.topic_file)
+    intruder_file = open(args.intruder_file)
+
+    #global variables
+    topics = [] #a list of topics, with each topic being a list of words
+    intruders = [] #a list of human best words for each topic
+    wordcount = {} #a dictionary of word counts
+    normalised_pmi = False
+    if args.pmi_type == "npmi":
+        normalised_pmi = True
+
+    #process topic_file
+    for line in topic_file.readlines():
+        topics.append(line.strip().split())
+
+    #process intruder_file
+    for line in intruder_file.readlines():
+        intruders.append(int(line.strip())-1)
+
+    #process the word count file(s)
+    with Profiling.stage("read word counts"):
+        wordcount = load_word_count(args.wordcount_file)
+
+    #print the features, all at once
+    svm_input = gen_svm_input(topics, intruders, wordcount, normalised_pmi)
+    with Profiling.stage("write features"):
+        if svm_input:
+            sys.stdout.write("\n".join(svm_input) + "\n")
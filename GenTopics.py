@@ -0,0 +1,89 @@
+"""
+Generates a synthetic topic file for benchmarking, with the words of the corpus generated by
+GenZipfCorpus.py ("w<rank>"), and the matching intruder word file (a random word of each topic is
+taken as the intruder), so that the topics can be used with ComputeWordCount.py,
+ComputeObservedCoherence.py and GenSVMInput.py.
+
+Usage:          GenTopics.py <topic_file> [-i intruder_file] [-n num_topics] [-l topic_len]
+                [-c colloc_ratio] [-v vocab_size] [--seed seed]
+Output:         one topic per line (topic_len words; collocations are concatenated with "_"), and
+                one intruder word position (starting from 1) per line in the intruder word file
+"""
+
+import argparse
+import numpy as np
+from GenZipfCorpus import get_word
+import Profiling
+
+#parser arguments
+desc = "Generates a synthetic topic file (and intruder word file) for the corpus generated by \
+    GenZipfCorpus.py."
+parser = argparse.ArgumentParser(description=desc)
+#####################
+#positional argument#
+#####################
+parser.add_argument("topic_file", help="file to store the topics")
+
+###################
+#optional argument#
+###################
+parser.add_argument("-i", "--intruder_file", default=None, \
+    help="file to store the intruder word positions of the topics")
+parser.add_argument("-n", "--num_topics", type=int, default=100, \
+    help="number of topics. Default = 100")
+parser.add_argument("-l", "--topic_len", type=int, default=10, \
+    help="number of words of a topic. Default = 10")
+parser.add_argument("-c", "--colloc_ratio", type=float, default=0.0, \
+    help="share of the topic words that are collocations (of two words). Default = 0.0")
+parser.add_argument("-v", "--vocab_size", type=int, default=5000, \
+    help="the topic words are drawn from the vocab_size most frequent words of the corpus. " + \
+    "Default = 5000")
+parser.add_argument("--seed", type=int, default=1, help="random seed. Default = 1")
+parser.add_argument("--profile", default=None, \
+    help="profile the run (and the time of each stage) and write the profiles to files with " + \
+    "this prefix (see Profiling.py)")
+
+###########
+#functions#
+###########
+#generate the topics (lists of words) and the intruder word position of each topic; the same
+#arguments always generate the same topics
+def gen_topics(num_topics=100, topic_len=10, colloc_ratio=0.0, vocab_size=5000, seed=1):
+    rng = np.random.RandomState(seed)
+    topics = []
+    intruders = []
+    for i in range(num_topics):
+        ranks = rng.choice(np.arange(1, vocab_size+1), topic_len, replace=False).tolist()
+        topic = []
+        for rank in ranks:
+            if rng.random_sample() < colloc_ratio:
+                topic.append(get_word(rank) + "_" + get_word(rng.randint(1, vocab_size+1)))
+            else:
+                topic.append(get_word(rank))
+        topics.append(topic)
+        intruders.append(rng.randint(1, topic_len+1))
+
+    return topics, intruders
+
+#write the topics, one per line, and the intruder word positions (if intruder_file is given)
+def write_topics(topics, intruders, topic_file, intruder_file=None):
+    output = open(topic_file, "w")
+    for topic in topics:
+        output.write(" ".join(topic) + "\n")
+    output.close()
+    if intruder_file:
+        output = open(intruder_file, "w")
+        for intruder in intruders:
+            output.write(str(intruder) + "\n")
+        output.close()
+
+######
+#main#
+######
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+
+    topics, intruders = gen_topics(args.num_topics, args.topic_len, args.colloc_ratio, \
+        args.vocab_size, args.seed)
+    write_topics(topics, intruders, args.topic_file, args.intruder_file)
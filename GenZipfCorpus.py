@@ -0,0 +1,91 @@
+"""
+Generates a synthetic reference corpus for benchmarking, with word frequencies following a Zipf
+distribution (the word of rank k has probability proportional to 1/k^s) and geometrically
+distributed document lengths. The words are named by their rank ("w1" is the most frequent), so
+topics generated by GenTopics.py with the same vocabulary size are found in the corpus.
+
+Usage:          GenZipfCorpus.py <corpus_dir> [-s size_mb] [-n num_partitions] [-v vocab_size]
+                [-z zipf_exponent] [-d doc_len] [--seed seed]
+Output:         num_partitions files (corpus.0, corpus.1, ...) in <corpus_dir>, one document per line
+"""
+
+import argparse
+import os
+import numpy as np
+import Profiling
+
+#parser arguments
+desc = "Generates a synthetic reference corpus with Zipf-distributed word frequencies."
+parser = argparse.ArgumentParser(description=desc)
+#####################
+#positional argument#
+#####################
+parser.add_argument("corpus_dir", help="directory to store the corpus")
+
+###################
+#optional argument#
+###################
+parser.add_argument("-s", "--size", type=float, default=10, \
+    help="size of the corpus in MB. Default = 10")
+parser.add_argument("-n", "--num_partitions", type=int, default=4, \
+    help="number of partitions of the corpus. Default = 4")
+parser.add_argument("-v", "--vocab_size", type=int, default=100000, \
+    help="number of distinct words. Default = 100000")
+parser.add_argument("-z", "--zipf_exponent", type=float, default=1.0, \
+    help="exponent s of the Zipf distribution. Default = 1.0")
+parser.add_argument("-d", "--doc_len", type=int, default=300, \
+    help="mean number of words of a document. Default = 300")
+parser.add_argument("--seed", type=int, default=1, help="random seed. Default = 1")
+parser.add_argument("--profile", default=None, \
+    help="profile the run (and the time of each stage) and write the profiles to files with " + \
+    "this prefix (see Profiling.py)")
+
+#parameters
+block_size = 2**20 #number of words generated at a time
+
+###########
+#functions#
+###########
+#the name of the word of a rank (starting from 1)
+def get_word(rank):
+    return "w" + str(rank)
+
+#generate the corpus; the same arguments always generate the same corpus
+def gen_zipf_corpus(corpus_dir, size=10, num_partitions=4, vocab_size=100000, zipf_exponent=1.0, \
+    doc_len=300, seed=1):
+    rng = np.random.RandomState(seed)
+    vocab = [ get_word(rank) for rank in range(1, vocab_size+1) ]
+    cdf = np.cumsum(1.0 / np.arange(1, vocab_size+1) ** zipf_exponent)
+    cdf /= cdf[-1]
+
+    if not os.path.exists(corpus_dir):
+        os.makedirs(corpus_dir)
+    partition_size = int(size*1024*1024) // num_partitions
+    for i in range(num_partitions):
+        output = open(os.path.join(corpus_dir, "corpus." + str(i)), "w")
+        written = 0
+        while written < partition_size:
+            #sample a block of words and split it into documents
+            words = [ vocab[word_id] for word_id in \
+                np.searchsorted(cdf, rng.random_sample(block_size)).tolist() ]
+            doc_lens = rng.geometric(1.0 / doc_len, block_size // doc_len + 1)
+            doc_ends = np.cumsum(doc_lens)
+            doc_ends = doc_ends[doc_ends <= block_size].tolist()
+            doc_start = 0
+            for doc_end in doc_ends:
+                line = " ".join(words[doc_start:doc_end]) + "\n"
+                output.write(line)
+                written += len(line)
+                doc_start = doc_end
+                if written >= partition_size:
+                    break
+        output.close()
+
+######
+#main#
+######
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+    gen_zipf_corpus(args.corpus_dir, args.size, args.num_partitions, args.vocab_size, \
+        args.zipf_exponent, args.doc_len, args.seed)
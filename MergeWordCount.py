@@ -0,0 +1,120 @@
+"""
+Merges the partial count files of the shards of a corpus (written by ComputeWordCount.py with
+--shard, e.g. on different hosts) into the word count file of the whole corpus. The partial count
+files are sorted by key, so they are merged in a single streaming pass (a k-way merge) and never
+loaded into memory.
+
+Usage:          MergeWordCount.py <partial_file>+ [-o output_file] [-b binary_output]
+Output:         the word counts, in the format of ComputeWordCount.py (identical to the word counts of
+                the whole corpus counted in a single run)
+"""
+
+import argparse
+import sys
+import codecs
+import heapq
+import itertools
+import operator
+import WordCountFile
+import Profiling
+
+#parser arguments
+desc = "Merges the partial count files of the shards of a corpus into one word count file."
+parser = argparse.ArgumentParser(description=desc)
+#####################
+#positional argument#
+#####################
+parser.add_argument("partial_files", nargs="+", help="partial count files of all the shards " + \
+    "(of the same topics and window size)")
+
+###################
+#optional argument#
+###################
+parser.add_argument("-o", "--output_file", default=None, \
+    help="write the word counts to this file (in the text format) instead of printing them")
+parser.add_argument("-b", "--binary_output", default=None, \
+    help="write the word counts to this file in the binary (memory-mappable) format instead of " + \
+    "printing them in the text format")
+parser.add_argument("--profile", default=None, \
+    help="profile the run (and the time of each stage) and write the profiles to files with " + \
+    "this prefix (see Profiling.py)")
+
+###########
+#functions#
+###########
+#check that the partial count files are the shards of the same topic relation and window size, and
+#that every shard (and corpus partition) is counted exactly once; returns the list of problems
+def check_headers(partial_files, headers):
+    errors = []
+    first_file, first = partial_files[0], headers[0]
+    for partial_file, header in zip(partial_files, headers):
+        for field in ["relation", "window_size", "num_shards"]:
+            if header[field] != first[field]:
+                errors.append("%s has a different %s than %s (%s, %s)" % (partial_file, field, \
+                    first_file, header[field], first[field]))
+
+    shard_files = {}
+    for partial_file, header in zip(partial_files, headers):
+        shard_files.setdefault(header["shard"], []).append(partial_file)
+    for shard in range(first["num_shards"]):
+        if shard not in shard_files:
+            errors.append("shard %d/%d is missing" % (shard, first["num_shards"]))
+        elif len(shard_files[shard]) > 1:
+            errors.append("shard %d/%d is given more than once (%s)" % (shard, \
+                first["num_shards"], ", ".join(shard_files[shard])))
+
+    partition_files = {}
+    for partial_file, header in zip(partial_files, headers):
+        for partition in header["partitions"]:
+            partition_files.setdefault(partition, []).append(partial_file)
+    for partition, files in sorted(partition_files.items()):
+        if len(files) > 1:
+            errors.append("corpus partition %s is counted more than once (%s)" % (partition, \
+                ", ".join(files)))
+
+    return errors
+
+#merge the sorted (key, count) entries of the partial count files, adding up the counts of the same
+#key; yields the merged (key, count) entries in the order of the keys
+def merge_entries(entry_iters):
+    for key, entries in itertools.groupby(heapq.merge(*entry_iters), key=operator.itemgetter(0)):
+        yield key, sum([ count for _, count in entries ])
+
+#merge the partial count files into the output file (text format) and/or the binary output file, or
+#print the word counts to stdout if neither is given
+def merge_word_counts(partial_files, output_file=None, binary_output=None):
+    headers, entry_iters = zip(*[ WordCountFile.read_partial(f) for f in partial_files ])
+    errors = check_headers(partial_files, headers)
+    if errors:
+        for error in errors:
+            sys.stderr.write("ERROR: " + error + "\n")
+        raise SystemExit
+    sys.stderr.write("merging %d shards (window size %d)\n" % (len(partial_files), \
+        headers[0]["window_size"]))
+
+    outputs = []
+    if output_file:
+        outputs.append(codecs.open(output_file, "w", "utf-8"))
+    elif not binary_output:
+        outputs.append(codecs.getwriter("utf-8")(sys.stdout))
+    wordcount = {}
+    with Profiling.stage("merge entries"):
+        for key, count in merge_entries(entry_iters):
+            for output in outputs:
+                output.write(key + "|" + str(count) + "\n")
+            if binary_output:
+                wordcount[key] = count
+
+    if output_file:
+        outputs[0].close()
+    if binary_output:
+        with Profiling.stage("write binary word counts"):
+            WordCountFile.write_binary(wordcount, binary_output)
+
+######
+#main#
+######
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+    merge_word_counts(args.partial_files, args.output_file, args.binary_output)
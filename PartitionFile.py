@@ -0,0 +1,86 @@
+"""
+Reads and writes the files that the index partitions (BuildCorpusIndex.py) and the tokenized
+partitions (TokenizeCorpus.py) have in common, so that both formats read the corpus and record its
+state the same way:
+    vocab.txt       - the terms of the partition, one per line (line number = term id)
+    doc_offsets.npy - int64 array; the tokens of document i are those at positions doc_offsets[i]
+                      to doc_offsets[i+1]-1
+    source.txt      - path, size and modification time of the corpus partition, separated by tabs
+"""
+
+import sys
+import os
+import codecs
+import array
+import numpy as np
+import CorpusFile
+import Profiling
+
+#constants
+VOCAB_FILE = "vocab.txt"
+DOC_OFFSETS_FILE = "doc_offsets.npy"
+SOURCE_FILE = "source.txt"
+
+###########
+#functions#
+###########
+#read and split the documents of a corpus partition (which can be compressed) the same way as
+#ComputeWordCount.py does with the text; returns the terms of the partition (in order of first
+#occurrence), the term ids of its tokens (array "I", in corpus order) and the document offsets
+#(array "l")
+def tokenize(corpus_file):
+    vocab = {} #term -> term id
+    vocab_list = []
+    tokens = array.array("I") #term ids of the partition, in corpus order
+    doc_offsets = array.array("l", [0])
+
+    with Profiling.stage("read and tokenize"):
+        for line in CorpusFile.read_lines(corpus_file):
+            for word in line.split():
+                if word not in vocab:
+                    vocab[word] = len(vocab_list)
+                    vocab_list.append(word)
+                tokens.append(vocab[word])
+            doc_offsets.append(len(tokens))
+
+    return vocab_list, tokens, doc_offsets
+
+#write the vocabulary and the document offsets of a partition
+def write_vocab(partition_dir, vocab_list, doc_offsets):
+    vocab_file = codecs.open(os.path.join(partition_dir, VOCAB_FILE), "w", "utf-8")
+    for word in vocab_list:
+        vocab_file.write(word + "\n")
+    vocab_file.close()
+    np.save(os.path.join(partition_dir, DOC_OFFSETS_FILE), \
+        np.frombuffer(doc_offsets, dtype=np.dtype("l")).astype(np.int64))
+
+#record the corpus partition of a partition, with its state (os.stat) before it was read
+def write_source(partition_dir, corpus_file, corpus_stat):
+    source_file = codecs.open(os.path.join(partition_dir, SOURCE_FILE), "w", "utf-8")
+    source_file.write(os.path.abspath(corpus_file) + "\t" + str(corpus_stat.st_size) + "\t" + \
+        repr(corpus_stat.st_mtime) + "\n")
+    source_file.close()
+
+#the path, size and modification time (repr) of the corpus partition of a partition
+def get_source(partition_dir):
+    corpus_file, size, mtime = codecs.open(os.path.join(partition_dir, SOURCE_FILE), "r", \
+        "utf-8").read().strip().split("\t")
+
+    return corpus_file, int(size), mtime
+
+#warn if the corpus partition of a partition has changed since it was read; kind names the
+#partition ("index", "tokenized") and rebuild_hint tells how to rebuild it
+def check_source(partition_dir, kind, rebuild_hint):
+    if not os.path.exists(os.path.join(partition_dir, SOURCE_FILE)):
+        sys.stderr.write("WARNING: " + kind + " partition " + partition_dir + " does not " + \
+            "record its corpus partition; it may be out of date\n")
+        return
+    corpus_file, size, mtime = get_source(partition_dir)
+    if not os.path.exists(corpus_file):
+        sys.stderr.write("WARNING: corpus partition " + corpus_file + " of " + kind + \
+            " partition " + partition_dir + " no longer exists\n")
+    else:
+        corpus_stat = os.stat(corpus_file)
+        if corpus_stat.st_size != size or repr(corpus_stat.st_mtime) != mtime:
+            sys.stderr.write("WARNING: corpus partition " + corpus_file + " has changed since " + \
+                "it was read; " + rebuild_hint + "\n")
@@ -0,0 +1,222 @@
+"""
+Profiles a run of a script (the --profile option of the scripts): the main process and every worker
+process of its pools (and the worker threads of the scripts that run their work in threads) are
+profiled with cProfile and sampled (the stack of the running Python code is recorded every
+sample_interval seconds of CPU time), and the named stages of the scripts (see stage) are timed.
+When the script exits, the profiles of all the processes are merged and written to the files of the
+profile prefix:
+    <prefix>.pstats     the merged cProfile statistics (read with pstats or e.g. snakeviz)
+    <prefix>.collapsed  the merged stack samples, one "frame;frame;...;frame count" line per stack
+                        (the input of flamegraph.pl or speedscope), rooted at "main", "worker"
+                        (a worker process) or "thread" (a worker thread)
+    <prefix>.stages     the calls and seconds of each named stage (JSON), summed over the processes
+
+The worker functions of the pools are wrapped with profiled, which profiles their calls in the
+worker processes and writes the profiles of the worker to a temporary directory after each call (the
+pool does not tell the workers when it is done); the main process merges them when it exits. In a
+thread of the main process, the calls are profiled with a profiler of their own, which is merged
+when the call returns. Without --profile, profiled and stage only add a dictionary lookup to each
+call.
+"""
+
+import sys
+import os
+import time
+import atexit
+import collections
+import contextlib
+import cProfile
+import functools
+import json
+import pstats
+import shutil
+import signal
+import tempfile
+import threading
+
+#parameters
+sample_interval = 0.005 #seconds of CPU time between the stack samples
+
+#global variables
+#the profile prefix, the pid and main thread of the main process, the directory of the worker
+#profiles, the profiler of the process, the threads in profiled calls and the merged profiles of
+#their calls; empty if the run is not profiled
+profile_state = {}
+profile_lock = threading.Lock() #guards the stage times and the thread profiles
+stage_times = {} #the [calls, seconds] of each named stage in this process
+stack_samples = collections.Counter() #the number of samples of each stack in this process
+
+###########
+#functions#
+###########
+#the name of a frame in the collapsed stacks
+def get_frame_name(frame):
+    code = frame.f_code
+    return "%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+#the collapsed stack of a frame, rooted at root
+def get_stack(frame, root):
+    frames = []
+    while frame is not None:
+        frames.append(get_frame_name(frame))
+        frame = frame.f_back
+    return ";".join([root] + frames[::-1])
+
+#signal handler of the sampling timer: record the stack of the interrupted frame (in the main
+#thread) and those of the threads in profiled calls
+def sample_stack(signum, frame):
+    if os.getpid() != profile_state["pid"]:
+        stack_samples[get_stack(frame, "worker")] += 1
+        return
+    stack_samples[get_stack(frame, "main")] += 1
+    thread_frames = sys._current_frames()
+    for thread_id in list(profile_state["threads"]):
+        if thread_id in thread_frames:
+            stack_samples[get_stack(thread_frames[thread_id], "thread")] += 1
+
+#start (or, with interval 0, stop) sampling the stacks of this process; system calls interrupted by
+#a sample are restarted
+def set_sampling(interval):
+    signal.signal(signal.SIGPROF, sample_stack)
+    signal.siginterrupt(signal.SIGPROF, False)
+    signal.setitimer(signal.ITIMER_PROF, interval, interval)
+
+#time a named stage of a script (used as "with Profiling.stage(name):"); stages can be nested, and
+#are only timed if the run is profiled
+@contextlib.contextmanager
+def stage(name):
+    if not profile_state:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        add_stage_time(name, time.time() - start)
+
+#add the time of a stage measured by the script itself (e.g. a share of the time of a worker call)
+def add_stage_time(name, seconds, calls=1):
+    if not profile_state:
+        return
+    with profile_lock:
+        times = stage_times.setdefault(name, [0, 0.0])
+        times[0] += calls
+        times[1] += seconds
+
+#start profiling a worker process (forked from the main process, whose profiler, samples and stage
+#times it inherits): the inherited profiler is replaced by one of its own
+def start_worker():
+    profile_state["profiler"].disable()
+    profile_state["profiler"] = cProfile.Profile()
+    profile_state["worker_pid"] = os.getpid()
+    stage_times.clear()
+    stack_samples.clear()
+
+#write the profiles of this worker process so far (they are cumulative, so each write replaces the
+#previous one) to the directory of the worker profiles
+def write_worker_profile():
+    worker_file = os.path.join(profile_state["dir"], str(os.getpid()))
+    profile_state["profiler"].dump_stats(worker_file + ".prof")
+    output = open(worker_file + ".tmp", "w")
+    json.dump({"stages": stage_times, "samples": dict(stack_samples)}, output)
+    output.close()
+    os.rename(worker_file + ".tmp", worker_file + ".json")
+
+#profile a call of func in a thread of the main process, and merge its profile into those of the
+#other threads
+def profile_thread_call(func, args, kwargs):
+    thread_id = threading.current_thread().ident
+    profiler = cProfile.Profile()
+    profile_state["threads"].add(thread_id)
+    profiler.enable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profile_state["threads"].discard(thread_id)
+        with profile_lock:
+            if profile_state.get("thread_stats") is None:
+                profile_state["thread_stats"] = pstats.Stats(profiler)
+            else:
+                profile_state["thread_stats"].add(profiler)
+
+#wrap a worker function of a pool (used as a decorator of the module-level function, so it can still
+#be pickled by name) or of threads; in a worker process or thread of a profiled run, its calls are
+#profiled and sampled
+def profiled(func):
+    @functools.wraps(func)
+    def profiled_func(*args, **kwargs):
+        if not profile_state:
+            return func(*args, **kwargs)
+        if os.getpid() == profile_state["pid"]:
+            if threading.current_thread().ident == profile_state["thread"]:
+                return func(*args, **kwargs)
+            return profile_thread_call(func, args, kwargs)
+        if profile_state.get("worker_pid") != os.getpid():
+            start_worker()
+        set_sampling(sample_interval)
+        profile_state["profiler"].enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile_state["profiler"].disable()
+            set_sampling(0)
+            write_worker_profile()
+    return profiled_func
+
+#start profiling the run of a script (in its main process), writing the profiles to the files of
+#the profile prefix when it exits; does nothing if the prefix is None
+def start(prefix):
+    if not prefix or profile_state:
+        return
+    profile_state.update({"prefix": prefix, "pid": os.getpid(), \
+        "thread": threading.current_thread().ident, "threads": set([]), "thread_stats": None, \
+        "dir": tempfile.mkdtemp(prefix="profile.")})
+    atexit.register(finish)
+    profile_state["profiler"] = cProfile.Profile()
+    set_sampling(sample_interval)
+    profile_state["profiler"].enable()
+
+#stop profiling, merge the profiles of the main process and the worker processes and write them to
+#the files of the profile prefix (see the module description)
+def finish():
+    if not profile_state or os.getpid() != profile_state["pid"]:
+        return
+    profile_state["profiler"].disable()
+    set_sampling(0)
+    prefix, worker_dir = profile_state["prefix"], profile_state["dir"]
+
+    stats = pstats.Stats(profile_state["profiler"])
+    if profile_state["thread_stats"] is not None:
+        stats.add(profile_state["thread_stats"])
+    samples = collections.Counter(stack_samples)
+    stages = dict([ (name, list(times)) for name, times in stage_times.items() ])
+    worker_files = sorted([ f for f in os.listdir(worker_dir) if f.endswith(".json") ])
+    for worker_file in worker_files:
+        worker_file = os.path.join(worker_dir, worker_file[:-len(".json")])
+        stats.add(worker_file + ".prof")
+        worker_profile = json.load(open(worker_file + ".json"))
+        for stack, count in worker_profile["samples"].items():
+            samples[stack] += count
+        for name, (calls, seconds) in worker_profile["stages"].items():
+            times = stages.setdefault(name, [0, 0.0])
+            times[0] += calls
+            times[1] += seconds
+    shutil.rmtree(worker_dir)
+    profile_state.clear()
+
+    stats.dump_stats(prefix + ".pstats")
+    output = open(prefix + ".collapsed", "w")
+    for stack, count in sorted(samples.items()):
+        output.write(stack.encode("utf-8") + " " + str(count) + "\n")
+    output.close()
+    output = open(prefix + ".stages", "w")
+    json.dump(dict([ (name, {"calls": calls, "seconds": seconds}) for name, (calls, seconds) in \
+        stages.items() ]), output, indent=1, sort_keys=True)
+    output.close()
+
+    #summary of the stages, longest first
+    sys.stderr.write("profile of %d processes written to %s.pstats, %s.collapsed and %s.stages\n" \
+        % (len(worker_files)+1, prefix, prefix, prefix))
+    for name, (calls, seconds) in sorted(stages.items(), key=lambda x: -x[1][1]):
+        sys.stderr.write("stage %s: %d calls, %.3f s\n" % (name, calls, seconds))
@@ -0,0 +1,206 @@
+"""
+Runs the word intrusion task in-process: generates the SVM features of the topics (as
+GenSVMInput.py), splits them for cross validation (as SplitSVM.py), trains and applies a linear
+pairwise ranking model on each fold (in parallel), and computes the model precision (as
+ComputeWordIntrusion.py), without svm_rank and without the intermediate files.
+
+The ranking model is a linear RankSVM: for every pair of lines (i, j) of the same qid where line i
+has the higher rank, the model scores w.x_i above w.x_j by a margin of 1, with the squared hinge
+loss. It minimises 1/2 |w|^2 + C/n * sum(max(0, 1 - w.(x_i - x_j))^2), where n is the number of
+qids, as C is given to svm_rank_learn (-c), and is trained by Newton's method on the active pairs.
+
+Usage:          RankSVM.py <topic_file> <intruder_file> <pmi_type> <wordcount_file> [-c C]
+                [-f num_folds] [-p processes]
+Stdout:         the model precision of each topic (as ComputeWordIntrusion.py)
+"""
+
+import argparse
+import sys
+import codecs
+import numpy as np
+from multiprocessing import Pool, cpu_count
+import GenSVMInput
+import SplitSVM
+import ComputeWordIntrusion
+import Profiling
+
+#parser arguments
+desc = "Computes the model precision of the word intrusion task with an in-process RankSVM."
+parser = argparse.ArgumentParser(description=desc)
+#####################
+#positional argument#
+#####################
+parser.add_argument("topic_file", help="file that contains the topics")
+parser.add_argument("intruder_file", help="file that contains the intruder words for the topics")
+parser.add_argument("pmi_type", help="pmi or normalised pmi", choices=["pmi","npmi"])
+parser.add_argument("wordcount_file", help="file that contains the word counts (text or " + \
+    "binary format)")
+
+###################
+#optional argument#
+###################
+parser.add_argument("-c", "--cost", type=float, default=0.01, \
+    help="trade-off between the margin and the training error (as -c of svm_rank_learn). " + \
+    "Default = 0.01")
+parser.add_argument("-f", "--num_folds", type=int, default=SplitSVM.NUM_PART, \
+    help="number of folds of the cross validation. Default = " + str(SplitSVM.NUM_PART))
+parser.add_argument("-p", "--processes", type=int, default=None, \
+    help="number of worker processes (the folds are trained in parallel). Default = number of CPUs")
+parser.add_argument("--profile", default=None, \
+    help="profile the run (the main and worker processes, and the time of each stage) and " + \
+    "write the profiles to files with this prefix (see Profiling.py)")
+
+#global variables
+#the parsed SVM input and the cost, set once in each worker process by init_worker
+worker_data = {}
+
+#parameters
+max_iter = 100 #maximum number of Newton iterations
+tolerance = 1e-8 #the training stops when the norm of the gradient falls below this
+
+###########
+#functions#
+###########
+#parse the lines of the SVM input ("<rank> qid:<qid> <feature_id>:<value> ... #<comment>"); returns
+#the ranks, the qids and the (dense) feature matrix, with feature i in column i-1
+def parse_svm_input(lines):
+    ranks = []
+    qids = []
+    rows = []
+    for line in lines:
+        data = line.split("#", 1)[0].split()
+        ranks.append(float(data[0]))
+        qids.append(int(data[1][4:]))
+        rows.append([ (int(feature_id), float(value)) for (feature_id, _, value) in \
+            [ f.partition(":") for f in data[2:] ] ])
+
+    num_features = max([ feature_id for row in rows for (feature_id, _) in row ] + [0])
+    features = np.zeros((len(rows), num_features))
+    for i, row in enumerate(rows):
+        for (feature_id, value) in row:
+            features[i, feature_id-1] = value
+
+    return np.array(ranks), np.array(qids, dtype=np.int64), features
+
+#the first line of each qid (group of consecutive lines of the same qid), and the number of lines
+def get_qid_starts(qids):
+    return np.concatenate([[0], np.flatnonzero(np.diff(qids)) + 1, [len(qids)]]).astype(np.int64)
+
+#the feature differences (x_i - x_j) of all the pairs of lines of the same qid where line i has the
+#higher rank
+def get_pair_diffs(ranks, qids, features):
+    diffs = []
+    qid_starts = get_qid_starts(qids)
+    for start, end in zip(qid_starts[:-1].tolist(), qid_starts[1:].tolist()):
+        higher, lower = np.nonzero(ranks[start:end, None] > ranks[None, start:end])
+        diffs.append(features[start + higher] - features[start + lower])
+
+    return np.concatenate(diffs + [np.zeros((0, features.shape[1]))])
+
+#the objective (see the module description) of the weights w, given the pair differences and the
+#cost per pair
+def get_objective(w, diffs, pair_cost):
+    losses = np.maximum(0, 1 - diffs.dot(w))
+    return 0.5*w.dot(w) + pair_cost*losses.dot(losses)
+
+#train the ranking model on the lines of the SVM input (see parse_svm_input); returns the weights
+def train(ranks, qids, features, cost=0.01):
+    diffs = get_pair_diffs(ranks, qids, features)
+    pair_cost = float(cost) / max(len(np.unique(qids)), 1)
+    w = np.zeros(features.shape[1])
+    for i in range(max_iter):
+        #the loss, gradient and Hessian only depend on the pairs within the margin
+        margins = 1 - diffs.dot(w)
+        active = diffs[margins > 0]
+        gradient = w - 2*pair_cost*active.T.dot(margins[margins > 0])
+        if np.linalg.norm(gradient) <= tolerance:
+            break
+        hessian = np.eye(len(w)) + 2*pair_cost*active.T.dot(active)
+        step = np.linalg.solve(hessian, gradient)
+
+        #backtracking line search on the (piecewise quadratic) objective
+        objective = get_objective(w, diffs, pair_cost)
+        t = 1.0
+        while get_objective(w - t*step, diffs, pair_cost) > objective - 0.5*t*gradient.dot(step) \
+            and t > 1e-10:
+            t /= 2
+        w = w - t*step
+
+    return w
+
+#the scores of the lines of the SVM input, given the weights
+def predict(w, features):
+    return features.dot(w)
+
+##################
+#worker functions#
+##################
+#initialise a worker process with the parsed SVM input (see parse_svm_input) and the cost, so that
+#they are not sent again with every fold
+def init_worker(ranks, qids, features, cost):
+    worker_data["input"] = (ranks, qids, features)
+    worker_data["cost"] = cost
+
+#train on the lines outside a fold's test lines (the range test_start:test_end) and score its test
+#lines; returns the scores
+@Profiling.profiled
+def run_fold(test_range):
+    ranks, qids, features = worker_data["input"]
+    test_start, test_end = test_range
+    train_rows = np.r_[0:test_start, test_end:len(ranks)]
+    with Profiling.stage("train"):
+        w = train(ranks[train_rows], qids[train_rows], features[train_rows], worker_data["cost"])
+    with Profiling.stage("predict"):
+        return predict(w, features[test_start:test_end]).tolist()
+
+################
+#main functions#
+################
+#cross validate the ranking model on the lines of the SVM input (num_folds folds, split by qid as
+#SplitSVM.py, trained in parallel); the lines are parsed once, and each fold is a range of them.
+#Returns the test lines of all the folds and their scores, in the order of the folds
+def cross_validate(lines, cost=0.01, num_folds=SplitSVM.NUM_PART, processes=None):
+    lines = [ line.strip() for line in lines ]
+    with Profiling.stage("parse svm input"):
+        ranks, qids, features = parse_svm_input(lines)
+    qid_starts = get_qid_starts(qids)
+    test_ranges = [ (int(qid_starts[test_start]), int(qid_starts[test_end])) for \
+        (test_start, test_end) in SplitSVM.get_test_ranges(len(qid_starts)-1, num_folds) ]
+
+    if processes == 1:
+        init_worker(ranks, qids, features, cost)
+        fold_scores = map(run_fold, test_ranges)
+    else:
+        pool = Pool(processes or cpu_count(), init_worker, (ranks, qids, features, cost,))
+        fold_scores = pool.map(run_fold, test_ranges)
+        pool.close()
+        pool.join()
+
+    test_lines = [ line for (test_start, test_end) in test_ranges \
+        for line in lines[test_start:test_end] ]
+    scores = [ score for scores in fold_scores for score in scores ]
+    return test_lines, scores
+
+######
+#main#
+######
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+
+    #use utf-8 for stdout
+    sys.stdout = codecs.getwriter('utf-8')(sys.stdout)
+
+    #process the topic and intruder files
+    topics = [ line.strip().split() for line in open(args.topic_file) ]
+    intruders = [ int(line.strip())-1 for line in open(args.intruder_file) ]
+    qid_tw = dict([ (i+1, [ word.decode("utf-8") for word in topic ]) \
+        for i, topic in enumerate(topics) ])
+
+    #generate the features, cross validate and compute the model precision
+    with Profiling.stage("read word counts"):
+        wordcount = GenSVMInput.load_word_count(args.wordcount_file)
+    svm_input = GenSVMInput.gen_svm_input(topics, intruders, wordcount, args.pmi_type == "npmi")
+    test_lines, scores = cross_validate(svm_input, args.cost, args.num_folds, args.processes)
+    ComputeWordIntrusion.print_model_precision(ComputeWordIntrusion.compute_model_precision( \
+        [ line.decode("utf-8") for line in test_lines ], scores), qid_tw)
@@ -0,0 +1,256 @@
+"""
+Benchmarks ComputeWordCount.py, ComputeObservedCoherence.py and GenSVMInput.py on synthetic data
+(generated with GenZipfCorpus.py and GenTopics.py, and kept in <work_dir> for later runs), across
+corpus sizes, window sizes, topic counts and numbers of worker processes.
+
+Usage:          RunBenchmark.py <work_dir> [-s corpus_sizes] [-w window_sizes] [-n topic_counts]
+                [-p processes] [-r repeats] [-o output_file] [-b baseline_file]
+Output:         one tab-separated line per benchmark run (with a header line):
+                tool, corpus_mb, window_size, topics, processes - the benchmark configuration
+                seconds      - wall-clock time of the run (the fastest of the repeats)
+                throughput   - corpus MB/s for ComputeWordCount.py, topics/s for the others
+                speedup      - speedup over the fewest processes of the same configuration
+                efficiency   - scaling efficiency (speedup per added process, 1.0 = linear)
+                peak_rss_mb  - peak resident memory of the largest process of the run
+                vs_baseline  - seconds relative to the same run in the baseline file (> 1 = slower)
+                The output file of a run can be given as the baseline file of a later run.
+"""
+
+import argparse
+import sys
+import os
+import time
+import subprocess
+
+#parser arguments
+desc = "Benchmarks the word count, observed coherence and SVM input scripts on synthetic data."
+parser = argparse.ArgumentParser(description=desc)
+#####################
+#positional argument#
+#####################
+parser.add_argument("work_dir", help="directory for the generated data and the outputs of the " + \
+    "runs; the generated data is reused by later runs")
+
+###################
+#optional argument#
+###################
+parser.add_argument("-s", "--corpus_sizes", nargs="+", type=float, default=[10], \
+    help="sizes of the synthetic corpora in MB. Default = [10]")
+parser.add_argument("-w", "--window_sizes", nargs="+", type=int, default=[20], \
+    help="window sizes of the word counts. Default = [20]")
+parser.add_argument("-n", "--topic_counts", nargs="+", type=int, default=[100], \
+    help="numbers of topics. Default = [100]")
+parser.add_argument("-p", "--processes", nargs="+", type=int, default=[1, 2, 4], \
+    help="numbers of worker processes of ComputeWordCount.py. Default = [1, 2, 4]")
+parser.add_argument("-l", "--topic_len", type=int, default=10, \
+    help="number of words of a topic. Default = 10")
+parser.add_argument("-c", "--colloc_ratio", type=float, default=0.1, \
+    help="share of the topic words that are collocations. Default = 0.1")
+parser.add_argument("-v", "--vocab_size", type=int, default=100000, \
+    help="number of distinct words of the corpora. Default = 100000")
+parser.add_argument("-z", "--zipf_exponent", type=float, default=1.0, \
+    help="exponent of the Zipf distribution of the corpora. Default = 1.0")
+parser.add_argument("-m", "--count_mode", default="auto", \
+    help="count mode of ComputeWordCount.py. Default = auto")
+parser.add_argument("-r", "--repeats", type=int, default=1, \
+    help="number of times each run is repeated; the fastest is reported. Default = 1")
+parser.add_argument("-o", "--output_file", default=None, \
+    help="file to save the results to (they are also printed)")
+parser.add_argument("-b", "--baseline_file", default=None, \
+    help="results of a previous run to compare with")
+parser.add_argument("--seed", type=int, default=1, help="random seed of the data. Default = 1")
+parser.add_argument("--profile", default=None, \
+    help="profile the benchmarked runs (see Profiling.py) and write the profiles of each run " + \
+    "to files with this prefix followed by the name of the run (e.g. " + \
+    "'<prefix>-s10-w20-n100-wc-p4'); the times then include the overhead of the profiling")
+
+#constants
+COLUMNS = ["tool", "corpus_mb", "window_size", "topics", "processes", "seconds", "throughput", \
+    "speedup", "efficiency", "peak_rss_mb", "vs_baseline"]
+KEY_COLUMNS = COLUMNS[:5]
+
+###########
+#functions#
+###########
+#the command that runs a script of this directory with the python interpreter of this process
+def get_command(script, script_args):
+    return [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), script)] + \
+        [ str(arg) for arg in script_args ]
+
+#run a script; returns the wall-clock time and the peak RSS (bytes) of the largest process of the
+#run (the script or one of its workers). A forked process starts with the peak RSS of its parent,
+#so this process keeps its memory small (the data is generated by separate processes too)
+def run_script(script, script_args, stdout_file, log_file):
+    command = get_command(script, script_args)
+    stdout = open(stdout_file, "w")
+    log = open(log_file, "w")
+    start_time = time.time()
+    process = subprocess.Popen(command, stdout=stdout, stderr=log)
+    pid, status, rusage = os.wait4(process.pid, 0)
+    elapsed = time.time() - start_time
+    process.returncode = status
+    stdout.close()
+    log.close()
+
+    if status != 0:
+        sys.stderr.write("ERROR: " + " ".join(command) + " failed; see " + log_file + "\n")
+        sys.exit(1)
+
+    #ru_maxrss is in kilobytes on Linux and in bytes on Mac OS
+    peak_rss = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    return elapsed, peak_rss
+
+#run a script repeats times; returns the fastest time and the highest peak RSS
+def time_script(script, script_args, stdout_file, log_file, repeats):
+    times = []
+    peak_rss = 0
+    for i in range(repeats):
+        elapsed, rss = run_script(script, script_args, stdout_file, log_file)
+        times.append(elapsed)
+        peak_rss = max(peak_rss, rss)
+
+    return min(times), peak_rss
+
+#generate a corpus (unless it was generated by a previous run) and return its directory and size
+def get_corpus(work_dir, size, vocab_size, zipf_exponent, seed):
+    corpus_dir = os.path.join(work_dir, "corpus-%gmb-v%d-z%g-seed%d" % (size, vocab_size, \
+        zipf_exponent, seed))
+    if not os.path.exists(corpus_dir):
+        sys.stderr.write("generating corpus " + corpus_dir + "\n")
+        subprocess.check_call(get_command("GenZipfCorpus.py", [corpus_dir + ".tmp", "-s", size, \
+            "-v", vocab_size, "-z", zipf_exponent, "--seed", seed]))
+        os.rename(corpus_dir + ".tmp", corpus_dir)
+
+    corpus_bytes = sum([ os.path.getsize(os.path.join(corpus_dir, f)) \
+        for f in os.listdir(corpus_dir) ])
+    return corpus_dir, corpus_bytes
+
+#generate a topic file and its intruder word file (unless they were generated by a previous run)
+def get_topics(work_dir, num_topics, topic_len, colloc_ratio, seed):
+    topic_file = os.path.join(work_dir, "topics-n%d-l%d-c%g-seed%d.txt" % (num_topics, topic_len, \
+        colloc_ratio, seed))
+    intruder_file = topic_file[:-len(".txt")] + "-intruder.txt"
+    if not os.path.exists(intruder_file):
+        subprocess.check_call(get_command("GenTopics.py", [topic_file, "-i", intruder_file, \
+            "-n", num_topics, "-l", topic_len, "-c", colloc_ratio, "--seed", seed]))
+
+    return topic_file, intruder_file
+
+#key of a result, to compare it with the baseline
+def get_key(result):
+    return tuple([ str(result[column]) for column in KEY_COLUMNS ])
+
+#load the results of a previous run (seconds per key)
+def load_baseline(baseline_file):
+    baseline = {}
+    columns = None
+    for line in open(baseline_file):
+        fields = line.rstrip("\n").split("\t")
+        if columns is None:
+            columns = fields
+            continue
+        result = dict(zip(columns, fields))
+        baseline[get_key(result)] = float(result["seconds"])
+
+    return baseline
+
+#format a result as a tab-separated line
+def format_result(result):
+    fields = []
+    for column in COLUMNS:
+        value = result.get(column, "-")
+        if isinstance(value, float):
+            value = "%.3f" % value
+        fields.append(str(value))
+
+    return "\t".join(fields)
+
+################
+#main functions#
+################
+#run the benchmarks; returns a list of results (dictionaries of COLUMNS)
+def run_benchmark(work_dir, corpus_sizes=[10], window_sizes=[20], topic_counts=[100], \
+    processes=[1, 2, 4], topic_len=10, colloc_ratio=0.1, vocab_size=100000, zipf_exponent=1.0, \
+    count_mode="auto", repeats=1, seed=1, profile=None):
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+    output_dir = os.path.join(work_dir, "output")
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    results = []
+    for size in corpus_sizes:
+        corpus_dir, corpus_bytes = get_corpus(work_dir, size, vocab_size, zipf_exponent, seed)
+        for window_size in window_sizes:
+            for num_topics in topic_counts:
+                topic_file, intruder_file = get_topics(work_dir, num_topics, topic_len, \
+                    colloc_ratio, seed)
+                run_name = "s%g-w%d-n%d" % (size, window_size, num_topics)
+                name = os.path.join(output_dir, run_name)
+                config = {"corpus_mb": "%g" % size, "window_size": window_size, \
+                    "topics": num_topics}
+
+                #word counts, for each number of processes
+                wc_file = name + "-wc.txt"
+                wc_results = []
+                for p in sorted(processes):
+                    sys.stderr.write("running ComputeWordCount.py on %g MB, window size %d, " \
+                        "%d topics, %d processes\n" % (size, window_size, num_topics, p))
+                    profile_args = ["--profile", "%s-%s-wc-p%d" % (profile, run_name, p)] \
+                        if profile else []
+                    elapsed, peak_rss = time_script("ComputeWordCount.py", [topic_file, \
+                        corpus_dir, "-w", window_size, "-p", p, "-m", count_mode, "-o", \
+                        wc_file] + profile_args, os.devnull, name + "-wc-p%d.log" % p, repeats)
+                    result = dict(config, tool="ComputeWordCount", processes=p, seconds=elapsed, \
+                        throughput="%.2f MB/s" % (corpus_bytes / 2.0**20 / elapsed), \
+                        peak_rss_mb=peak_rss / 2.0**20)
+                    #speedup and efficiency relative to the fewest processes
+                    if wc_results:
+                        first = wc_results[0]
+                        result["speedup"] = first["seconds"] / elapsed
+                        result["efficiency"] = result["speedup"] * first["processes"] / p
+                    else:
+                        result["speedup"] = 1.0
+                        result["efficiency"] = 1.0
+                    wc_results.append(result)
+                results.extend(wc_results)
+
+                #observed coherence and SVM input, from the word counts
+                for tool, script, script_args in [("ComputeObservedCoherence", \
+                    "ComputeObservedCoherence.py", [topic_file, "npmi", wc_file]), \
+                    ("GenSVMInput", "GenSVMInput.py", [topic_file, intruder_file, "npmi", \
+                    wc_file])]:
+                    sys.stderr.write("running %s on %g MB, window size %d, %d topics\n" % \
+                        (script, size, window_size, num_topics))
+                    profile_args = ["--profile", "%s-%s-%s" % (profile, run_name, tool)] \
+                        if profile else []
+                    elapsed, peak_rss = time_script(script, script_args + profile_args, name + \
+                        "-" + tool + ".out", name + "-" + tool + ".log", repeats)
+                    results.append(dict(config, tool=tool, processes=1, seconds=elapsed, \
+                        throughput="%.1f topics/s" % (num_topics / elapsed), \
+                        peak_rss_mb=peak_rss / 2.0**20))
+
+    return results
+
+######
+#main#
+######
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    results = run_benchmark(args.work_dir, args.corpus_sizes, args.window_sizes, \
+        args.topic_counts, args.processes, args.topic_len, args.colloc_ratio, args.vocab_size, \
+        args.zipf_exponent, args.count_mode, args.repeats, args.seed, args.profile)
+
+    if args.baseline_file:
+        baseline = load_baseline(args.baseline_file)
+        for result in results:
+            if get_key(result) in baseline:
+                result["vs_baseline"] = result["seconds"] / baseline[get_key(result)]
+
+    lines = ["\t".join(COLUMNS)] + [ format_result(result) for result in results ]
+    print "\n".join(lines)
+    if args.output_file:
+        output = open(args.output_file, "w")
+        output.write("\n".join(lines) + "\n")
+        output.close()
@@ -12,59 +12,85 @@ Date:           Nov 10
 
 import sys
 
-if len(sys.argv) != 2:
-    print "Usage: SplitSVM.py <output_dir>"
-    raise SystemExit
-
-#parameters
-output_dir = sys.argv[1]
-
 #constants
 NUM_PART = 10
 
-#globals
-qids = [] #[ [lines for qid:1], [lines for qid:2], ... ]
-
-curr_grp = []
-curr_qid = -1
-for line in sys.stdin:
-    line = line.strip()
-    data = line.split()
-    try:
-        qid = int(data[1].split(":")[1])
-        if curr_qid == qid:
-            curr_grp.append(line)
-        else:
-            if curr_qid != -1:
-                qids.append(curr_grp)
-            curr_grp = []
-            curr_grp.append(line)
-            curr_qid = qid
-    except:
-        print "Bad format for line =", line
-        raise SystemExit
-#append the last group
-if len(curr_grp) != 0:
-    qids.append(curr_grp)
+###########
+#functions#
+###########
+#group the lines of the SVM input by qid (the lines of a qid are consecutive); returns
+#[ [lines for qid:1], [lines for qid:2], ... ]
+def group_qids(lines):
+    qids = []
+    curr_grp = []
+    curr_qid = -1
+    for line in lines:
+        line = line.strip()
+        data = line.split()
+        try:
+            qid = int(data[1].split(":")[1])
+            if curr_qid == qid:
+                curr_grp.append(line)
+            else:
+                if curr_qid != -1:
+                    qids.append(curr_grp)
+                curr_grp = []
+                curr_grp.append(line)
+                curr_qid = qid
+        except:
+            print "Bad format for line =", line
+            raise SystemExit
+    #append the last group
+    if len(curr_grp) != 0:
+        qids.append(curr_grp)
+
+    return qids
+
+#the test qids of each of the num_part partitions of num_qids qids (groups of lines), as a list of
+#(test_start, test_end) ranges of the qid groups
+def get_test_ranges(num_qids, num_part=NUM_PART):
+    num_qid_per_group = float(num_qids)/num_part
+
+    test_ranges = []
+    for i in range(0, num_part):
+        test_start = int(round(float(i)*num_qid_per_group))
+        test_end = int(round(float(i+1)*num_qid_per_group))
+        test_ranges.append((test_start, test_end))
 
-num_qid_per_group = float(len(qids))/NUM_PART
+    return test_ranges
 
-for i in range(0, NUM_PART):
-    test_start = int(round(float(i)*num_qid_per_group))
-    test_end = int(round(float(i+1)*num_qid_per_group))
+#split the lines of the SVM input into num_part partitions for cross validation; returns a list of
+#(train lines, test lines), one per partition
+def split_svm(lines, num_part=NUM_PART):
+    qids = group_qids(lines)
 
-    train_output = open(output_dir + "/train.dat." + str(i), "w")
-    test_output = open(output_dir + "/test.dat." + str(i), "w")
+    partitions = []
+    for (test_start, test_end) in get_test_ranges(len(qids), num_part):
+        test_lines = [ line for qid in qids[test_start:test_end] for line in qid ]
+        train_lines = [ line for qid in qids[0:test_start] + qids[test_end:] for line in qid ]
+        partitions.append((train_lines, test_lines))
 
-    #write to test
-    for qid in qids[test_start:test_end]:
-        for line in qid:
+    return partitions
+
+######
+#main#
+######
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print "Usage: SplitSVM.py <output_dir>"
+        raise SystemExit
+
+    #parameters
+    output_dir = sys.argv[1]
+
+    for i, (train_lines, test_lines) in enumerate(split_svm(sys.stdin)):
+        train_output = open(output_dir + "/train.dat." + str(i), "w")
+        test_output = open(output_dir + "/test.dat." + str(i), "w")
+
+        #write to test
+        for line in test_lines:
             test_output.write(line + "\n")
 
-    #write to train
-    for qid in qids[0:test_start]:
-        for line in qid:
-            train_output.write(line + "\n")
-    for qid in qids[test_end:]:
-        for line in qid:
+        #write to train
+        for line in train_lines:
             train_output.write(line + "\n")
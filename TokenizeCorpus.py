@@ -0,0 +1,143 @@
+"""
+Converts the reference corpus into a pre-tokenized integer format, so that ComputeWordCount.py can
+read the documents as arrays of term ids (memory-mapped) instead of decoding and splitting the text
+of the corpus on every run.
+
+Usage:          TokenizeCorpus.py <ref_corpus_dir> <tokenized_corpus_dir>
+Output:         one sub-directory per corpus partition in <tokenized_corpus_dir>, containing:
+                vocab.txt       - the terms of the partition, one per line (line number = term id)
+                tokens.npy      - uint32 array of the term ids of the partition, in corpus order
+                doc_offsets.npy - int64 array; the tokens of document i are
+                                  tokens[doc_offsets[i]:doc_offsets[i+1]]
+                source.txt      - path, size and modification time of the corpus partition
+                The tokenized corpus directory is used in place of the reference corpus directory
+                (e.g. ComputeWordCount.py <topic_file> <tokenized_corpus_dir>).
+"""
+
+import argparse
+import sys
+import os
+import codecs
+import array
+import numpy as np
+from multiprocessing import Pool
+import PartitionFile
+import Profiling
+
+#parser arguments
+desc = "Converts the reference corpus into a pre-tokenized integer format (a vocabulary and arrays \
+    of term ids) for ComputeWordCount.py. Parallel processing is achieved by converting the corpus \
+    partitions separately."
+parser = argparse.ArgumentParser(description=desc)
+#####################
+#positional argument#
+#####################
+parser.add_argument("ref_corpus_dir", help="directory that contains the reference corpus; the " + \
+    "partitions can be compressed with gzip, bzip2 or zstd")
+parser.add_argument("tokenized_corpus_dir", help="directory to store the tokenized corpus")
+
+###################
+#optional argument#
+###################
+parser.add_argument("--profile", default=None, \
+    help="profile the run (the main and worker processes, and the time of each stage) and " + \
+    "write the profiles to files with this prefix (see Profiling.py)")
+
+#constants (the vocabulary, document offsets and source files are those of PartitionFile.py)
+TOKENS_FILE = "tokens.npy"
+TOKEN_DTYPE = np.uint32 #type of the term ids in the tokens file
+
+###########
+#functions#
+###########
+#check whether a corpus partition is a tokenized partition (a directory created by this script)
+def is_tokenized(partition):
+    return os.path.isdir(partition) and os.path.exists(os.path.join(partition, TOKENS_FILE))
+
+#load the term ids of the given terms in the vocabulary of a tokenized partition; returns an array
+#that maps each term id of the partition to term_ids[term] (0 for the other terms)
+def load_vocab_map(partition_dir, term_ids):
+    vocab_map = array.array("l")
+    vocab_file = os.path.join(partition_dir, PartitionFile.VOCAB_FILE)
+    for line in codecs.open(vocab_file, "r", "utf-8"):
+        vocab_map.append(term_ids.get(line.rstrip("\n"), 0))
+
+    return np.frombuffer(vocab_map, dtype=np.dtype("l")).astype(np.int64)
+
+#memory-map the tokens and load the document offsets of a tokenized partition
+def load_tokens(partition_dir):
+    tokens = np.load(os.path.join(partition_dir, TOKENS_FILE), mmap_mode="r")
+    doc_offsets = np.load(os.path.join(partition_dir, PartitionFile.DOC_OFFSETS_FILE), \
+        mmap_mode="r")
+
+    return tokens, doc_offsets
+
+#warn if the corpus partition of a tokenized partition has changed since it was converted
+def check_source(partition_dir):
+    PartitionFile.check_source(partition_dir, "tokenized", \
+        "convert it again with TokenizeCorpus.py")
+
+##################
+#worker functions#
+##################
+#convert a corpus partition (which can be compressed) and save it in partition_dir; the documents
+#are read and split the same way as ComputeWordCount.py does with the text
+@Profiling.profiled
+def tokenize_partition(corpus_file, partition_dir):
+    #record the state of the partition before reading it, so that a change during the conversion
+    #is also detected
+    corpus_stat = os.stat(corpus_file)
+
+    vocab_list, tokens, doc_offsets = PartitionFile.tokenize(corpus_file)
+
+    if not os.path.exists(partition_dir):
+        os.makedirs(partition_dir)
+    PartitionFile.write_vocab(partition_dir, vocab_list, doc_offsets)
+    np.save(os.path.join(partition_dir, TOKENS_FILE), np.frombuffer(tokens, dtype=TOKEN_DTYPE))
+    PartitionFile.write_source(partition_dir, corpus_file, corpus_stat)
+
+    return corpus_file
+
+####################
+#call back function#
+####################
+def tokenize_partition_complete(corpus_file):
+    sys.stderr.write("finished converting corpus partition " + corpus_file + "\n")
+    sys.stderr.flush()
+
+################
+#main functions#
+################
+#convert the partitions of the reference corpus directory, one tokenized partition (sub-directory
+#of tokenized_corpus_dir) per corpus partition
+def tokenize_corpus(ref_corpus_dir, tokenized_corpus_dir):
+    #get the partitions of the reference corpus
+    corpus_partitions = []
+    for f in os.listdir(ref_corpus_dir):
+        if not f.startswith("."):
+            corpus_partitions.append(f)
+
+    if not os.path.exists(tokenized_corpus_dir):
+        os.makedirs(tokenized_corpus_dir)
+
+    #spawn multiple threads to convert the corpus
+    po = Pool()
+    results = []
+    for cp in corpus_partitions:
+        sys.stderr.write("creating a thread for corpus partition " + cp + "\n")
+        sys.stderr.flush()
+        results.append(po.apply_async(tokenize_partition, (ref_corpus_dir + "/" + cp, \
+            tokenized_corpus_dir + "/" + cp,), callback=tokenize_partition_complete))
+    po.close()
+    po.join()
+    #raise any error from the workers
+    for result in results:
+        result.get()
+
+######
+#main#
+######
+if __name__ == "__main__":
+    args = parser.parse_args()
+    Profiling.start(args.profile)
+    tokenize_corpus(args.ref_corpus_dir, args.tokenized_corpus_dir)
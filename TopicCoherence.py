@@ -0,0 +1,238 @@
+"""
+Computes the observed coherence (pairwise PMI/NPMI/LCP) of topics from word counts. Used by
+ComputeObservedCoherence.py and CoherenceServer.py.
+
+The topics are scored in batches of topics with the same number of words: the word and pair counts
+of a batch are gathered into arrays, the associations of all the metrics are computed together as
+array operations, and the coherence of every top-N value is read from the prefix sums of the
+pairwise association matrix.
+
+Word counts that are approximate (counted over a sample of the documents, or with the pair counts
+estimated from a Count-Min sketch; see ComputeWordCount.py) record their sample size and error
+bound, from which a range of each count is derived: a confidence interval for sampled counts, and
+the sketch error below the estimate for sketched pair counts. The bounds of the coherence are the
+means over the pairs of the lowest and highest associations within the ranges of their counts.
+"""
+
+import math
+import itertools
+import numpy as np
+import Profiling
+from collections import defaultdict, OrderedDict
+
+#parameters
+colloc_sep = "_" #symbol for concatenating collocations
+batch_size = 10000 #number of topics (of the same length) that are scored together
+confidence_z = 1.96 #z-score of the confidence intervals of sampled counts (95%)
+
+#constants
+WTOTALKEY = "!!<TOTAL_WINDOWS>!!" #key name for total number of windows (in word count file)
+SAMPLEDWKEY = "!!<SAMPLED_WINDOWS>!!" #key name for number of windows of the document sample
+PAIRERRORKEY = "!!<PAIR_COUNT_ERROR>!!" #key name for error bound of the sketched pair counts
+METRICS = ["pmi", "npmi", "lcp"]
+LOG_BASE = math.log(10) #the associations are computed in log base 10
+
+###########
+#functions#
+###########
+#compute the association matrices of a batch of topics for all the metrics. word_counts (topics x
+#words) are the counts of the topic words and pair_counts (topics x words x words) the counts of
+#the word pairs; the association of words i and j (i < j) of a topic is at [topic, i, j] (for lcp,
+#the log conditional probability of word j given word i). The counts of word j can be given
+#separately as w2_counts
+def calc_assoc_matrices(word_counts, pair_counts, window_total, w2_counts=None):
+    if w2_counts is None:
+        w2_counts = word_counts
+    w1_count = word_counts[:, :, np.newaxis].astype(np.float64)
+    w2_count = w2_counts[:, np.newaxis, :].astype(np.float64)
+    combined_count = pair_counts.astype(np.float64)
+    total = float(window_total)
+
+    assoc = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        #pmi and npmi are 0 if any of the counts is 0
+        zero = (w1_count == 0) | (w2_count == 0) | (combined_count == 0)
+        pmi = np.log((combined_count*total)/(w1_count*w2_count)) / LOG_BASE
+        npmi = pmi / (-1.0*np.log(combined_count/total)/LOG_BASE)
+        assoc["pmi"] = np.where(zero, 0.0, pmi)
+        assoc["npmi"] = np.where(zero, 0.0, npmi)
+
+        #lcp falls back to the probability of word j (or 1/total) if the pair does not co-occur
+        unseen = np.where(w2_count != 0, np.log(w2_count/total), np.log(1.0/total)) / LOG_BASE
+        seen = np.log(combined_count/w1_count) / LOG_BASE
+        assoc["lcp"] = np.where(combined_count == 0, unseen, seen)
+
+    return assoc
+
+#########
+#classes#
+#########
+#a dictionary that keeps only the max_size most recently used items
+class LRUCache(object):
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __getitem__(self, key):
+        #move the item to the most recently used end
+        value = self.items.pop(key)
+        self.items[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self.items:
+            del self.items[key]
+        elif len(self.items) >= self.max_size:
+            self.items.popitem(last=False)
+        self.items[key] = value
+
+#scores topics against a set of word counts (a dictionary, or anything with get(), such as
+#WordCountFile.BinaryWordCount); the counts that are looked up are kept in count_cache (a
+#dictionary by default, or e.g. an LRUCache to bound its size)
+class CoherenceScorer(object):
+    def __init__(self, wordcount, count_cache=None):
+        self.wordcount = wordcount
+        self.window_total = wordcount.get(WTOTALKEY, 0)
+        self.sampled_windows = wordcount.get(SAMPLEDWKEY, 0)
+        self.pair_error = wordcount.get(PAIRERRORKEY, 0)
+        self.approximate = self.sampled_windows > 0 or self.pair_error > 0
+        if count_cache is None:
+            count_cache = {}
+        self.count_cache = count_cache
+
+    #the count of a word or of a pair key "w1|w2" (w1 < w2)
+    def get_count(self, key):
+        if key in self.count_cache:
+            return self.count_cache[key]
+        count = self.wordcount.get(key, 0)
+        self.count_cache[key] = count
+        return count
+
+    #look up the counts of word pairs, given as arrays of word ids (in word_list, which is sorted);
+    #each distinct pair is only looked up once
+    def get_pair_counts(self, w1_ids, w2_ids, word_list):
+        num_words = len(word_list)
+        pair_keys = np.minimum(w1_ids, w2_ids)*num_words + np.maximum(w1_ids, w2_ids)
+        unique_keys, inverse = np.unique(pair_keys, return_inverse=True)
+        unique_counts = np.zeros(len(unique_keys), dtype=np.int64)
+        for i, pair_key in enumerate(unique_keys):
+            w1_id, w2_id = divmod(int(pair_key), num_words)
+            unique_counts[i] = self.get_count(word_list[w1_id] + "|" + word_list[w2_id])
+
+        return unique_counts[inverse]
+
+    #the lower and upper bounds of (approximate) counts: the confidence interval of a count scaled up
+    #from a sample, which has about count*sample_rate occurrences (at least one is assumed, so that
+    #unseen words and pairs get an upper bound), and for sketched pair counts (which are never too
+    #low), the error bound below the count
+    def get_count_bounds(self, counts, pairs=False):
+        lower = counts.astype(np.float64)
+        upper = counts.astype(np.float64)
+        if self.sampled_windows > 0:
+            sample_rate = float(self.sampled_windows) / self.window_total
+            error = confidence_z * np.sqrt(np.maximum(lower*sample_rate, 1.0)) / sample_rate
+            lower = np.maximum(lower - error, 0.0)
+            upper = upper + error
+        if pairs and self.pair_error > 0:
+            lower = np.maximum(lower - self.pair_error, 0.0)
+
+        return lower, upper
+
+    #compute the coherence of a batch of topics (with the same number of words) for all the metrics
+    #and top-N values. topic_ids (topics x words) are the ids of the topic words in word_list and
+    #word_counts the counts of the words in word_list. Returns {metric: topics x topns array}; with
+    #bounds, also the lower and upper bounds of the coherence ({metric + "_lower": ...} and
+    #{metric + "_upper": ...}), from the lowest and highest associations of the pairs over the
+    #combinations of the bounds of their counts
+    def score_batch(self, topic_ids, word_list, word_counts, topns, bounds=False):
+        num_topics, num_words = topic_ids.shape
+        #topics without words have no coherence
+        if num_words == 0:
+            keys = METRICS + ([ metric + suffix for metric in METRICS for suffix in \
+                ["_lower", "_upper"] ] if bounds else [])
+            return dict([ (key, np.full((num_topics, len(topns)), np.nan)) for key in keys ])
+
+        #the pairs (i < j) of different words of the topics and their counts
+        pair_mask = (topic_ids[:, :, np.newaxis] != topic_ids[:, np.newaxis, :]) & \
+            np.triu(np.ones((num_words, num_words), dtype=bool), 1)
+        pair_counts = np.zeros((num_topics, num_words, num_words), dtype=np.int64)
+        topics, rows, cols = np.nonzero(pair_mask)
+        with Profiling.stage("look up pair counts"):
+            pair_counts[topics, rows, cols] = self.get_pair_counts(topic_ids[topics, rows], \
+                topic_ids[topics, cols], word_list)
+
+        with Profiling.stage("calc assoc"):
+            assoc = calc_assoc_matrices(word_counts[topic_ids], pair_counts, self.window_total)
+
+        #the coherence over the top-N words is the mean association over the pairs with j < N,
+        #which is read from the prefix sums (over j) of the pairwise matrix
+        num_pairs = np.cumsum(np.sum(pair_mask, axis=1), axis=1)
+        topn_ids = [ min(n, num_words)-1 for n in topns ]
+
+        def mean_assoc(assoc_matrix):
+            assoc_sums = np.cumsum(np.sum(np.where(pair_mask, assoc_matrix, 0.0), axis=1), axis=1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return assoc_sums[:, topn_ids] / num_pairs[:, topn_ids]
+
+        coherences = {}
+        for metric in METRICS:
+            coherences[metric] = mean_assoc(assoc[metric])
+
+        if bounds:
+            word_bounds = self.get_count_bounds(word_counts[topic_ids])
+            pair_bounds = self.get_count_bounds(pair_counts, pairs=True)
+            lower = {}
+            upper = {}
+            for w1_counts, w2_counts, combined_counts in itertools.product(word_bounds, \
+                word_bounds, pair_bounds):
+                corner = calc_assoc_matrices(w1_counts, combined_counts, self.window_total, \
+                    w2_counts)
+                for metric in METRICS:
+                    lower[metric] = np.fmin(lower.get(metric, corner[metric]), corner[metric])
+                    upper[metric] = np.fmax(upper.get(metric, corner[metric]), corner[metric])
+            for metric in METRICS:
+                coherences[metric + "_lower"] = mean_assoc(lower[metric])
+                coherences[metric + "_upper"] = mean_assoc(upper[metric])
+
+        return coherences
+
+    #compute the coherence of topics (lists of topic words, with collocations concatenated by
+    #colloc_sep; only the top max(topns) words are used) for all the metrics and top-N values.
+    #Returns {metric: topics x topns array}; with bounds, also the bounds of the coherence (see
+    #score_batch)
+    def score(self, topics, topns, bounds=False):
+        topic_lists = [ topic_list[:max(topns)] for topic_list in topics ]
+
+        #give the topic words ids (in sorted order of the words, with the underscores of the
+        #collocations/bigrams substituted with spaces) and look up their counts
+        word_list = sorted(set([ " ".join(word.split(colloc_sep)) for topic_list in topic_lists \
+            for word in topic_list ]))
+        word_index = dict([ (word, word_id) for word_id, word in enumerate(word_list) ])
+        word_counts = np.array([ self.get_count(word) for word in word_list ], dtype=np.int64)
+
+        #score the topics in batches of topics with the same number of words
+        keys = METRICS
+        if bounds:
+            keys = METRICS + [ metric + suffix for metric in METRICS for suffix in \
+                ["_lower", "_upper"] ]
+        topic_coherence = dict([ (key, np.zeros((len(topic_lists), len(topns)))) for key in keys ])
+        topic_lens = defaultdict(list) #{number of words: [topicid]}
+        for topic_id, topic_list in enumerate(topic_lists):
+            topic_lens[len(topic_list)].append(topic_id)
+        for num_words, topic_ids in sorted(topic_lens.items()):
+            for i in range(0, len(topic_ids), batch_size):
+                batch = topic_ids[i:i+batch_size]
+                batch_word_ids = np.array([ [ word_index[" ".join(word.split(colloc_sep))] \
+                    for word in topic_lists[topic_id] ] for topic_id in batch ], dtype=np.int64)
+                coherences = self.score_batch(batch_word_ids.reshape(len(batch), num_words), \
+                    word_list, word_counts, topns, bounds)
+                for key in keys:
+                    topic_coherence[key][batch] = coherences[key]
+
+        return topic_coherence
@@ -0,0 +1,196 @@
+"""
+Reads and writes the word count files, in either the text format printed by ComputeWordCount.py
+(one "word|count" or "word1|word2|count" entry per line) or the binary format.
+
+Binary format (integers are little-endian):
+    magic           8 bytes, "TIWCBIN1"
+    num_keys        uint64
+    key_offsets     (num_keys+1) x uint64; key i is key_data[key_offsets[i]:key_offsets[i+1]]
+    counts          num_keys x int64; count of key i
+    key_data        the utf-8 encoded keys ("word" or "word1|word2", word1 < word2), sorted bytewise
+
+The binary file is memory-mapped and the keys are looked up by binary search, so only the keys that
+are needed are read.
+
+Partial count files (the counts of a shard of the corpus partitions, written by ComputeWordCount.py
+with --shard and combined by MergeWordCount.py) are in the text format, sorted by key, after a
+header line: "TIWCPART1" and a JSON object (the topic relation fingerprint, window size, shard and
+the names of the corpus partitions counted), separated by a tab.
+"""
+
+import codecs
+import json
+import mmap
+import struct
+import numpy as np
+
+#constants
+MAGIC = "TIWCBIN1"
+PARTIAL_MAGIC = "TIWCPART1"
+HEADER_SIZE = 16 #magic and num_keys
+
+###########
+#functions#
+###########
+#check whether a word count file is in the binary format
+def is_binary(wordcount_file):
+    f = open(wordcount_file, "rb")
+    magic = f.read(len(MAGIC))
+    f.close()
+
+    return magic == MAGIC
+
+#read a word count file in the text format into a dictionary; pair keys are sorted (w1 < w2). The
+#keys are unicode strings, or the utf-8 encoded byte strings of the file if unicode_keys is False
+#(e.g. to look up the words of a topic file that is read as bytes)
+def read_text(wordcount_file, unicode_keys=True):
+    wordcount = {}
+    if unicode_keys:
+        lines = codecs.open(wordcount_file, "r", "utf-8")
+    else:
+        lines = open(wordcount_file)
+    for line in lines:
+        line = line.strip()
+        data = line.split("|")
+        if len(data) == 2:
+            wordcount[data[0]] = int(data[1])
+        elif len(data) == 3:
+            if data[0] < data[1]:
+                key = data[0] + "|" + data[1]
+            else:
+                key = data[1] + "|" + data[0]
+            wordcount[key] = int(data[2])
+        else:
+            print "ERROR: wordcount format incorrect. Line =", line
+            raise SystemExit
+
+    return wordcount
+
+#write a dictionary of word counts in the text format
+def write_text(wordcount, wordcount_file):
+    output = codecs.open(wordcount_file, "w", "utf-8")
+    for key, count in sorted(wordcount.items()):
+        output.write(key + "|" + str(count) + "\n")
+    output.close()
+
+#write a dictionary of word counts as a partial count file, with the given header (a dictionary)
+def write_partial(wordcount, header, partial_file):
+    output = codecs.open(partial_file, "w", "utf-8")
+    output.write(PARTIAL_MAGIC + "\t" + json.dumps(header, sort_keys=True) + "\n")
+    for key, count in sorted(wordcount.items()):
+        output.write(key + "|" + str(count) + "\n")
+    output.close()
+
+#open a partial count file; returns its header and an iterator over its (key, count) entries, in
+#the order of the keys
+def read_partial(partial_file):
+    f = codecs.open(partial_file, "r", "utf-8")
+    magic, _, header = f.readline().rstrip("\n").partition("\t")
+    if magic != PARTIAL_MAGIC:
+        raise ValueError(partial_file + " is not a partial count file")
+
+    def entries():
+        for line in f:
+            key, _, count = line.rstrip("\n").rpartition("|")
+            yield key, int(count)
+        f.close()
+
+    return json.loads(header), entries()
+
+#write a dictionary of word counts in the binary format
+def write_binary(wordcount, wordcount_file):
+    items = sorted([ (key.encode("utf-8") if isinstance(key, unicode) else key, count) \
+        for key, count in wordcount.items() ])
+    key_offsets = np.zeros(len(items)+1, dtype="<u8")
+    key_offsets[1:] = np.cumsum([ len(key) for key, _ in items ])
+    counts = np.array([ count for _, count in items ], dtype="<i8")
+
+    output = open(wordcount_file, "wb")
+    output.write(MAGIC)
+    output.write(struct.pack("<Q", len(items)))
+    output.write(key_offsets.tostring())
+    output.write(counts.tostring())
+    output.write("".join([ key for key, _ in items ]))
+    output.close()
+
+#load a word count file of either format; returns a dictionary (text format) or a BinaryWordCount
+#(binary format), which both support 'in', [] and get()
+def load(wordcount_file):
+    if is_binary(wordcount_file):
+        return BinaryWordCount(wordcount_file)
+    else:
+        return read_text(wordcount_file)
+
+#########
+#classes#
+#########
+#read-only, memory-mapped word counts in the binary format; keys can be unicode or utf-8 strings.
+#The counts that are looked up can be kept in cache (e.g. a dictionary, for a run that looks up the
+#same keys repeatedly); by default nothing is kept, so that a long-running reader (such as
+#CoherenceServer.py, which has an LRU cache of its own) does not grow with every key it looks up
+class BinaryWordCount(object):
+    def __init__(self, wordcount_file, cache=None):
+        self.f = open(wordcount_file, "rb")
+        self.data = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(wordcount_file + " is not a binary word count file")
+        self.num_keys = struct.unpack("<Q", self.data[len(MAGIC):HEADER_SIZE])[0]
+        self.key_offsets = np.frombuffer(self.data, dtype="<u8", count=self.num_keys+1, \
+            offset=HEADER_SIZE)
+        counts_offset = HEADER_SIZE + 8*(self.num_keys+1)
+        self.counts = np.frombuffer(self.data, dtype="<i8", count=self.num_keys, \
+            offset=counts_offset)
+        self.key_data_offset = counts_offset + 8*self.num_keys
+        self.cache = cache #counts of the keys looked up so far (None if not found), or None
+
+    def __len__(self):
+        return self.num_keys
+
+    #key i, as a utf-8 string
+    def get_key(self, i):
+        return self.data[self.key_data_offset + int(self.key_offsets[i]): \
+            self.key_data_offset + int(self.key_offsets[i+1])]
+
+    #binary search for the count of a key; returns None if not found
+    def find(self, key):
+        if self.cache is not None and key in self.cache:
+            return self.cache[key]
+
+        key_str = key.encode("utf-8") if isinstance(key, unicode) else key
+        count = None
+        lo = 0
+        hi = self.num_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = self.get_key(mid)
+            if mid_key < key_str:
+                lo = mid + 1
+            elif mid_key > key_str:
+                hi = mid
+            else:
+                count = int(self.counts[mid])
+                break
+        if self.cache is not None:
+            self.cache[key] = count
+
+        return count
+
+    def __contains__(self, key):
+        return self.find(key) is not None
+
+    def __getitem__(self, key):
+        count = self.find(key)
+        if count is None:
+            raise KeyError(key)
+        return count
+
+    def get(self, key, default=None):
+        count = self.find(key)
+        if count is None:
+            return default
+        return count
+
+    #all (key, count) pairs, with unicode keys
+    def items(self):
+        return [ (self.get_key(i).decode("utf-8"), int(self.counts[i])) \
+            for i in range(self.num_keys) ]
@@ -2,7 +2,8 @@
 
 #script that computes the observed coherence (pointwise mutual information, normalised pmi or log 
 #conditional probability)
-#steps:
+#steps (both done in one process by ComputeCoherence.py, which passes the word counts to the scorer
+#in memory; they are also saved to the word count file):
 #1. sample the word counts of the topic words based on the reference corpus
 #2. compute the observed coherence using the chosen metric
 
@@ -15,10 +16,6 @@ ref_corpus_dir="ref_corpus/wiki"
 wordcount_file="wordcount/wc-oc.txt"
 oc_file="results/topics-oc.txt"
 
-#compute the word occurrences
-echo "Computing word occurrence..."
-python ComputeWordCount.py $topic_file $ref_corpus_dir > $wordcount_file
-
-#compute the topic observed coherence
-echo "Computing the observed coherence..."
-python ComputeObservedCoherence.py $topic_file $metric $wordcount_file > $oc_file
+#compute the word occurrences and the topic observed coherence
+echo "Computing word occurrence and the observed coherence..."
+python ComputeCoherence.py $topic_file $metric $ref_corpus_dir -o $wordcount_file > $oc_file